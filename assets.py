@@ -0,0 +1,136 @@
+import json
+import threading
+
+from telebot import types
+
+# Static reply assets. Keyboards are built and serialized to JSON once at
+# import; telebot passes a markup that is already a string straight through.
+# The JSON is compact and keeps Cyrillic and emoji unescaped, which makes
+# every request carrying a keyboard smaller.
+# Media is uploaded by URL once and re-sent by the file_id Telegram returns.
+
+CITIES = ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро",
+          "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"]
+
+WELCOME_ANIMATION = "https://media.giphy.com/media/L1R1tvI9svkIWwpVYr/giphy.gif"
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS assets (
+        name TEXT PRIMARY KEY,
+        file_id TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def reply_keyboard(*rows):
+    # A row holds button texts or KeyboardButtons
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    for row in rows:
+        markup.add(*(types.KeyboardButton(text) if isinstance(text, str) else text for text in row))
+    return json.dumps(json.loads(markup.to_json()), ensure_ascii=False, separators=(',', ':'))
+
+
+NAVIGATION = ["🔙 Назад", "🏠 Головне меню"]
+# Telegram sends the user's location when these are pressed
+NEARBY_BUTTON = types.KeyboardButton("📍 Вакансії поруч", request_location=True)
+POST_HERE_BUTTON = types.KeyboardButton("📍 Моє місцезнаходження", request_location=True)
+
+NAVIGATION_KEYBOARD = reply_keyboard(NAVIGATION)
+ROLE_KEYBOARD = reply_keyboard(["👔 Роботодавець", "👷 Шукаю роботу"])
+ADMIN_ROLE_KEYBOARD = reply_keyboard(["👔 Роботодавець", "👷 Шукаю роботу", "⚙️ Адмін-панель"])
+EMPLOYER_CITY_KEYBOARD = reply_keyboard(
+    *([city] for city in CITIES), [POST_HERE_BUTTON], ["📂 Мої вакансії"], ["🔙 Назад"], ["🏠 Головне меню"]
+)
+WORKER_CITY_KEYBOARD = reply_keyboard(
+    *([city] for city in CITIES), [NEARBY_BUTTON], ["🔎 Пошук за ключовими словами"], ["🔔 Підписки на міста"],
+    ["🔙 Назад"], ["🏠 Головне меню"]
+)
+SEARCH_CITY_KEYBOARD = reply_keyboard(*([city] for city in CITIES), NAVIGATION)
+SEARCH_MORE_KEYBOARD = reply_keyboard(["➡️ Більше результатів"], NAVIGATION)
+JOB_KEYBOARD = reply_keyboard(["➡️ Наступна вакансія", "💬 Написати роботодавцю"], NAVIGATION)
+ADMIN_KEYBOARD = reply_keyboard(
+    ["📊 Статистика", "📝 Всі вакансії"], ["🧬 Дублікати"], ["📥 Імпорт вакансій", "📤 Експорт вакансій"],
+    ["🔙 Назад"]
+)
+STATISTICS_KEYBOARD = reply_keyboard(["📈 Динаміка за 30 днів"], ["🔙 Назад"], ["🏠 Головне меню"])
+EDIT_JOB_KEYBOARD = reply_keyboard(
+    ["📋 Змінити заголовок", "📝 Змінити опис"],
+    ["📍 Змінити місто", "👤 Змінити контакт"],
+    ["🔙 Назад"]
+)
+
+
+def role_keyboard(is_admin):
+    return ADMIN_ROLE_KEYBOARD if is_admin else ROLE_KEYBOARD
+
+
+def install(conn):
+    conn.execute(SCHEMA)
+
+
+def sent_file_id(message):
+    for kind in ('animation', 'video', 'document', 'photo', 'audio', 'voice', 'sticker'):
+        media = getattr(message, kind, None)
+        if media:
+            # Photos come back as a list of sizes, the last one is the original
+            return media[-1].file_id if isinstance(media, list) else media.file_id
+    return None
+
+
+def rejected_file(error):
+    # 400 from Telegram for a file_id it no longer accepts; a blocked chat,
+    # a timeout or an exhausted 429 retry says nothing about the file
+    if getattr(error, 'error_code', None) != 400:
+        return False
+    description = (getattr(error, 'description', None) or '').lower()
+    return 'wrong file identifier' in description or 'file reference' in description
+
+
+class MediaCache:
+    # name -> file_id of media Telegram already has. Persisted in the assets
+    # table so a restart does not upload everything again.
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.file_ids = dict(db.fetchall('SELECT name, file_id FROM assets'))
+
+    def get(self, name, source):
+        # What to pass to send_*: the cached file_id, or the original source
+        # until the first send has returned one
+        with self.lock:
+            return self.file_ids.get(name, source)
+
+    def track(self, name, sent, future):
+        # future is the outbound send of `sent`; remember the file_id it
+        # returns, or forget a cached file_id that Telegram rejected
+        future.add_done_callback(lambda done: self._sent(name, sent, done))
+
+    def _sent(self, name, sent, future):
+        error = future.exception()
+        if error is not None:
+            # Any other error stays with the future for its caller
+            if not rejected_file(error):
+                return
+            with self.lock:
+                cached = self.file_ids.get(name)
+                if cached != sent:
+                    return
+                del self.file_ids[name]
+            self.db.execute('DELETE FROM assets WHERE name = ? AND file_id = ?', (name, sent), wait=False)
+            return
+
+        file_id = sent_file_id(future.result())
+        if file_id is None:
+            return
+        with self.lock:
+            if self.file_ids.get(name) == file_id:
+                return
+            self.file_ids[name] = file_id
+        self.db.execute('''
+            INSERT INTO assets (name, file_id) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                file_id = excluded.file_id,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (name, file_id), wait=False)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+import lifecycle
+from bot import JobTelegramBot
+from metrics import Metrics, MetricsServer
+from outbound import AsyncOutboundScheduler, RateLimitedBot
+from webhook import update_chat_id
+
+logger = logging.getLogger(__name__)
+
+# JobTelegramBot on asyncio. Updates come in by long polling or on an
+# aiohttp webhook and Bot API calls go out through AsyncOutboundScheduler,
+# all on one event loop over AsyncTeleBot's pooled aiohttp session, so a
+# slow Telegram response holds no thread. The handlers are the ones of
+# JobTelegramBot: nearly all they do is SQLite, so they run as they are on
+# a dedicated executor, one update of a chat at a time and in order.
+
+
+class AsyncJobTelegramBot(JobTelegramBot):
+    def __init__(self, token, send_rate=30, job_ttl_days=lifecycle.DEFAULT_TTL_DAYS, maintenance=True,
+                 workers=8, max_pending=10000):
+        self.loop = asyncio.new_event_loop()
+        self.async_bot = AsyncTeleBot(token)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='handler')
+        self.max_pending = max_pending
+        self.pending = 0
+        # The last queued update of every chat that has one
+        self.chats = {}
+        super().__init__(token, send_rate, job_ttl_days, maintenance)
+        # The synchronous TeleBot matches updates to the route handlers on
+        # the executor and makes the odd call off the loop (file URLs)
+        self.bot.threaded = False
+
+    def setup_outbox(self, **limits):
+        self.outbox = AsyncOutboundScheduler(self.loop, **limits)
+        self.api = RateLimitedBot(self.async_bot, self.outbox)
+
+    def setup_metrics(self, metrics):
+        super().setup_metrics(metrics)
+        metrics.gauge('bot_updates_pending', 'Updates received and not handled yet', lambda: self.pending)
+
+    def submit(self, update):
+        # On the loop; update is the JSON object from Telegram
+        chat_id = update_chat_id(update)
+        task = self.loop.create_task(self._handle(self.chats.get(chat_id), update))
+        self.chats[chat_id] = task
+        self.pending += 1
+        task.add_done_callback(lambda done: self._handled(chat_id, done))
+
+    def _handled(self, chat_id, task):
+        self.pending -= 1
+        if self.chats.get(chat_id) is task:
+            del self.chats[chat_id]
+
+    async def _handle(self, previous, update):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.loop.run_in_executor(self.executor, self.process_update, update)
+        except Exception:
+            logger.exception("Update handler failed")
+
+    async def poll(self, timeout=20):
+        offset = None
+        while True:
+            # Stop fetching while the handlers are behind
+            while self.pending >= self.max_pending:
+                await asyncio.sleep(0.05)
+            try:
+                updates = await asyncio_helper.get_updates(
+                    self.async_bot.token, offset, None, timeout, None, timeout + 10
+                )
+            except Exception:
+                logger.exception("getUpdates failed")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update['update_id'] + 1
+                self.submit(update)
+
+    async def serve_webhook(self, url, port, secret_token):
+        async def receive(request):
+            if secret_token and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+                return web.Response(status=403)
+            try:
+                update = await request.json()
+            except ValueError:
+                return web.Response(status=400)
+            if self.pending >= self.max_pending:
+                # Telegram redelivers updates that were not acknowledged
+                return web.Response(status=503)
+            self.submit(update)
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post('/webhook', receive)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '0.0.0.0', port).start()
+        await self.async_bot.remove_webhook()
+        await self.async_bot.set_webhook(url=url, secret_token=secret_token)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    def run(self):
+        self.serve(self.poll())
+
+    def run_webhook(self, url, port=8443, secret_token=None):
+        self.serve(self.serve_webhook(url, port, secret_token))
+
+    def serve(self, main):
+        task = self.loop.create_task(main)
+        try:
+            self.loop.run_until_complete(task)
+        finally:
+            task.cancel()
+            self.shutdown()
+
+    def shutdown(self):
+        self.loop.run_until_complete(self._shutdown())
+
+    async def _shutdown(self):
+        # Every queued update is handled and its replies sent first
+        await asyncio.gather(*self.chats.values(), return_exceptions=True)
+        await self.loop.run_in_executor(None, super().shutdown)
+        self.executor.shutdown()
+        await self.async_bot.close_session()
+
+
+if __name__ == "__main__":
+    webhook_url = os.environ.get('WEBHOOK_URL')
+    bot = AsyncJobTelegramBot(
+        os.environ['BOT_TOKEN'],
+        job_ttl_days=int(os.environ.get('JOB_TTL_DAYS', lifecycle.DEFAULT_TTL_DAYS)),
+        workers=int(os.environ.get('WORKERS', 8))
+    )
+    if os.environ.get('METRICS_PORT'):
+        metrics = Metrics(slow_ms=float(os.environ['SLOW_MS']) if os.environ.get('SLOW_MS') else None)
+        bot.setup_metrics(metrics)
+        MetricsServer(metrics, port=int(os.environ['METRICS_PORT'])).start()
+    if webhook_url:
+        bot.run_webhook(webhook_url, port=int(os.environ.get('PORT', 8443)),
+                        secret_token=os.environ.get('WEBHOOK_SECRET'))
+    else:
+        bot.run()
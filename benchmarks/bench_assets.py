@@ -0,0 +1,98 @@
+# Per-reply cost of keyboards and the welcome animation: markups rebuilt and
+# serialized by telebot on every send vs the prebuilt JSON from assets.py.
+# Payload is the urlencoded request telebot sends to the Bot API.
+#
+#   python benchmarks/bench_assets.py [--repeat 20000]
+
+import argparse
+import os
+import sys
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot import types  # noqa: E402
+
+import assets  # noqa: E402
+
+# Shape of a real animation file_id returned by Telegram
+FILE_ID = 'CgACAgQAAxkBAAIBY2VkZWFkYmVlZl9hbmltYXRpb25fZmlsZV9pZF9zYW1wbGUAAh4E'
+
+
+def old_keyboard(*rows):
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    for row in rows:
+        markup.add(*(types.KeyboardButton(text) for text in row))
+    return markup
+
+
+NAVIGATION = ["🔙 Назад", "🏠 Головне меню"]
+
+# reply -> (rebuild the old way, prebuilt keyboard, text or caption)
+REPLIES = {
+    'role menu': (
+        lambda: old_keyboard(["👔 Роботодавець", "👷 Шукаю роботу"]),
+        assets.ROLE_KEYBOARD,
+        "🌟 Вітаємо у Job Search Bot! 🌟\n\nОберіть свою роль для продовження:"
+    ),
+    'worker cities': (
+        lambda: old_keyboard(*([city] for city in assets.CITIES), ["🔎 Пошук за ключовими словами"],
+                             ["🔙 Назад"], ["🏠 Головне меню"]),
+        assets.WORKER_CITY_KEYBOARD,
+        "🔍 Оберіть місто для пошуку роботи:"
+    ),
+    'job card': (
+        lambda: old_keyboard(["➡️ Наступна вакансія", "💬 Написати роботодавцю"], NAVIGATION),
+        assets.JOB_KEYBOARD,
+        "📋 Вакансія 3/120:\n\n🔹 Назва: Бариста\n\n📝 Опис:\nКава, сервіс, графік 2/2\n\n"
+        "📍 Місто: 🌇 Львів\n👤 Контакт: @employer"
+    ),
+    'navigation': (
+        lambda: old_keyboard(NAVIGATION),
+        assets.NAVIGATION_KEYBOARD,
+        "📋 Введіть заголовок вакансії:"
+    ),
+}
+
+
+def per_call(fn, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) / repeat
+
+
+def payload(markup, text, media=None):
+    params = {'chat_id': 123456789, 'reply_markup': markup}
+    if media is None:
+        params['text'] = text
+    else:
+        params['animation'] = media
+        params['caption'] = text
+    return len(urlencode(params))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'reply':<16}{'cpu old':>12}{'cpu new':>12}{'bytes old':>12}{'bytes new':>12}")
+    for name, (build, prebuilt, text) in REPLIES.items():
+        # telebot serializes a markup object on every send, a string as is
+        old_cpu = per_call(lambda: build().to_json(), args.repeat)
+        new_cpu = per_call(lambda: prebuilt, args.repeat)
+        if name == 'role menu':
+            old_bytes = payload(build().to_json(), text, assets.WELCOME_ANIMATION)
+            new_bytes = payload(prebuilt, text, FILE_ID)
+        else:
+            old_bytes = payload(build().to_json(), text)
+            new_bytes = payload(prebuilt, text)
+        print(f"{name:<16}{old_cpu * 1e6:9.2f} us{new_cpu * 1e6:9.2f} us{old_bytes:12d}{new_bytes:12d}")
+    print("role menu is sent with the welcome animation: by URL before, by cached file_id after "
+          "(Telegram no longer refetches the GIF)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# The threaded bot against async_bot.py at a growing number of concurrent
+# chats, measured end to end with loadtest.py. Every Bot API call of the
+# fake API takes --api-latency-ms, roughly the round trip to Telegram, which
+# is where the threaded bot's fixed pool of sender threads waits and the
+# event loop does not.
+#
+#   python benchmarks/bench_async.py [--clients 8 32 128] [--api-latency-ms 50] [--duration 20]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+LOADTEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest.py')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engines', nargs='+', choices=('threaded', 'async'), default=['threaded', 'async'])
+    parser.add_argument('--clients', type=int, nargs='+', default=[8, 32, 128])
+    parser.add_argument('--api-latency-ms', type=float, default=50)
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--jobs', type=int, default=20000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    print(f"Bot API latency {args.api_latency_ms:.0f} ms, {args.mode}")
+    print(f"{'engine':>9}{'clients':>9}{'updates/s':>12}{'reply p50':>12}{'reply p99':>12}"
+          f"{'peak RSS':>11}{'errors':>8}")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for clients in args.clients:
+            for engine in args.engines:
+                report_path = os.path.join(tmp, f'{engine}-{clients}.json')
+                subprocess.run([
+                    sys.executable, LOADTEST, '--engine', engine, '--mode', args.mode,
+                    '--clients', str(clients), '--duration', str(args.duration),
+                    '--users', str(args.users), '--jobs', str(args.jobs),
+                    '--api-latency-ms', str(args.api_latency_ms), '--output', report_path,
+                ], check=True, stdout=subprocess.DEVNULL)
+                with open(report_path) as f:
+                    report = json.load(f)
+                steps = [flow['reply_ms'] for flow in report['flows'].values() if flow['reply_ms']]
+                p50 = max(step['p50'] for step in steps)
+                p99 = max(step['p99'] for step in steps)
+                print(f"{engine:>9}{clients:>9}{report['updates_per_sec']:>12.1f}{p50:>9.1f} ms{p99:>9.1f} ms"
+                      f"{report['peak_rss_kb'] / 1024:>8.0f} MB{report['errors']:>8}")
+                results.append({'engine': engine, 'clients': clients, 'report': report})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# Bulk import and export of vacancies (bulk.py) on the bot's schema with
+# its triggers: import throughput of a synthetic CSV, the latency of the
+# reads and small writes the bot keeps doing meanwhile, export throughput
+# to CSV and gzipped JSON lines, and peak RSS after each step to show that
+# neither side holds the file in memory.
+#
+#   python benchmarks/bench_bulk.py [--jobs 1000000] [--chunk-size 2000]
+
+import argparse
+import csv
+import gzip
+import os
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk  # noqa: E402
+import geo  # noqa: E402
+import lifecycle  # noqa: E402
+import search  # noqa: E402
+import stats  # noqa: E402
+import synthetic  # noqa: E402
+from assets import CITIES  # noqa: E402
+from storage import Storage  # noqa: E402
+
+
+def prepare(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY, employer_id INTEGER, title TEXT, description TEXT,
+            location TEXT, telegram_username TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, joined_at TIMESTAMP)')
+    conn.execute('CREATE TABLE sessions (chat_id INTEGER PRIMARY KEY, state TEXT, data TEXT, updated_at TIMESTAMP)')
+    conn.execute('CREATE INDEX idx_jobs_location_created ON jobs (location, created_at, id)')
+    conn.execute('CREATE INDEX idx_jobs_created ON jobs (created_at, id)')
+    conn.execute('BEGIN')
+    stats.install(conn)
+    search.install(conn)
+    lifecycle.install(conn, lifecycle.DEFAULT_TTL_DAYS)
+    geo.install(conn)
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def write_csv(path, count):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('employer_id', 'title', 'description', 'location', 'telegram_username', 'created_at'))
+        writer.writerows(synthetic.jobs(count, seed=4))
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples) * 1000, samples[int(len(samples) * 0.99)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=bulk.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'import.csv')
+        write_csv(source, args.jobs)
+        path = os.path.join(tmp, 'bench.db')
+        prepare(path)
+        db = Storage(path)
+        baseline = peak_rss_mb()
+
+        # What the bot keeps doing during the import: browsing a city and
+        # saving a conversation state, each every 10 ms
+        reads, writes = [], []
+        done = threading.Event()
+
+        def interactive():
+            chat_id = 0
+            while not done.is_set():
+                started = time.perf_counter()
+                db.fetchone('''
+                    SELECT * FROM jobs WHERE location = ? AND expires_at > datetime('now')
+                    ORDER BY created_at, id LIMIT 1
+                ''', (CITIES[chat_id % len(CITIES)],))
+                reads.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                db.execute('INSERT OR REPLACE INTO sessions (chat_id, state, updated_at) VALUES (?, ?, ?)',
+                           (chat_id % 1000, 'AWAITING_JOB_TITLE', time.time()))
+                writes.append(time.perf_counter() - started)
+                chat_id += 1
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=interactive)
+        thread.start()
+        started = time.perf_counter()
+        with open(source, 'rb') as f:
+            imported, rejected, _ = bulk.import_jobs(db, f, 'csv', chunk_size=args.chunk_size)
+        import_seconds = time.perf_counter() - started
+        done.set()
+        thread.join()
+        import_rss = peak_rss_mb()
+
+        exports = []
+        for name, kind, opener in (('export.csv', 'csv', open), ('export.jsonl.gz', 'jsonl', gzip.open)):
+            target = os.path.join(tmp, name)
+            started = time.perf_counter()
+            with opener(target, 'wt', encoding='utf-8', newline='') as f:
+                count = bulk.export_jobs(db, f, kind)
+            exports.append((name, count, time.perf_counter() - started, os.path.getsize(target), peak_rss_mb()))
+        db.close()
+        source_size = os.path.getsize(source)
+
+    read_p50, read_p99 = percentiles(reads)
+    write_p50, write_p99 = percentiles(writes)
+    print(f"import              {imported} vacancies ({rejected} rejected) from {source_size / 2 ** 20:.0f} MB CSV "
+          f"in {import_seconds:.1f} s, {imported / import_seconds:.0f} rows/s, chunks of {args.chunk_size}")
+    print(f"during the import   city browse p50 {read_p50:.2f} ms, p99 {read_p99:.2f} ms; "
+          f"session save p50 {write_p50:.2f} ms, p99 {write_p99:.2f} ms")
+    print(f"peak RSS            {baseline:.0f} MB before, {import_rss:.0f} MB after the import")
+    for name, count, seconds, size, rss in exports:
+        print(f"export {name:<16} {count} rows, {size / 2 ** 20:.0f} MB in {seconds:.1f} s, "
+              f"{count / seconds:.0f} rows/s, peak RSS {rss:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
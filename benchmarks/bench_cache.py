@@ -0,0 +1,236 @@
+# Listing cache (cache.py) on the bot's full schema: city browsing with
+# the cache against the query and formatting it replaces, from several
+# handler threads; the same browsing while vacancies are posted, edited and
+# deleted through the bot's write path and by another connection; then
+# every city walked through the cache and with plain queries, which must
+# agree card for card. Also the hit rate, evictions and the cache's size
+# estimate against what tracemalloc measures.
+#
+#   python benchmarks/bench_cache.py [--jobs 200000] [--threads 4] [--seconds 5] [--max-bytes 33554432]
+
+import argparse
+import functools
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import migrations  # noqa: E402
+import synthetic  # noqa: E402
+from assets import CITIES  # noqa: E402
+from bot import JobTelegramBot  # noqa: E402
+from storage import Storage  # noqa: E402
+
+# The bot's card; render_job does not use the bot's state
+render = functools.partial(JobTelegramBot.render_job, None)
+
+
+def uncached_next(db, location, after):
+    # What display_job did before the cache: a query and the formatting
+    if after is None:
+        job = db.fetchone('''
+            SELECT * FROM jobs WHERE location = ? AND expires_at > datetime('now')
+            ORDER BY created_at, id LIMIT 1
+        ''', (location,))
+    else:
+        job = db.fetchone('''
+            SELECT * FROM jobs WHERE location = ? AND (created_at, id) > (?, ?)
+                AND expires_at > datetime('now')
+            ORDER BY created_at, id LIMIT 1
+        ''', (location, after[0], after[1]))
+    if job is None:
+        return None
+    return (job[6], job[0]), render(job)
+
+
+def browse(next_job, rng, samples, stop):
+    # Viewers open a city weighted by its size and read a few vacancies
+    steps = 0
+    while not stop():
+        location = rng.choices(CITIES, synthetic.CITY_WEIGHTS)[0]
+        cursor = None
+        for _ in range(min(50, int(rng.expovariate(1 / 8)) + 1)):
+            started = time.perf_counter()
+            found = next_job(location, cursor)
+            if found is None:
+                break
+            cursor = found[0]
+            samples.append(time.perf_counter() - started)
+            steps += 1
+    return steps
+
+
+def run_browsing(next_job, threads, seconds, seed=1):
+    samples = []
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(index):
+        counts[index] = browse(next_job, random.Random(seed + index), samples,
+                               lambda: time.perf_counter() >= deadline)
+
+    pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    samples.sort()
+    return sum(counts) / seconds, statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99)] * 1e6
+
+
+def writer(db, listings, stop, counters, seed=7):
+    # Posts, edits and deletes the way the handlers do: the write, then
+    # changed(); right after every edit the edited card is browsed to again
+    rng = random.Random(seed)
+    rows = synthetic.jobs(10 ** 9, seed=seed)
+    while not stop.is_set():
+        action = rng.random()
+        location = rng.choices(CITIES, synthetic.CITY_WEIGHTS)[0]
+        if action < 0.4:
+            row = next(rows)
+            db.execute('''
+                INSERT INTO jobs (employer_id, title, description, location, telegram_username)
+                VALUES (?, ?, ?, ?, ?)
+            ''', row[:5])
+            listings.changed()
+            counters['inserts'] += 1
+        else:
+            head = db.fetchall('''
+                SELECT * FROM jobs WHERE location = ? AND expires_at > datetime('now')
+                ORDER BY created_at, id LIMIT 50
+            ''', (location,))
+            if len(head) < 2:
+                continue
+            index = rng.randrange(1, len(head))
+            job = head[index]
+            if action < 0.8:
+                title = f"{job[2].split(' #')[0]} #{rng.randrange(10 ** 6)}"
+                db.execute('UPDATE jobs SET title = ? WHERE id = ?', (title, job[0]))
+                listings.changed()
+                counters['edits'] += 1
+                previous = head[index - 1]
+                found = listings.next_job(location, (previous[6], previous[0]))
+                current = db.fetchone('SELECT * FROM jobs WHERE id = ?', (job[0],))
+                if found is None or found[1] != render(current):
+                    counters['stale_reads'] += 1
+            else:
+                db.execute('DELETE FROM jobs WHERE id = ?', (job[0],))
+                listings.changed()
+                counters['deletes'] += 1
+        time.sleep(0.005)
+
+
+def outsider(path, stop, counters, seed=8):
+    # Another process: no changed(), seen within SYNC_INTERVAL
+    conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+    rng = random.Random(seed)
+    while not stop.is_set():
+        location = rng.choice(CITIES)
+        conn.execute('''
+            UPDATE jobs SET description = description || ' +' WHERE id = (
+                SELECT id FROM jobs WHERE location = ? AND expires_at > datetime('now')
+                ORDER BY created_at, id LIMIT 1 OFFSET ?
+            )
+        ''', (location, rng.randrange(20)))
+        counters['outside_edits'] += 1
+        time.sleep(0.05)
+    conn.close()
+
+
+def compare(db, listings, steps=2000):
+    # Cards and order of every city through the cache and with queries
+    mismatches = 0
+    for location in CITIES:
+        cursor = plain = None
+        for _ in range(steps):
+            cached = listings.next_job(location, cursor)
+            expected = uncached_next(db, location, plain)
+            if cached != expected:
+                mismatches += 1
+                break
+            if cached is None:
+                break
+            cursor = plain = cached[0]
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--max-bytes', type=int, default=cache.CACHE_BYTES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        db = Storage(path)
+        migrations.migrate(db)
+        synthetic.populate(db, args.users, args.jobs)
+        print(f"{args.jobs} vacancies, {args.threads} browsing threads, {args.seconds:.0f} s per run")
+
+        rate, p50, p99 = run_browsing(functools.partial(uncached_next, db), args.threads, args.seconds)
+        print(f"query + render      {rate:>9.0f} steps/s   p50 {p50:7.1f} us   p99 {p99:7.1f} us")
+
+        listings = cache.ListingCache(db, render, max_bytes=args.max_bytes)
+        rate, p50, p99 = run_browsing(listings.next_job, args.threads, args.seconds)
+        stats = listings.stats()
+        hit_rate = stats['hits'] / max(1, stats['hits'] + stats['misses'])
+        print(f"cache               {rate:>9.0f} steps/s   p50 {p50:7.1f} us   p99 {p99:7.1f} us   "
+              f"hit rate {hit_rate:.1%}, {stats['entries']} entries, {stats['bytes'] / 2 ** 20:.1f} MB, "
+              f"{stats['evictions']} evictions")
+
+        counters = dict.fromkeys(('inserts', 'edits', 'deletes', 'stale_reads', 'outside_edits'), 0)
+        stop = threading.Event()
+        writers = [
+            threading.Thread(target=writer, args=(db, listings, stop, counters)),
+            threading.Thread(target=outsider, args=(path, stop, counters)),
+        ]
+        for thread in writers:
+            thread.start()
+        before = listings.stats()
+        rate, p50, p99 = run_browsing(listings.next_job, args.threads, args.seconds, seed=100)
+        stop.set()
+        for thread in writers:
+            thread.join()
+        stats = listings.stats()
+        hits, misses = stats['hits'] - before['hits'], stats['misses'] - before['misses']
+        print(f"cache + writes      {rate:>9.0f} steps/s   p50 {p50:7.1f} us   p99 {p99:7.1f} us   "
+              f"hit rate {hits / max(1, hits + misses):.1%}, "
+              f"{stats['invalidations'] - before['invalidations']} invalidations")
+        print(f"writes              {counters['inserts']} posts, {counters['edits']} edits, "
+              f"{counters['deletes']} deletes, {counters['outside_edits']} edits by another connection; "
+              f"edited cards read back stale: {counters['stale_reads']}")
+
+        listings.changed()
+        print(f"cache vs queries    {compare(db, listings)} cities differ after the writes")
+
+        # Size estimate against the allocations of a cache filled from empty
+        fresh = cache.ListingCache(db, render, max_bytes=args.max_bytes)
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for location in CITIES:
+            cursor = None
+            for _ in range(cache.CITY_WINDOW):
+                found = fresh.next_job(location, cursor)
+                if found is None:
+                    break
+                cursor = found[0]
+        traced = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        print(f"memory              {fresh.stats()['entries']} entries, estimate {fresh.bytes / 2 ** 20:.1f} MB, "
+              f"traced {traced / 2 ** 20:.1f} MB")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Throughput of the chat-sharded cluster at 1, 2, 4 and 8 worker processes,
+# measured end to end with loadtest.py. Scaling needs as many free cores as
+# workers; the fake Bot API and the virtual users share the machine too.
+#
+#   python benchmarks/bench_cluster.py [--workers 1 2 4 8] [--clients 64] [--duration 20]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+LOADTEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest.py')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--jobs', type=int, default=20000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>8}{'updates/s':>12}{'reply p50':>12}{'reply p99':>12}{'errors':>8}")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            report_path = os.path.join(tmp, f'{workers}.json')
+            subprocess.run([
+                sys.executable, LOADTEST, '--cluster', str(workers), '--clients', str(args.clients),
+                '--duration', str(args.duration), '--users', str(args.users), '--jobs', str(args.jobs),
+                '--output', report_path,
+            ], check=True, stdout=subprocess.DEVNULL)
+            with open(report_path) as f:
+                report = json.load(f)
+            steps = [flow['reply_ms'] for flow in report['flows'].values() if flow['reply_ms']]
+            p50 = max(step['p50'] for step in steps)
+            p99 = max(step['p99'] for step in steps)
+            print(f"{workers:>8}{report['updates_per_sec']:>12.1f}{p50:>9.1f} ms{p99:>9.1f} ms{report['errors']:>8}")
+            results.append({'workers': workers, 'report': report})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# Near-duplicate detection (dedup.py) on a synthetic corpus: bulk index
+# build speed and insert-time check latency; precision / recall of the
+# MinHash + LSH matches against the exact Jaccard similarity of the
+# shingles (brute force over the city); and how many reposts, made from
+# indexed vacancies with small edits, are caught. The generator has a small
+# vocabulary, so many distinct synthetic vacancies are near duplicates too.
+#
+#   python benchmarks/bench_dedup.py [--jobs 100000] [--queries 2000]
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup  # noqa: E402
+import synthetic  # noqa: E402
+from storage import Storage  # noqa: E402
+
+EXTRAS = ["Терміново!", "Чекаємо саме на вас.", "Дзвоніть у будь-який час.", "Без досвіду."]
+
+
+def repost(rng, title, description):
+    # One or two of the edits employers make when they post a vacancy again
+    for _ in range(rng.randint(1, 2)):
+        edit = rng.randrange(5)
+        if edit == 0:
+            description = re.sub(r'\d+ 000', f'{rng.randrange(12, 60)} 000', description)
+        elif edit == 1:
+            description = description + " " + rng.choice(EXTRAS)
+        elif edit == 2:
+            title = title.upper() + "!"
+        elif edit == 3:
+            words = description.split(' ')
+            del words[rng.randrange(len(words))]
+            description = ' '.join(words)
+        else:
+            description = description.replace(',', ';').replace('.', '!')
+    return title, description
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(11)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Storage(os.path.join(tmp, 'bench.db'))
+        db.execute('''
+            CREATE TABLE jobs (
+                id INTEGER PRIMARY KEY, employer_id INTEGER, title TEXT, description TEXT,
+                location TEXT, telegram_username TEXT, created_at TIMESTAMP, expires_at TIMESTAMP
+            )
+        ''')
+        db.run(dedup.install)
+        for batch in synthetic.batches(synthetic.jobs(args.jobs, seed=3), 5000):
+            db.executemany('''
+                INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', batch)
+
+        started = time.perf_counter()
+        dedup.build(db)
+        build_seconds = time.perf_counter() - started
+        clustered = db.fetchone('SELECT COUNT(*) FROM job_clusters')[0]
+
+        # Half reposts of indexed vacancies, half vacancies never seen before
+        originals = db.fetchall('SELECT id, title, description, location FROM jobs ORDER BY random() LIMIT ?',
+                                (args.queries // 2,))
+        queries = [(job_id, location) + repost(rng, title, description)
+                   for job_id, title, description, location in originals]
+        queries += [(None, job[3], job[1], job[2])
+                    for job in synthetic.jobs(args.queries - len(queries), seed=99)]
+        rng.shuffle(queries)
+
+        conn = db.reader()
+        latencies = []
+        results = []
+        for origin, location, title, description in queries:
+            started = time.perf_counter()
+            found = dedup.matches(conn, location, dedup.signature(title, description))
+            latencies.append(time.perf_counter() - started)
+            results.append({job_id for _, job_id, _ in found})
+
+        by_city = {}
+        for job_id, title, description, location in db.iterate('SELECT id, title, description, location FROM jobs'):
+            by_city.setdefault(location, []).append((job_id, dedup.shingles(title, description)))
+        found_total = exact_total = both = found_reposts = flagged_fresh = 0
+        for (origin, location, title, description), found in zip(queries, results):
+            query = dedup.shingles(title, description)
+            exact = {job_id for job_id, other in by_city[location]
+                     if len(query & other) >= dedup.SIMILARITY * len(query | other)}
+            found_total += len(found)
+            exact_total += len(exact)
+            both += len(found & exact)
+            if origin is None and found:
+                flagged_fresh += 1
+            if origin in found:
+                found_reposts += 1
+        db.close()
+
+    reposts = sum(1 for query in queries if query[0] is not None)
+    latencies.sort()
+    print(f"corpus              {args.jobs} vacancies, {clustered} already in duplicate clusters")
+    print(f"bulk build          {build_seconds:.1f} s, {args.jobs / build_seconds:.0f} vacancies/s")
+    print(f"insert-time check   p50 {statistics.median(latencies) * 1000:.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms (signature + LSH lookup)")
+    print(f"vs exact Jaccard    precision {both / max(1, found_total):.3f}, recall {both / max(1, exact_total):.3f} "
+          f"({exact_total} pairs at >= {dedup.SIMILARITY})")
+    print(f"reposts caught      {found_reposts} of {reposts}")
+    print(f"fresh flagged       {flagged_fresh} of {len(queries) - reposts} vacancies that are not reposts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# New-vacancy fan-out to the subscribers of one city through the real
+# OutboundScheduler and a local stub Bot API:
+#   1. throughput, how long the posting employer waits, and interactive
+#      reply latency while the fan-out runs;
+#   2. how long a vacancy posted meanwhile in a small city waits for its
+#      own fan-out;
+#   3. a worker process killed mid fan-out and resumed from the stored
+#      cursor, counting subscribers reached twice or never.
+#
+#   python benchmarks/bench_fanout.py [--subscribers 100000] [--rate 2000]
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fanout  # noqa: E402
+from assets import CITIES  # noqa: E402
+from outbound import OutboundScheduler, RateLimitedBot  # noqa: E402
+from storage import Storage  # noqa: E402
+
+CITY = CITIES[0]
+SMALL_CITY = CITIES[1]
+SMALL_SUBSCRIBERS = 100
+# Chat ids of the small city's subscribers start here
+SMALL_BASE = 10 ** 8
+EMPLOYER = 10 ** 9
+
+
+class StubBotApi:
+    # Appends every chat it sends to, one line per message, to a file shared
+    # by the killed worker and the one that resumes
+    def __init__(self, path, latency):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        self.latency = latency
+
+    def send_message(self, chat_id, text, **kwargs):
+        time.sleep(self.latency)
+        os.write(self.fd, b'%d\n' % chat_id)
+
+
+def prepare(path, subscribers):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY, employer_id INTEGER, title TEXT, description TEXT,
+            location TEXT, telegram_username TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    ''')
+    conn.execute('BEGIN')
+    fanout.install(conn)
+    conn.executemany('INSERT INTO subscriptions (location, chat_id) VALUES (?, ?)',
+                     ((CITY, chat_id) for chat_id in range(1, subscribers + 1)))
+    conn.executemany('INSERT INTO subscriptions (location, chat_id) VALUES (?, ?)',
+                     ((SMALL_CITY, SMALL_BASE + index) for index in range(SMALL_SUBSCRIBERS)))
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def post(db, city=CITY):
+    def write(conn):
+        job_id = conn.execute('''
+            INSERT INTO jobs (employer_id, title, description, location, telegram_username)
+            VALUES (?, 'Бариста', 'Обов''язки: приготування кави', ?, '@employer')
+        ''', (EMPLOYER, city)).lastrowid
+        fanout.enqueue(conn, job_id, city)
+        return job_id
+
+    started = time.perf_counter()
+    job_id = db.run(write)
+    return time.perf_counter() - started, job_id
+
+
+def make_engine(path, log, rate, latency, batch_size):
+    db = Storage(path)
+    scheduler = OutboundScheduler(global_rate=rate, global_burst=rate / 10, chat_rate=1, chat_burst=3,
+                                  senders=16)
+    api = RateLimitedBot(StubBotApi(log, latency), scheduler)
+    return db, scheduler, api, fanout.FanoutEngine(db, api, batch_size=batch_size, poll_interval=0.05)
+
+
+def wait_done(db):
+    while db.fetchone('SELECT COUNT(*) FROM fanout_jobs')[0]:
+        time.sleep(0.05)
+
+
+def crash_worker(path, log, rate, latency, batch_size):
+    db, scheduler, api, engine = make_engine(path, log, rate, latency, batch_size)
+    engine.start()
+    wait_done(db)
+
+
+def delivered(log):
+    # Subscribers of the big city only; the interactive replies go to
+    # negative chat ids
+    with open(log) as f:
+        chat_ids = [chat_id for chat_id in map(int, f) if 0 < chat_id < SMALL_BASE]
+    return len(chat_ids), len(set(chat_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=100000)
+    parser.add_argument('--rate', type=float, default=2000, help="global send rate of the stub run")
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        log = os.path.join(tmp, 'sent.log')
+        prepare(path, args.subscribers)
+
+        db, scheduler, api, engine = make_engine(path, log, args.rate, latency, args.batch_size)
+        engine.start()
+        posting, _ = post(db)
+        engine.notify()
+        started = time.perf_counter()
+
+        # An interactive reply to some other chat every 20 ms while the fan-out runs
+        replies = []
+        done = threading.Event()
+
+        def interactive():
+            chat_id = -1
+            while not done.is_set():
+                sent = time.perf_counter()
+                api.send_message(chat_id, "reply").add_done_callback(
+                    lambda future, sent=sent: replies.append(time.perf_counter() - sent))
+                chat_id -= 1
+                time.sleep(0.02)
+
+        thread = threading.Thread(target=interactive)
+        thread.start()
+        # A vacancy in a small city a moment into the big fan-out
+        time.sleep(0.5)
+        _, small_job = post(db, SMALL_CITY)
+        engine.notify()
+        small_started = time.perf_counter()
+        while db.fetchone('SELECT 1 FROM fanout_jobs WHERE job_id = ?', (small_job,)):
+            time.sleep(0.005)
+        small_waited = time.perf_counter() - small_started
+        wait_done(db)
+        elapsed = time.perf_counter() - started
+        done.set()
+        thread.join()
+        engine.close()
+        scheduler.close()
+        db.close()
+
+        total, unique = delivered(log)
+        replies.sort()
+        print(f"subscribers         {args.subscribers}")
+        print(f"employer waited     {posting * 1000:.2f} ms to save and queue the fan-out")
+        print(f"fan-out             {elapsed:.1f} s, {unique / elapsed:.0f} messages/s "
+              f"(stub limit {args.rate:.0f}/s; at Telegram's 30/s: {args.subscribers / 30 / 60:.0f} min)")
+        print(f"delivered           {unique} of {args.subscribers}, {total - unique} twice")
+        print(f"interactive replies p50 {statistics.median(replies) * 1000:.1f} ms, "
+              f"p99 {replies[int(len(replies) * 0.99)] * 1000:.1f} ms during the fan-out")
+        print(f"small city          {SMALL_SUBSCRIBERS} subscribers, posted during the fan-out, "
+              f"all sent in {small_waited:.2f} s")
+
+        # Crash and resume
+        os.remove(log)
+        db = Storage(path)
+        post(db)
+        db.close()
+        context = multiprocessing.get_context('spawn')
+        worker = context.Process(target=crash_worker, args=(path, log, args.rate, latency, args.batch_size))
+        worker.start()
+        while not os.path.exists(log) or os.path.getsize(log) < args.subscribers * 2:
+            time.sleep(0.01)
+        os.kill(worker.pid, signal.SIGKILL)
+        worker.join()
+        before, _ = delivered(log)
+
+        db, scheduler, api, engine = make_engine(path, log, args.rate, latency, args.batch_size)
+        engine.start()
+        wait_done(db)
+        engine.close()
+        scheduler.close()
+        db.close()
+        total, unique = delivered(log)
+        print(f"killed after        {before} messages, resumed from the stored cursor")
+        print(f"delivered           {unique} of {args.subscribers}, {total - unique} twice, "
+              f"{args.subscribers - unique} never")
+
+
+if __name__ == '__main__':
+    main()
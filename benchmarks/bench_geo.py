@@ -0,0 +1,145 @@
+# Nearest-vacancy search (geo.py) on the bot's full schema. Half of the
+# vacancies sit at their city centre; the other half were posted from a
+# shared location, scattered around the cities and across the country.
+# Seekers near the cities and anywhere else ask for the first page and
+# page through; the results are checked against a full scan of the
+# vacancies in radius sorted in Python, which is also timed as the
+# baseline.
+#
+#   python benchmarks/bench_geo.py [--jobs 1000000] [--queries 500] [--checks 50]
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo  # noqa: E402
+import migrations  # noqa: E402
+import synthetic  # noqa: E402
+from assets import CITIES  # noqa: E402
+from storage import Storage  # noqa: E402
+
+# Roughly the country's bounding box
+SOUTH, NORTH, WEST, EAST = 45.3, 52.3, 22.2, 40.2
+PAGES = 5
+
+
+def point(rng, spread_km=15):
+    # Near a city weighted by its size, or anywhere
+    if rng.random() < 0.2:
+        return rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)
+    latitude, longitude = geo.CITY_COORDINATES[rng.choices(CITIES, synthetic.CITY_WEIGHTS)[0]]
+    return rng.gauss(latitude, spread_km / 111), rng.gauss(longitude, spread_km / 72)
+
+
+def populate(db, count, seed=3):
+    rng = random.Random(seed)
+    rows = []
+    shared = []
+    for employer_id, title, description, location, username, created_at in synthetic.jobs(count, seed=seed):
+        if rng.random() < 0.5:
+            shared.append(len(rows))
+            latitude, longitude = point(rng)
+            location = geo.nearest_city(latitude, longitude)
+            rows.append([employer_id, title, description, location, username, created_at,
+                         (round(latitude, geo.PLACE_DECIMALS), round(longitude, geo.PLACE_DECIMALS))])
+        else:
+            rows.append([employer_id, title, description, location, username, created_at, None])
+    db.executemany('INSERT OR IGNORE INTO places (latitude, longitude) VALUES (?, ?)',
+                   [rows[index][6] for index in shared])
+    places = {(latitude, longitude): place_id
+              for place_id, latitude, longitude in db.fetchall('SELECT id, latitude, longitude FROM places')}
+    cities = dict(db.fetchall('SELECT location, place_id FROM city_places'))
+    for row in rows:
+        row[6] = cities[row[3]] if row[6] is None else places[row[6]]
+    for batch in synthetic.batches(rows, 5000):
+        db.executemany('''
+            INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at, place_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+
+
+def scan(db, latitude, longitude, limit, radius_km=geo.RADIUS_KM):
+    # Every live vacancy with its place, distance computed for all
+    results = []
+    for job_id, created_at, place_id, place_latitude, place_longitude in db.iterate('''
+        SELECT jobs.id, jobs.created_at, places.id, places.latitude, places.longitude
+        FROM jobs JOIN places ON places.id = jobs.place_id
+        WHERE jobs.expires_at > datetime('now')
+    ''', size=10000):
+        km = geo.distance(latitude, longitude, place_latitude, place_longitude)
+        if km <= radius_km:
+            results.append((km, place_id, created_at, job_id))
+    # Nearest place first, newest first within a place (sorts are stable)
+    results.sort(key=lambda row: (row[2], row[3]), reverse=True)
+    results.sort(key=lambda row: (row[0], row[1]))
+    return [job_id for _, _, _, job_id in results[:limit]]
+
+
+def pages(db, latitude, longitude, count, timings):
+    ids = []
+    after = None
+    for page in range(count):
+        started = time.perf_counter()
+        found = geo.nearby(db, latitude, longitude, 5, after)
+        timings[page].append(time.perf_counter() - started)
+        if not found:
+            break
+        ids.extend(job[0] for _, job in found)
+        after = geo.cursor(*found[-1])
+    return ids
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--checks', type=int, default=50)
+    args = parser.parse_args()
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        db = Storage(path)
+        migrations.migrate(db)
+        started = time.perf_counter()
+        populate(db, args.jobs)
+        places = db.fetchone('SELECT COUNT(*) FROM places WHERE jobs > 0')[0]
+        size = os.path.getsize(path) + os.path.getsize(path + '-wal')
+        print(f"{args.jobs} vacancies at {places} places, loaded in {time.perf_counter() - started:.0f} s, "
+              f"{size / 2 ** 20:.0f} MB")
+
+        timings = [[] for _ in range(PAGES)]
+        for _ in range(args.queries):
+            pages(db, *point(rng, spread_km=25), PAGES, timings)
+        for page, samples in enumerate(timings, 1):
+            p50, p99 = percentiles(samples)
+            print(f"nearby, page {page}      p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   ({len(samples)} queries)")
+
+        mismatches = 0
+        scans = []
+        for _ in range(args.checks):
+            latitude, longitude = point(rng, spread_km=25)
+            found = pages(db, latitude, longitude, PAGES, [[] for _ in range(PAGES)])
+            started = time.perf_counter()
+            expected = scan(db, latitude, longitude, PAGES * 5)
+            scans.append(time.perf_counter() - started)
+            mismatches += found != expected
+        p50, p99 = percentiles(scans)
+        print(f"full scan, 5 pages   p50 {p50:7.0f} ms   p99 {p99:7.0f} ms   ({args.checks} queries)")
+        print(f"differences from the scan: {mismatches} of {args.checks}")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# City browse latency as posting history grows: every vacancy ever posted
+# kept in jobs vs expired vacancies moved to jobs_archive by the Archiver.
+# Postings arrive at a steady rate, so the live set stays the same size
+# (live_jobs over ttl_days) while the history grows.
+#
+#   python benchmarks/bench_lifecycle.py [--history 50000 200000 1000000] [--live 20000]
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lifecycle  # noqa: E402
+import search  # noqa: E402
+import stats  # noqa: E402
+from assets import CITIES  # noqa: E402
+from storage import Storage  # noqa: E402
+
+TTL_DAYS = 30
+
+# The bot's queries: first vacancy of a city, the next one, and the total
+FIRST = '''
+    SELECT * FROM jobs WHERE location = ? AND expires_at > datetime('now')
+    ORDER BY created_at, id LIMIT 1
+'''
+NEXT = '''
+    SELECT * FROM jobs WHERE location = ? AND (created_at, id) > (?, ?)
+        AND expires_at > datetime('now')
+    ORDER BY created_at, id LIMIT 1
+'''
+OLD_COUNT = 'SELECT COUNT(*) FROM jobs WHERE location = ?'
+
+
+def prepare(path, history, live):
+    rng = random.Random(5)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY, employer_id INTEGER, title TEXT, description TEXT,
+            location TEXT, telegram_username TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, joined_at TIMESTAMP)')
+    conn.execute('CREATE INDEX idx_jobs_location_created ON jobs (location, created_at, id)')
+    conn.execute('BEGIN')
+    stats.install(conn)
+    search.install(conn)
+    lifecycle.install(conn, TTL_DAYS)
+    # `live` postings per TTL_DAYS, the oldest `history / live * TTL_DAYS` days ago
+    span = history / live * TTL_DAYS * 86400
+    conn.executemany(
+        "INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at) "
+        "VALUES (?, 'Бариста', 'Обов''язки: приготування кави', ?, '@employer', datetime('now', ?))",
+        ((i % 5000, rng.choice(CITIES), f'-{int(span * (history - i) / history)} seconds')
+         for i in range(history))
+    )
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def browse(db, runs, count_sql):
+    rng = random.Random(6)
+    result = []
+    for _ in range(runs):
+        location = rng.choice(CITIES)
+        started = time.perf_counter()
+        if count_sql:
+            db.fetchone(count_sql, (location,))
+        else:
+            stats.city_jobs(db, location)
+        job = db.fetchone(FIRST, (location,))
+        for _ in range(4):
+            job = db.fetchone(NEXT, (location, job[6], job[0]))
+        result.append(time.perf_counter() - started)
+    result.sort()
+    return statistics.median(result) * 1000, result[int(len(result) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type=int, nargs='+', default=[50000, 200000, 1000000])
+    parser.add_argument('--live', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    print("open a city, count it and show 5 vacancies, median / p99 in ms")
+    print(f"{'history':>9}{'all rows kept':>22}{'archived':>22}{'archiving':>18}{'file MB':>16}")
+    for history in args.history:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            prepare(path, history, args.live)
+            db = Storage(path)
+            kept = browse(db, args.runs, OLD_COUNT)
+            size_before = os.path.getsize(path) / 2**20
+
+            archiver = lifecycle.Archiver(db)
+            started = time.perf_counter()
+            archived = archiver.run_once()
+            elapsed = time.perf_counter() - started
+            db.reader().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            size_after = os.path.getsize(path) / 2**20
+
+            archived_browse = browse(db, args.runs, None)
+            db.close()
+
+        print(f"{history:>9}{kept[0]:>12.2f} / {kept[1]:>6.2f}{archived_browse[0]:>12.2f} / {archived_browse[1]:>6.2f}"
+              f"{archived / elapsed:>10.0f} rows/s{size_before:>8.1f} -> {size_after:.1f}")
+
+
+if __name__ == '__main__':
+    main()
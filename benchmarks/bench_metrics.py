@@ -0,0 +1,69 @@
+# Cost of the instrumentation: router dispatch and SQLite reads with no
+# observer (metrics off) vs with Metrics attached, plus the raw cost of the
+# per-call observers.
+#
+#   python benchmarks/bench_metrics.py [--repeat 200000]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Metrics  # noqa: E402
+from router import UpdateRouter  # noqa: E402
+from storage import Storage  # noqa: E402
+
+
+def per_call(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def make_router():
+    router = UpdateRouter(lambda chat_id: "AWAITING_JOB_TITLE")
+
+    @router.state("AWAITING_JOB_TITLE")
+    def get_job_title(message):
+        pass
+
+    return router
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200000)
+    args = parser.parse_args()
+    repeat = args.repeat
+    metrics = Metrics()
+
+    router = make_router()
+    message = SimpleNamespace(text="Бариста", chat=SimpleNamespace(id=1))
+    router_off = per_call(lambda: router.dispatch(message), repeat)
+    router.observer = metrics.handler
+    router_on = per_call(lambda: router.dispatch(message), repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Storage(os.path.join(tmp, 'bench.db'))
+        db.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, title TEXT)')
+        db.executemany('INSERT INTO jobs (title) VALUES (?)', [("Бариста",)] * 1000)
+        query = 'SELECT * FROM jobs WHERE id = ?'
+        read_off = per_call(lambda: db.fetchone(query, (500,)), repeat // 4)
+        db.observer = metrics.query
+        read_on = per_call(lambda: db.fetchone(query, (500,)), repeat // 4)
+        db.close()
+
+    api_observer = per_call(lambda: metrics.api_call('send_message', 0.001, 0.05, None), repeat)
+
+    print(f"router dispatch    off {router_off * 1e9:7.0f} ns   on {router_on * 1e9:7.0f} ns")
+    print(f"SQLite fetchone    off {read_off * 1e9:7.0f} ns   on {read_on * 1e9:7.0f} ns")
+    print(f"API call observer      {api_observer * 1e9:7.0f} ns per call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Startup on a big database. A database in the original schema (jobs,
+# users and sessions, no indexes) is brought up to date by migrations.py
+# once: the time of every migration, then the deferred indexes built in the
+# background while city reads go on. Then restarts: opening the database
+# when user_version is current, against re-running every migration the way
+# the bot used to on each start.
+#
+#   python benchmarks/bench_migrations.py [--jobs 3000000] [--users 300000] [--restarts 20]
+
+import argparse
+import logging
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations  # noqa: E402
+import synthetic  # noqa: E402
+from assets import CITIES  # noqa: E402
+from storage import Storage  # noqa: E402
+
+
+def legacy(path, user_count, job_count):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY, employer_id INTEGER, title TEXT, description TEXT,
+            location TEXT, telegram_username TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, last_name TEXT,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('BEGIN')
+    conn.executemany('INSERT INTO users VALUES (?, ?, ?, ?, ?)', synthetic.users(user_count))
+    conn.executemany('''
+        INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', synthetic.jobs(job_count, employers=max(1, user_count // 10)))
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def size_mb(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix)) / 2 ** 20
+
+
+def start(path):
+    # What the bot does before it handles the first update
+    started = time.perf_counter()
+    db = Storage(path)
+    deferred = migrations.migrate(db)
+    return time.perf_counter() - started, db, deferred
+
+
+def old_start(path):
+    # Every migration applied again, like the CREATE ... IF NOT EXISTS on
+    # every start before user_version was kept
+    started = time.perf_counter()
+    db = Storage(path)
+    db.run(lambda conn: [migration(conn) for migration in migrations.MIGRATIONS])
+    return time.perf_counter() - started, db
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=3000000)
+    parser.add_argument('--users', type=int, default=300000)
+    parser.add_argument('--restarts', type=int, default=20)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='  %(message)s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        legacy(path, args.users, args.jobs)
+        print(f"legacy database     {args.jobs} vacancies, {args.users} users, {size_mb(path):.0f} MB")
+
+        seconds, db, deferred = start(path)
+        print(f"first start         {seconds:.1f} s to migrate, indexes left for later: {deferred}")
+
+        # City reads while the deferred indexes are built
+        reads = []
+        done = threading.Event()
+
+        def browse():
+            index = 0
+            while not done.is_set():
+                started = time.perf_counter()
+                db.fetchone('''
+                    SELECT * FROM jobs WHERE location = ? AND expires_at > datetime('now')
+                    ORDER BY created_at, id LIMIT 1
+                ''', (CITIES[index % len(CITIES)],))
+                reads.append(time.perf_counter() - started)
+                index += 1
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=browse)
+        thread.start()
+        started = time.perf_counter()
+        builder = migrations.IndexBuilder(db)
+        while builder.run_once():
+            pass
+        built = time.perf_counter() - started
+        done.set()
+        thread.join()
+        db.close()
+        reads.sort()
+        print(f"deferred indexes    {built:.1f} s; {len(reads)} city reads meanwhile, "
+              f"p50 {statistics.median(reads) * 1000:.1f} ms, max {reads[-1] * 1000:.0f} ms")
+        print(f"migrated database   {size_mb(path):.0f} MB, user_version "
+              f"{sqlite3.connect(path).execute('PRAGMA user_version').fetchone()[0]}")
+
+        logging.getLogger().setLevel(logging.WARNING)
+        current, old = [], []
+        for _ in range(args.restarts):
+            seconds, db, _ = start(path)
+            current.append(seconds)
+            db.close()
+            seconds, db = old_start(path)
+            old.append(seconds)
+            db.close()
+        print(f"restart, current    p50 {statistics.median(current) * 1000:.2f} ms, "
+              f"max {max(current) * 1000:.2f} ms (open + one PRAGMA user_version)")
+        print(f"restart, all DDL    p50 {statistics.median(old) * 1000:.2f} ms, "
+              f"max {max(old) * 1000:.2f} ms (every migration again)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# OutboundScheduler against a local stub Bot API that answers some calls
+# with 429 Too Many Requests. Reports throughput, queue depth, send latency
+# per priority and the highest send rates the stub observed.
+#
+#   python benchmarks/bench_outbound.py [--messages 3000] [--chats 300] [--error-rate 0.02]
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import BULK, INTERACTIVE, OutboundScheduler, RateLimitedBot  # noqa: E402
+
+
+class TooManyRequests(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too Many Requests: retry after {retry_after}")
+        self.error_code = 429
+        self.result_json = {'ok': False, 'error_code': 429, 'parameters': {'retry_after': retry_after}}
+
+
+class StubBotApi:
+    def __init__(self, latency, error_rate, retry_after):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(7)
+        self.lock = threading.Lock()
+        self.sends = []
+        self.rejected = 0
+
+    def send_message(self, chat_id, text, **kwargs):
+        time.sleep(self.latency)
+        with self.lock:
+            if self.rng.random() < self.error_rate:
+                self.rejected += 1
+                raise TooManyRequests(self.retry_after)
+            self.sends.append((time.monotonic(), chat_id))
+
+
+def peak_rates(sends):
+    per_second = Counter(int(at) for at, chat_id in sends)
+    per_chat_second = Counter((int(at), chat_id) for at, chat_id in sends)
+    return max(per_second.values()), max(per_chat_second.values())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=3000)
+    parser.add_argument('--chats', type=int, default=300)
+    parser.add_argument('--bulk-share', type=float, default=0.5)
+    parser.add_argument('--global-rate', type=float, default=300)
+    parser.add_argument('--chat-rate', type=float, default=5)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--retry-after', type=float, default=0.5)
+    args = parser.parse_args()
+
+    api = StubBotApi(args.latency_ms / 1000, args.error_rate, args.retry_after)
+    scheduler = OutboundScheduler(global_rate=args.global_rate, chat_rate=args.chat_rate,
+                                  chat_burst=args.chat_rate, senders=16)
+    bot = RateLimitedBot(api, scheduler)
+
+    rng = random.Random(1)
+    max_depth = 0
+    started = time.monotonic()
+    futures = []
+    for n in range(args.messages):
+        priority = BULK if rng.random() < args.bulk_share else INTERACTIVE
+        futures.append(bot.send_message(rng.randrange(args.chats), f"message {n}", priority=priority))
+        if n % 100 == 0:
+            max_depth = max(max_depth, scheduler.depth())
+    for future in futures:
+        try:
+            future.result()
+        except TooManyRequests:
+            pass
+    elapsed = time.monotonic() - started
+    stats = scheduler.stats()
+    scheduler.close()
+
+    peak_global, peak_chat = peak_rates(api.sends)
+    print(f"delivered          {stats['sent']} in {elapsed:.1f} s ({stats['sent'] / elapsed:.0f} msg/s), "
+          f"{api.rejected} answered 429, {stats['retried']} retried, {stats['failed']} failed")
+    print(f"peak rate          {peak_global} msg/s global (limit {args.global_rate:g}), "
+          f"{peak_chat} msg/s per chat (limit {args.chat_rate:g}, burst {args.chat_rate:g})")
+    print(f"max queue depth    {max_depth}")
+    for name in ('interactive', 'bulk'):
+        print(f"{name + ' latency':<18} p50 {stats[name + '_latency_p50'] * 1000:.0f} ms   "
+              f"p99 {stats[name + '_latency_p99'] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
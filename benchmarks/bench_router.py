@@ -0,0 +1,111 @@
+# Per-update dispatch cost: telebot-style linear predicate scan vs UpdateRouter.
+#
+#   python benchmarks/bench_router.py [--updates 200000]
+
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import UpdateRouter  # noqa: E402
+
+CITIES = ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро",
+          "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"]
+BUTTONS = ["🏠 Головне меню", "🔙 Назад", "👔 Роботодавець", "👷 Шукаю роботу",
+           "➡️ Наступна вакансія", "💬 Написати роботодавцю", "⚙️ Адмін-панель",
+           "📊 Статистика", "📝 Всі вакансії"] + CITIES
+STATES = [None, "👔 Роботодавець", "👷 Шукаю роботу", "AWAITING_JOB_TITLE",
+          "AWAITING_JOB_DESCRIPTION", "AWAITING_CONTACT", "ADMIN_PANEL"]
+ADMIN_IDS = [767168540]
+
+
+def handler(message):
+    pass
+
+
+def build_linear(user_states):
+    # Same predicates, in the same order, as the lambda-based registration.
+    return [
+        lambda m: m.text == "/start",
+        lambda m: m.text == "🏠 Головне меню",
+        lambda m: m.text == "🔙 Назад",
+        lambda m: user_states.get(m.chat.id) == "AWAITING_JOB_TITLE",
+        lambda m: user_states.get(m.chat.id) == "AWAITING_JOB_DESCRIPTION",
+        lambda m: user_states.get(m.chat.id) == "AWAITING_CONTACT",
+        lambda m: m.text == "➡️ Наступна вакансія",
+        lambda m: m.text == "💬 Написати роботодавцю",
+        lambda m: m.text == "⚙️ Адмін-панель",
+        lambda m: m.text == "📊 Статистика" and m.chat.id in ADMIN_IDS,
+        lambda m: m.text == "📝 Всі вакансії" and m.chat.id in ADMIN_IDS,
+        lambda m: m.text in ["👔 Роботодавець", "👷 Шукаю роботу"],
+        lambda m: m.text in CITIES,
+    ]
+
+
+def build_router(user_states):
+    router = UpdateRouter(user_states.get)
+    router.command('start')(handler)
+    router.text("🏠 Головне меню", "🔙 Назад", before_state=True)(handler)
+    router.state("AWAITING_JOB_TITLE")(handler)
+    router.state("AWAITING_JOB_DESCRIPTION")(handler)
+    router.state("AWAITING_CONTACT")(handler)
+    router.text(*[b for b in BUTTONS if b not in ("🏠 Головне меню", "🔙 Назад")])(handler)
+    return router
+
+
+def make_updates(count, chats, user_states):
+    rng = random.Random(42)
+    for chat_id in range(chats):
+        user_states[chat_id] = rng.choice(STATES)
+    texts = BUTTONS + ["/start", "Офіціант у кафе", "@employer"]
+    return [
+        SimpleNamespace(text=rng.choice(texts), chat=SimpleNamespace(id=rng.randrange(chats)))
+        for _ in range(count)
+    ]
+
+
+def run_linear(predicates, updates):
+    for message in updates:
+        for predicate in predicates:
+            if predicate(message):
+                handler(message)
+                break
+
+
+def run_router(router, updates):
+    dispatch = router.dispatch
+    for message in updates:
+        dispatch(message)
+
+
+def measure(fn, *args):
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=200000)
+    parser.add_argument('--chats', type=int, default=5000)
+    args = parser.parse_args()
+
+    user_states = {}
+    updates = make_updates(args.updates, args.chats, user_states)
+    linear = measure(run_linear, build_linear(user_states), updates)
+    routed = measure(run_router, build_router(user_states), updates)
+
+    for name, elapsed in (("linear predicates", linear), ("UpdateRouter", routed)):
+        print(f"{name:<18} {elapsed / args.updates * 1e9:8.0f} ns/update")
+    print(f"speedup            {linear / routed:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
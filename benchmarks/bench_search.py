@@ -0,0 +1,100 @@
+# Vacancy search latency over a synthetic corpus: FTS5 (search.py) vs a
+# LIKE '%...%' scan over title and description.
+#
+#   python benchmarks/bench_search.py [--jobs 100000]
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search  # noqa: E402
+from storage import Storage  # noqa: E402
+
+CITIES = ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро",
+          "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"]
+TITLES = ["Водій категорії C", "Бариста", "Офіціант", "Кухар", "Продавець-консультант",
+          "Менеджер з продажу", "Бухгалтер", "Прибиральниця", "Охоронець", "Кур'єр",
+          "Вантажник", "Адміністратор", "Програміст Python", "Електрик", "Зварювальник"]
+WORDS = ("досвід роботи графік зарплата офіційне працевлаштування навчання команда "
+         "відповідальність комунікабельність тиждень позмінно премії лікарняний відпустка "
+         "клієнти склад доставка сервіс кава кухня авто документи знання англійська").split()
+QUERIES = ["водій", "бариста кава", "програміст python", "кур'єр доставка", "зварювальник",
+           "офіційне працевлаштування", "англійська"]
+
+
+def prepare(path, count):
+    rng = random.Random(9)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY, employer_id INTEGER, title TEXT, description TEXT,
+            location TEXT, telegram_username TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_jobs_location_created ON jobs (location, created_at, id)')
+    conn.execute('CREATE INDEX idx_jobs_expires ON jobs (expires_at)')
+    conn.execute('BEGIN')
+    search.install(conn)
+    # A fifth expired and not archived yet
+    conn.executemany('''
+        INSERT INTO jobs (employer_id, title, description, location, telegram_username, expires_at)
+        VALUES (?, ?, ?, ?, ?, datetime('now', ?))
+    ''', ((i, rng.choice(TITLES), ' '.join(rng.choice(WORDS) for _ in range(40)),
+           rng.choice(CITIES), '@employer', f'{rng.randint(-6, 24)} days') for i in range(count)))
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def like_search(db, query, location=None):
+    pattern = f'%{query}%'
+    if location is None:
+        return db.fetchall('''
+            SELECT * FROM jobs WHERE (title LIKE ? OR description LIKE ?) AND expires_at > datetime('now') LIMIT 5
+        ''', (pattern, pattern))
+    return db.fetchall('''
+        SELECT * FROM jobs WHERE location = ? AND (title LIKE ? OR description LIKE ?)
+            AND expires_at > datetime('now') LIMIT 5
+    ''', (location, pattern, pattern))
+
+
+def latencies(fn, db, runs):
+    rng = random.Random(4)
+    result = []
+    for _ in range(runs):
+        query = rng.choice(QUERIES)
+        location = rng.choice(CITIES + [None])
+        started = time.perf_counter()
+        fn(db, query, location)
+        result.append(time.perf_counter() - started)
+    result.sort()
+    return statistics.median(result) * 1000, result[int(len(result) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'job_bot.db')
+        started = time.perf_counter()
+        prepare(path, args.jobs)
+        print(f"corpus             {args.jobs} vacancies indexed in {time.perf_counter() - started:.1f} s")
+        db = Storage(path)
+        for name, fn in (("FTS5 ranked", search.search), ("FTS5 count", search.count), ("LIKE scan", like_search)):
+            p50, p99 = latencies(fn, db, args.runs)
+            print(f"{name:<18} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
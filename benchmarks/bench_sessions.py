@@ -0,0 +1,107 @@
+# SessionStore: memory per idle session, TTL and capacity eviction
+# throughput and write-behind flush throughput, compared with the old plain
+# dicts.
+#
+#   python benchmarks/bench_sessions.py [--sessions 100000]
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import SessionStore, SQLiteSessionBackend  # noqa: E402
+from storage import Storage  # noqa: E402
+
+
+def browsing_data(chat_id):
+    return {
+        'location': "🏙️ Київ",
+        'cursor': ('2026-10-18 12:00:00', chat_id),
+        'position': 3,
+        'total': 120,
+        'current_employer_username': '@employer'
+    }
+
+
+def memory_per_session(count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    user_states, user_data = {}, {}
+    for chat_id in range(count):
+        user_states[chat_id] = "👷 Шукаю роботу"
+        user_data[chat_id] = browsing_data(chat_id)
+    dicts = tracemalloc.take_snapshot().compare_to(before, 'filename')
+    del user_states, user_data
+
+    before = tracemalloc.take_snapshot()
+    store = SessionStore(max_sessions=count, flush_interval=0)
+    for chat_id in range(count):
+        store.states[chat_id] = "👷 Шукаю роботу"
+        store.data[chat_id] = browsing_data(chat_id)
+    store.dirty.clear()
+    sessions = tracemalloc.take_snapshot().compare_to(before, 'filename')
+    tracemalloc.stop()
+    return (sum(stat.size_diff for stat in dicts) / count,
+            sum(stat.size_diff for stat in sessions) / count)
+
+
+def eviction_throughput(count):
+    store = SessionStore(max_sessions=count, ttl=0, flush_interval=0)
+    for chat_id in range(count):
+        store.states[chat_id] = "👷 Шукаю роботу"
+    # The first rotation makes them idle, the second evicts them
+    store.evict_idle()
+    started = time.perf_counter()
+    evicted = store.evict_idle()
+    ttl_rate = evicted / (time.perf_counter() - started)
+
+    store = SessionStore(max_sessions=count // 10, flush_interval=0)
+    started = time.perf_counter()
+    for chat_id in range(count):
+        store.states[chat_id] = "👷 Шукаю роботу"
+    capacity_rate = count / (time.perf_counter() - started)
+    return ttl_rate, capacity_rate
+
+
+def flush_throughput(count):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'job_bot.db')
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE sessions (
+                chat_id INTEGER PRIMARY KEY, state TEXT, data TEXT, updated_at TIMESTAMP
+            )
+        ''')
+        conn.close()
+        db = Storage(path)
+        store = SessionStore(SQLiteSessionBackend(db), max_sessions=count, flush_interval=0)
+        for chat_id in range(count):
+            store.states[chat_id] = "👷 Шукаю роботу"
+            store.data[chat_id] = browsing_data(chat_id)
+        started = time.perf_counter()
+        flushed = store.flush()
+        rate = flushed / (time.perf_counter() - started)
+        db.close()
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=100000)
+    args = parser.parse_args()
+
+    dicts, sessions = memory_per_session(args.sessions)
+    print(f"memory per browsing session: dicts {dicts:.0f} B, SessionStore {sessions:.0f} B")
+    ttl_rate, capacity_rate = eviction_throughput(args.sessions)
+    print(f"TTL eviction       {ttl_rate:12.0f} sessions/s")
+    print(f"capacity eviction  {capacity_rate:12.0f} sessions/s")
+    print(f"write-behind flush {flush_throughput(args.sessions):12.0f} sessions/s")
+
+
+if __name__ == '__main__':
+    main()
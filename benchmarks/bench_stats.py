@@ -0,0 +1,101 @@
+# "📊 Статистика" cost: the old COUNT/GROUP BY scans vs the trigger-maintained
+# aggregates, plus the insert overhead the triggers add.
+#
+#   python benchmarks/bench_stats.py [--jobs 500000] [--users 200000]
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stats  # noqa: E402
+from storage import Storage  # noqa: E402
+
+CITIES = ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро",
+          "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"]
+
+
+def old_statistics(db):
+    db.fetchone('SELECT COUNT(*) FROM users')
+    db.fetchone('SELECT COUNT(*) FROM jobs')
+    db.fetchone("SELECT COUNT(*) FROM users WHERE joined_at >= datetime('now', '-1 day')")
+    db.fetchall('SELECT location, COUNT(*) as count FROM jobs GROUP BY location')
+
+
+def prepare(path, jobs, users, with_stats):
+    rng = random.Random(3)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY, employer_id INTEGER, title TEXT, description TEXT,
+            location TEXT, telegram_username TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, last_name TEXT,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if with_stats:
+        conn.execute('BEGIN')
+        stats.install(conn)
+        conn.execute('COMMIT')
+    started = time.perf_counter()
+    conn.execute('BEGIN')
+    conn.executemany(
+        "INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at) "
+        "VALUES (?, 'Бариста', 'опис', ?, '@employer', datetime('now', ?))",
+        ((i, rng.choice(CITIES), f'-{rng.randrange(90 * 24)} hours') for i in range(jobs))
+    )
+    conn.executemany(
+        "INSERT INTO users (user_id, joined_at) VALUES (?, datetime('now', ?))",
+        ((i, f'-{rng.randrange(90 * 24)} hours') for i in range(users))
+    )
+    conn.execute('COMMIT')
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return elapsed
+
+
+def measure(fn, *args, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=500000)
+    parser.add_argument('--users', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, 'plain.db')
+        aggregated = os.path.join(tmp, 'aggregated.db')
+        plain_insert = prepare(plain, args.jobs, args.users, False)
+        aggregated_insert = prepare(aggregated, args.jobs, args.users, True)
+
+        db = Storage(plain)
+        old = measure(old_statistics, db)
+        db.close()
+        db = Storage(aggregated)
+        new = measure(stats.summary, db)
+        trend = measure(stats.trend, db, 30)
+        db.close()
+
+    rows = args.jobs + args.users
+    print(f"statistics view    scans {old * 1000:8.2f} ms   aggregates {new * 1000:6.3f} ms")
+    print(f"30-day trend       {trend * 1000:8.3f} ms")
+    print(f"insert cost        {plain_insert / rows * 1e6:.2f} us/row plain, "
+          f"{aggregated_insert / rows * 1e6:.2f} us/row with triggers")
+
+
+if __name__ == '__main__':
+    main()
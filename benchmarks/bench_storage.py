@@ -0,0 +1,151 @@
+# Mixed read/write load against job_bot.db-shaped tables: one shared
+# connection committing every write (the old setup) vs Storage.
+#
+#   python benchmarks/bench_storage.py [--seconds 5] [--writers 16] [--readers 16]
+#
+# Each worker sleeps --think-ms between operations, standing in for the
+# Telegram round trip a handler makes around its query.
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Storage  # noqa: E402
+
+CITIES = ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро",
+          "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"]
+
+SCHEMA = '''
+    CREATE TABLE jobs (
+        id INTEGER PRIMARY KEY,
+        employer_id INTEGER,
+        title TEXT,
+        description TEXT,
+        location TEXT,
+        telegram_username TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_jobs_location_created ON jobs (location, created_at, id);
+'''
+INSERT = '''
+    INSERT INTO jobs (employer_id, title, description, location, telegram_username)
+    VALUES (?, ?, ?, ?, ?)
+'''
+READ = '''
+    SELECT * FROM jobs WHERE location = ? AND (created_at, id) > (?, ?)
+    ORDER BY created_at, id LIMIT 1
+'''
+
+
+class SharedConnection:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def write(self, params):
+        with self.lock:
+            self.conn.execute(INSERT, params)
+            self.conn.commit()
+
+    def read(self, params):
+        with self.lock:
+            return self.conn.execute(READ, params).fetchone()
+
+    def close(self):
+        self.conn.close()
+
+
+class PooledStorage:
+    def __init__(self, path):
+        self.storage = Storage(path)
+
+    def write(self, params):
+        self.storage.execute(INSERT, params)
+
+    def read(self, params):
+        return self.storage.fetchone(READ, params)
+
+    def close(self):
+        self.storage.close()
+
+
+def prepare(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(INSERT, (
+        (i, f"Вакансія {i}", "опис " * 20, CITIES[i % len(CITIES)], "@employer")
+        for i in range(rows)
+    ))
+    conn.commit()
+    conn.close()
+
+
+def run(backend, seconds, writers, readers, think):
+    stop = threading.Event()
+    writes = [0] * writers
+    latencies = [[] for _ in range(readers)]
+
+    def write_loop(n):
+        rng = random.Random(n)
+        while not stop.is_set():
+            backend.write((n, "Бариста", "опис " * 20, rng.choice(CITIES), "@employer"))
+            writes[n] += 1
+            time.sleep(think)
+
+    def read_loop(n):
+        rng = random.Random(1000 + n)
+        while not stop.is_set():
+            started = time.perf_counter()
+            backend.read((rng.choice(CITIES), "1970-01-01", 0))
+            latencies[n].append(time.perf_counter() - started)
+            time.sleep(think)
+
+    threads = [threading.Thread(target=write_loop, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=read_loop, args=(n,)) for n in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    reads = sorted(value for values in latencies for value in values)
+    return {
+        'writes_per_sec': sum(writes) / seconds,
+        'read_p50_ms': statistics.median(reads) * 1000,
+        'read_p99_ms': reads[int(len(reads) * 0.99)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--think-ms', type=float, default=1.0)
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    for name, factory in (("shared connection", SharedConnection), ("Storage", PooledStorage)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'job_bot.db')
+            prepare(path, args.rows)
+            backend = factory(path)
+            try:
+                result = run(backend, args.seconds, args.writers, args.readers, args.think_ms / 1000)
+            finally:
+                backend.close()
+        print(f"{name:<18} {result['writes_per_sec']:9.0f} writes/s   "
+              f"read p50 {result['read_p50_ms']:.3f} ms   p99 {result['read_p99_ms']:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
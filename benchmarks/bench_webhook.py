@@ -0,0 +1,114 @@
+# Posts synthetic updates to a local WebhookServer and reports throughput,
+# acknowledgement latency and end-to-end handling latency. The handler
+# sleeps --handler-ms to stand in for a Telegram round trip, and per-chat
+# ordering is checked on the way.
+#
+#   python benchmarks/bench_webhook.py [--updates 20000] [--chats 500] [--workers 8]
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook import WebhookServer  # noqa: E402
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def synthetic_update(update_id, chat_id, seq):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': seq,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+            'text': "🏙️ Київ",
+        },
+        'sent_at': time.perf_counter(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--handler-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    lock = threading.Lock()
+    last_seq = {}
+    handled = []
+    out_of_order = 0
+    done = threading.Event()
+
+    def handle(update):
+        nonlocal out_of_order
+        time.sleep(args.handler_ms / 1000)
+        message = update['message']
+        with lock:
+            chat_id = message['chat']['id']
+            if last_seq.get(chat_id, -1) > message['message_id']:
+                out_of_order += 1
+            last_seq[chat_id] = message['message_id']
+            handled.append(time.perf_counter() - update['sent_at'])
+            if len(handled) == args.updates // args.clients * args.clients:
+                done.set()
+
+    server = WebhookServer(handle, host='127.0.0.1', port=0, workers=args.workers, queue_size=10000)
+    server.start()
+
+    acks = []
+    rejected = [0]
+    per_client = args.updates // args.clients
+
+    def client(n):
+        # Each client owns a disjoint set of chats and waits for the
+        # acknowledgement before posting, like Telegram does per chat
+        rng = random.Random(n)
+        chats = list(range(n, args.chats, args.clients))
+        seqs = dict.fromkeys(chats, 0)
+        for i in range(per_client):
+            chat_id = rng.choice(chats)
+            seqs[chat_id] += 1
+            body = json.dumps(synthetic_update(n * per_client + i, chat_id, seqs[chat_id]))
+            connection = http.client.HTTPConnection('127.0.0.1', server.port)
+            started = time.perf_counter()
+            connection.request('POST', '/webhook', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            acks.append(time.perf_counter() - started)
+            if response.status != 200:
+                rejected[0] += 1
+            connection.close()
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    done.wait(timeout=60)
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"updates            {len(handled)} handled, {rejected[0]} rejected, {out_of_order} out of order")
+    print(f"throughput         {len(handled) / elapsed:9.0f} updates/s")
+    print(f"ack latency        p50 {percentile(acks, 0.5) * 1000:.2f} ms   p99 {percentile(acks, 0.99) * 1000:.2f} ms")
+    print(f"handled latency    p50 {percentile(handled, 0.5) * 1000:.2f} ms   "
+          f"p99 {percentile(handled, 0.99) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
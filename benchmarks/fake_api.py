@@ -0,0 +1,197 @@
+# A local stand-in for api.telegram.org, used by loadtest.py. It serves
+# queued updates to getUpdates (long polling) and records every call the
+# bot makes, answering with the JSON shapes telebot expects.
+#
+# Point telebot at it with
+#   telebot.apihelper.API_URL = api.url + '/bot{0}/{1}'
+
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# getUpdates never holds a request longer than this, so a stopping bot
+# notices quickly
+MAX_POLL_WAIT = 1.0
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Load Test', 'username': 'load_test_bot'}
+
+
+class Call:
+    __slots__ = ('method', 'params', 'message_id', 'at')
+
+    def __init__(self, method, params, message_id, at):
+        self.method = method
+        self.params = params
+        self.message_id = message_id
+        self.at = at
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # The bot process is stopped mid long poll at the end of every run
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeBotAPI:
+    # latency, in seconds, is added to every call but getUpdates, like the
+    # round trip to Telegram
+    def __init__(self, host='127.0.0.1', port=0, latency=0):
+        self.latency = latency
+        self.cond = threading.Condition()
+        self.updates = []
+        self.next_update_id = itertools.count(1)
+        self.next_message_id = itertools.count(1)
+        self.calls = {}     # chat_id -> [Call]
+        self.methods = {}   # method -> count
+        self.closing = False
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, every
+            # keep-alive reply would wait for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self.answer()
+
+            def do_POST(self):
+                self.answer()
+
+            def answer(self):
+                url = urlparse(self.path)
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = self.rfile.read(length)
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(parse_qsl(body.decode()))
+                method = url.path.rsplit('/', 1)[-1]
+                if api.latency and method != 'getUpdates':
+                    time.sleep(api.latency)
+                payload = json.dumps({'ok': True, 'result': api.handle(method, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _HTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-bot-api', daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push(self, update):
+        # Queues an update for getUpdates; update_id is assigned here
+        with self.cond:
+            update['update_id'] = next(self.next_update_id)
+            self.updates.append(update)
+            self.cond.notify_all()
+
+    def replies(self, chat_id):
+        with self.cond:
+            return list(self.calls.get(chat_id, ()))
+
+    def wait_replies(self, chat_id, count, timeout):
+        # Blocks until chat_id has received at least count calls in total
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while len(self.calls.get(chat_id, ())) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.closing:
+                    return False
+                self.cond.wait(remaining)
+            return True
+
+    def handle(self, method, params):
+        if method == 'getUpdates':
+            return self.get_updates(params)
+        if method == 'getMe':
+            return BOT_USER
+
+        chat_id = params.get('chat_id')
+        message_id = None
+        result = True
+        if method.startswith('send') or method.startswith('edit'):
+            if method.startswith('edit'):
+                message_id = int(params.get('message_id') or 0)
+            else:
+                message_id = next(self.next_message_id)
+            result = self.message(method, params, message_id)
+
+        with self.cond:
+            self.methods[method] = self.methods.get(method, 0) + 1
+            if chat_id is not None:
+                chat_id = int(chat_id)
+                self.calls.setdefault(chat_id, []).append(Call(method, params, message_id, time.perf_counter()))
+                self.cond.notify_all()
+        return result
+
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        wait = min(float(params.get('timeout') or 0), MAX_POLL_WAIT)
+        deadline = time.monotonic() + wait
+        with self.cond:
+            # Everything below offset has been confirmed by the bot
+            while self.updates and self.updates[0]['update_id'] < offset:
+                self.updates.pop(0)
+            while not self.updates and not self.closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return self.updates[:limit]
+
+    def message(self, method, params, message_id):
+        chat_id = int(params.get('chat_id') or 0)
+        result = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if 'text' in params:
+            result['text'] = params['text']
+        if method == 'sendAnimation':
+            # Telegram hands out a file_id for an uploaded URL and keeps
+            # returning it when that file_id is sent again
+            result['animation'] = {
+                'file_id': 'animation-file-id',
+                'file_unique_id': 'animation',
+                'width': 480, 'height': 270, 'duration': 3,
+            }
+            result['caption'] = params.get('caption', '')
+        elif method == 'sendLocation':
+            result['location'] = {
+                'latitude': float(params.get('latitude', 0)),
+                'longitude': float(params.get('longitude', 0)),
+            }
+        return result
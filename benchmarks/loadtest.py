@@ -0,0 +1,367 @@
+# End-to-end load test. The bot runs in a child process against a local fake
+# Bot API (fake_api.py) on a database filled by synthetic.py, while virtual
+# users replay scripted flows and wait for each reply. Prints a JSON report:
+# updates/sec, per-flow reply latency percentiles and the bot's peak RSS.
+#
+#   python benchmarks/loadtest.py [--clients 20] [--duration 20] [--users 10000] [--jobs 20000]
+#                                 [--mode polling|webhook] [--engine threaded|async] [--cluster 4]
+#                                 [--telegram-limits] [--api-latency-ms 50]
+#                                 [--output report.json]
+#
+# Without --telegram-limits the outbound scheduler is opened up so the
+# numbers show what the bot itself can do rather than Telegram's 30 msg/s.
+
+import argparse
+import functools
+import http.client
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic  # noqa: E402
+from assets import CITIES  # noqa: E402
+from fake_api import FakeBotAPI  # noqa: E402
+
+TOKEN = '123456:LOADTEST'
+FIRST_CHAT = 10_000_000
+ADMIN_CHAT = 20_000_000
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summary(values):
+    if not values:
+        return None
+    return {
+        'p50': round(percentile(values, 0.50) * 1000, 2),
+        'p90': round(percentile(values, 0.90) * 1000, 2),
+        'p99': round(percentile(values, 0.99) * 1000, 2),
+        'max': round(max(values) * 1000, 2),
+    }
+
+
+# Flows yield the text to send, or a (kind, value, replies) step for
+# callbacks and for messages the bot answers more than once. They run one
+# step at a time, so user.last is the reply to the previous step.
+
+def worker_flow(user, rng):
+    yield '/start'
+    yield "👷 Шукаю роботу"
+    yield rng.choices(CITIES, synthetic.CITY_WEIGHTS)[0]
+    for _ in range(rng.randint(1, 5)):
+        yield "➡️ Наступна вакансія"
+    yield "💬 Написати роботодавцю"
+
+
+def search_flow(user, rng):
+    yield '/start'
+    yield "👷 Шукаю роботу"
+    yield "🔎 Пошук за ключовими словами"
+    if rng.random() < 0.3:
+        yield rng.choice(CITIES)
+    yield rng.choice(synthetic.QUERIES)
+    yield "➡️ Більше результатів"
+
+
+def employer_flow(user, rng):
+    yield '/start'
+    yield "👔 Роботодавець"
+    yield rng.choices(CITIES, synthetic.CITY_WEIGHTS)[0]
+    yield rng.choice(synthetic.TITLES)
+    yield synthetic.description(rng)
+    # Confirmation, "vacancy is active" notice and the role menu
+    yield ('text', f"@employer_{user.chat_id}", 3)
+
+
+def admin_flow(user, rng):
+    yield '/start'
+    yield "⚙️ Адмін-панель"
+    yield "📊 Статистика"
+    yield "📈 Динаміка за 30 днів"
+    yield "📝 Всі вакансії"
+    for _ in range(3):
+        data = user.button('jobs_next_')
+        if data is None:
+            break
+        yield ('callback', data, 1)
+
+
+FLOWS = {
+    'worker': (worker_flow, 60),
+    'search': (search_flow, 20),
+    'employer': (employer_flow, 20),
+}
+
+
+class VirtualUser:
+    def __init__(self, api, chat_id, webhook_port, timeout):
+        self.api = api
+        self.chat_id = chat_id
+        self.timeout = timeout
+        self.received = 0
+        self.last = None
+        self.message_id = 0
+        self.connection = None
+        if webhook_port:
+            self.connection = http.client.HTTPConnection('127.0.0.1', webhook_port, timeout=timeout)
+
+    def update(self, kind, value):
+        self.message_id += 1
+        sender = {'id': self.chat_id, 'is_bot': False, 'first_name': 'Load', 'username': f'user{self.chat_id}'}
+        chat = {'id': self.chat_id, 'type': 'private'}
+        if kind == 'callback':
+            return {'callback_query': {
+                'id': str(self.message_id),
+                'from': sender,
+                'chat_instance': str(self.chat_id),
+                'data': value,
+                'message': {
+                    'message_id': self.last.message_id,
+                    'date': int(time.time()),
+                    'chat': chat,
+                    'text': self.last.params.get('text', ''),
+                },
+            }}
+        message = {'message_id': self.message_id, 'date': int(time.time()), 'chat': chat, 'from': sender,
+                   'text': value}
+        if value.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(value.split()[0])}]
+        return {'message': message}
+
+    def deliver(self, update):
+        if self.connection is None:
+            self.api.push(update)
+            return
+        update['update_id'] = self.message_id
+        body = json.dumps(update).encode()
+        self.connection.request('POST', '/webhook', body, {'Content-Type': 'application/json'})
+        self.connection.getresponse().read()
+
+    def step(self, step):
+        # Returns the time until the bot's last reply, or None on timeout
+        kind, value, replies = step if isinstance(step, tuple) else ('text', step, 1)
+        started = time.perf_counter()
+        self.deliver(self.update(kind, value))
+        self.received += replies
+        if not self.api.wait_replies(self.chat_id, self.received, self.timeout):
+            self.received = len(self.api.replies(self.chat_id))
+            return None
+        self.last = self.api.replies(self.chat_id)[self.received - 1]
+        return self.last.at - started
+
+    def button(self, prefix):
+        markup = json.loads(self.last.params.get('reply_markup') or '{}')
+        for row in markup.get('inline_keyboard', ()):
+            for button in row:
+                if button.get('callback_data', '').startswith(prefix):
+                    return button['callback_data']
+        return None
+
+
+def run_client(user, flows, deadline, seed, results, lock):
+    rng = random.Random(seed)
+    names = list(flows)
+    weights = [flows[name][1] for name in names]
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for step in flows[name][0](user, rng):
+            latency = user.step(step)
+            if latency is None:
+                errors += 1
+                break
+            latencies.append(latency)
+        elapsed = time.perf_counter() - started
+        with lock:
+            result = results.setdefault(name, {'flows': 0, 'updates': 0, 'errors': 0, 'steps': [], 'durations': []})
+            result['updates'] += len(latencies) + errors
+            result['errors'] += errors
+            result['steps'].extend(latencies)
+            if not errors:
+                result['flows'] += 1
+                result['durations'].append(elapsed)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_bot(config, token, index=0, workers=1):
+    # The real JobTelegramBot pointed at the fake API. Also the worker
+    # factory with --cluster, where it runs in a freshly spawned process
+    # and the supervisor picks the worker that runs maintenance.
+    import telebot
+
+    telebot.apihelper.API_URL = config['api'] + '/bot{0}/{1}'
+    os.chdir(config['workdir'])
+
+    if config['engine'] == 'async':
+        from telebot import asyncio_helper
+
+        from async_bot import AsyncJobTelegramBot
+
+        asyncio_helper.API_URL = config['api'] + '/bot{0}/{1}'
+        bot = AsyncJobTelegramBot(token, send_rate=30 / workers, maintenance=workers == 1, workers=config['workers'])
+    else:
+        from bot import JobTelegramBot
+
+        bot = JobTelegramBot(token, send_rate=30 / workers, maintenance=workers == 1)
+    bot.admin_ids.extend(config['admins'])
+    if not config['telegram_limits']:
+        bot.outbox.close()
+        bot.setup_outbox(global_rate=1e6, global_burst=1e6, chat_rate=1e6, chat_burst=1e6)
+        bot.fanout.api = bot.api
+    return bot
+
+
+def bot_process(config):
+    # Child side: fills the database, then runs the bot or a cluster
+    bot = make_bot(config, TOKEN)
+    synthetic.populate(bot.db, config['users'], config['jobs'], config['seed'])
+    if config['cluster']:
+        from cluster import Supervisor
+
+        bot.shutdown()
+        bot.db.close()
+        bot = Supervisor(TOKEN, workers=config['cluster'], factory=functools.partial(make_bot, config),
+                         threads=config['workers'])
+        bot.start()
+    print('ready', flush=True)
+
+    try:
+        if config['cluster'] and config['mode'] == 'webhook':
+            bot.run_webhook(config['api'] + '/webhook', port=config['webhook_port'], threads=config['workers'])
+        elif config['cluster']:
+            bot.run_polling(long_polling_timeout=1)
+        elif config['mode'] == 'webhook' and config['engine'] == 'async':
+            bot.run_webhook(config['api'] + '/webhook', port=config['webhook_port'])
+        elif config['mode'] == 'webhook':
+            bot.run_webhook(config['api'] + '/webhook', port=config['webhook_port'], workers=config['workers'])
+        else:
+            bot.run()
+    except KeyboardInterrupt:
+        # SIGINT from the parent ends the run; the run methods shut down
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--admins', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--jobs', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--engine', choices=('threaded', 'async'), default='threaded')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--cluster', type=int, default=0, help="run a Supervisor with this many worker processes")
+    parser.add_argument('--telegram-limits', action='store_true')
+    parser.add_argument('--api-latency-ms', type=float, default=0, help="added to every Bot API call")
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--output')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cluster and args.engine == 'async':
+        parser.error("--cluster runs threaded workers only")
+
+    if args.child:
+        bot_process(json.loads(args.child))
+        return
+
+    api = FakeBotAPI(latency=args.api_latency_ms / 1000)
+    api.start()
+    admins = [ADMIN_CHAT + n for n in range(args.admins)]
+    webhook_port = free_port() if args.mode == 'webhook' else None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config = {
+            'api': api.url, 'workdir': workdir, 'admins': admins, 'users': args.users, 'jobs': args.jobs,
+            'seed': args.seed, 'mode': args.mode, 'workers': args.workers, 'webhook_port': webhook_port,
+            'telegram_limits': args.telegram_limits, 'cluster': args.cluster, 'engine': args.engine,
+        }
+        started = time.perf_counter()
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)],
+                                 stdout=subprocess.PIPE, text=True)
+        if child.stdout.readline().strip() != 'ready':
+            child.kill()
+            sys.exit("bot process failed to start")
+        setup = time.perf_counter() - started
+        if webhook_port:
+            # The webhook server binds right after 'ready'
+            time.sleep(0.5)
+
+        results = {}
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+        threads = []
+        for n in range(args.clients):
+            if n < args.admins:
+                user = VirtualUser(api, admins[n], webhook_port, args.timeout)
+                flows = {'admin': (admin_flow, 1)}
+            else:
+                user = VirtualUser(api, FIRST_CHAT + n, webhook_port, args.timeout)
+                flows = FLOWS
+            thread = threading.Thread(target=run_client, args=(user, flows, deadline, args.seed + n, results, lock))
+            thread.start()
+            threads.append(thread)
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        child.send_signal(signal.SIGINT)
+        try:
+            child.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            child.kill()
+            child.wait()
+        api.close()
+
+    updates = sum(result['updates'] for result in results.values())
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('child', 'output')},
+        'setup_s': round(setup, 2),
+        'elapsed_s': round(elapsed, 2),
+        'updates': updates,
+        'updates_per_sec': round(updates / elapsed, 1),
+        'errors': sum(result['errors'] for result in results.values()),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        'flows': {
+            name: {
+                'completed': result['flows'],
+                'updates': result['updates'],
+                'errors': result['errors'],
+                'reply_ms': summary(result['steps']),
+                'flow_ms': summary(result['durations']),
+            }
+            for name, result in sorted(results.items())
+        },
+        'api_calls': dict(sorted(api.methods.items())),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
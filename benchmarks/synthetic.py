@@ -0,0 +1,96 @@
+# Synthetic users and vacancies for load tests, spread over the bot's eight
+# cities with big cities weighted up. Deterministic for a given seed and day.
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assets import CITIES  # noqa: E402
+
+# Rough share of vacancies per city, in CITIES order
+CITY_WEIGHTS = [30, 15, 12, 12, 11, 6, 7, 7]
+
+FIRST_NAMES = ["Олександр", "Андрій", "Дмитро", "Максим", "Іван", "Сергій", "Олена", "Марія",
+               "Анна", "Ірина", "Юлія", "Наталія", "Тарас", "Богдан", "Оксана", "Софія"]
+LAST_NAMES = ["Шевченко", "Коваленко", "Бондаренко", "Ткаченко", "Кравченко", "Олійник",
+              "Мельник", "Поліщук", "Савченко", "Руденко", "Мороз", "Лисенко"]
+TITLES = ["Водій категорії C", "Бариста", "Офіціант", "Кухар", "Продавець-консультант",
+          "Менеджер з продажу", "Бухгалтер", "Прибиральниця", "Охоронець", "Кур'єр",
+          "Вантажник", "Адміністратор", "Програміст Python", "Електрик", "Зварювальник",
+          "Оператор call-центру", "Касир", "Комірник", "Слюсар", "Піцайоло"]
+DUTIES = ["обслуговування клієнтів", "робота з касою", "приготування страв", "доставка замовлень",
+          "ведення документації", "робота на складі", "прибирання приміщень", "продаж техніки",
+          "ремонт обладнання", "перевезення вантажів", "розробка сервісів", "облік товарів"]
+TERMS = ["графік 2/2", "графік 5/2", "позмінний графік", "офіційне працевлаштування",
+         "щотижнева виплата", "безкоштовне харчування", "навчання за рахунок компанії",
+         "премії за результатами", "оплачувана відпустка", "компенсація проїзду"]
+
+# Search terms that always hit the generated vacancies
+QUERIES = ["водій", "бариста", "кухар", "кур'єр", "програміст python", "продавець",
+           "офіційне працевлаштування", "графік 2/2", "склад", "доставка"]
+
+# Timestamps end at today's midnight (UTC), so the generated vacancies
+# have not expired yet
+EPOCH = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def timestamp(rng, days):
+    return (EPOCH - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def username(rng, user_id):
+    return f"@{rng.choice(('job', 'work', 'hr', 'team'))}_{user_id}"
+
+
+def description(rng):
+    duties = ", ".join(rng.sample(DUTIES, rng.randint(1, 3)))
+    terms = ", ".join(rng.sample(TERMS, rng.randint(2, 4)))
+    return (f"Обов'язки: {duties}.\n"
+            f"Умови: {terms}.\n"
+            f"Зарплата від {rng.randrange(12, 60)} 000 грн.")
+
+
+def users(count, seed=1, first_id=1):
+    # (user_id, username, first_name, last_name, joined_at)
+    rng = random.Random(seed)
+    for user_id in range(first_id, first_id + count):
+        yield (user_id, username(rng, user_id)[1:], rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+               timestamp(rng, 180))
+
+
+def jobs(count, seed=2, employers=1000):
+    # (employer_id, title, description, location, telegram_username, created_at)
+    rng = random.Random(seed)
+    for _ in range(count):
+        employer_id = rng.randrange(1, employers + 1)
+        yield (employer_id, rng.choice(TITLES), description(rng),
+               rng.choices(CITIES, CITY_WEIGHTS)[0], username(rng, employer_id), timestamp(rng, 25))
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def populate(db, user_count, job_count, seed=1, batch_size=5000):
+    # db is a storage.Storage with the bot's schema already created
+    for batch in batches(users(user_count, seed), batch_size):
+        db.executemany('''
+            INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, joined_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', batch)
+    for batch in batches(jobs(job_count, seed + 1, max(1, user_count // 10)), batch_size):
+        db.executemany('''
+            INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', batch)
+
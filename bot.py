@@ -1,100 +1,176 @@
 import telebot
 from telebot import types
-import sqlite3
+import gzip
+import logging
 import os
+import tempfile
+import threading
 from datetime import datetime
 
+import requests
+
+import assets
+import bulk
+import cache
+import dedup
+import fanout
+import geo
+import lifecycle
+import migrations
+import search
+import stats
+from assets import CITIES
+from metrics import Metrics, MetricsServer
+from outbound import OutboundScheduler, RateLimitedBot
+from router import UpdateRouter
+from sessions import SessionStore, SQLiteSessionBackend
+from storage import Storage
+from webhook import WebhookServer
+
+logger = logging.getLogger(__name__)
+
+ADMIN_PAGE_SIZE = 5
+SEARCH_PAGE_SIZE = 5
+NEARBY_PAGE_SIZE = 5
+DUPLICATE_CLUSTERS = 5
+DUPLICATE_MEMBERS = 6
+# Button of EDIT_JOB_KEYBOARD -> (jobs column, prompt)
+EDIT_FIELDS = {
+    "📋 Змінити заголовок": ('title', "📋 Введіть новий заголовок вакансії:"),
+    "📝 Змінити опис": ('description', "📝 Введіть новий опис вакансії:"),
+    "📍 Змінити місто": ('location', "📍 Оберіть нове місто:"),
+    "👤 Змінити контакт": ('telegram_username', "📱 Введіть новий Telegram username (наприклад, @username):"),
+}
+# Bot API limits: bots download files up to 20 MB and upload up to 50 MB
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
+
 class JobTelegramBot:
-    def __init__(self, token):
+    def __init__(self, token, send_rate=30, job_ttl_days=lifecycle.DEFAULT_TTL_DAYS, maintenance=True):
         self.bot = telebot.TeleBot(token)
+        self.job_ttl_days = job_ttl_days
+        self.setup_outbox(global_rate=send_rate)
         self.setup_database()
-        self.user_states = {}
-        self.user_data = {}
+        self.media = assets.MediaCache(self.db)
+        self.listings = cache.ListingCache(self.db, self.render_job)
+        self.sessions = SessionStore(SQLiteSessionBackend(self.db))
+        self.user_states = self.sessions.states
+        self.user_data = self.sessions.data
         self.admin_ids = [767168540]  # Ваш ID
+        self.router = UpdateRouter(self.user_states.get)
+        self.register_router()
         self.register_handlers()
         self.register_additional_handlers()
         self.register_job_listing_handlers()
+        self.register_search_handlers()
         self.register_admin_handlers()
         self.register_city_handlers()  # Added city handlers registration
+        self.register_employer_handlers()
+        self.register_subscription_handlers()
+        # One archiver, fan-out engine and index builder per database, see
+        # cluster.Supervisor.maintenance
+        self.archiver = lifecycle.Archiver(self.db)
+        self.fanout = fanout.FanoutEngine(self.db, self.api)
+        self.indexer = migrations.IndexBuilder(self.db)
+        self.maintaining = False
+        if maintenance:
+            self.start_maintenance()
+
+    def start_maintenance(self):
+        if self.maintaining:
+            return
+        self.maintaining = True
+        self.archiver.start()
+        self.fanout.start()
+        # Indexes left deferred, by this process's migration or another's
+        if self.db.fetchone('PRAGMA user_version')[0] < 0:
+            self.indexer.start()
+
+    def setup_outbox(self, **limits):
+        self.outbox = OutboundScheduler(**limits)
+        self.api = RateLimitedBot(self.bot, self.outbox)
 
     def setup_database(self):
-        self.conn = sqlite3.connect('job_bot.db', check_same_thread=False)
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS jobs (
-                id INTEGER PRIMARY KEY,
-                employer_id INTEGER,
-                title TEXT,
-                description TEXT,
-                location TEXT,
-                telegram_username TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        self.conn.commit()
+        self.db = Storage('job_bot.db')
+        # A single pragma read when the schema is current, see migrations.py
+        migrations.migrate(self.db)
+        lifecycle.configure(self.db, self.job_ttl_days)
+
+    def setup_metrics(self, metrics):
+        self.router.observer = metrics.handler
+        self.db.observer = metrics.query
+        self.outbox.observer = metrics.api_call
+        metrics.gauge('bot_outbox_depth', 'Bot API calls queued or in flight', self.outbox.depth)
+        metrics.gauge('bot_db_write_queue', 'Writes waiting for the SQLite writer', self.db.writes.qsize)
+        metrics.gauge('bot_sessions', 'Conversation sessions held in memory', lambda: len(self.sessions))
+        metrics.gauge('bot_fanout_pending', 'New vacancies still being sent to subscribers', self.fanout.pending)
+        metrics.gauge('bot_listing_cache_bytes', 'Estimated size of the listing cache',
+                      lambda: self.listings.bytes)
+        metrics.counter('bot_listing_cache_hits_total', 'Listing cache lookups answered from memory',
+                        lambda: self.listings.hits)
+        metrics.counter('bot_listing_cache_misses_total', 'Listing cache lookups that queried the database',
+                        lambda: self.listings.misses)
 
     def is_admin(self, user_id):
         return user_id in self.admin_ids
 
-    def get_navigation_markup(self):
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        back_btn = types.KeyboardButton("🔙 Назад")
-        start_btn = types.KeyboardButton("🏠 Головне меню")
-        markup.add(back_btn, start_btn)
-        return markup
-
     def show_role_selection(self, message):
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        employer_btn = types.KeyboardButton("👔 Роботодавець")
-        worker_btn = types.KeyboardButton("👷 Шукаю роботу")
-        if self.is_admin(message.chat.id):
-            admin_btn = types.KeyboardButton("⚙️ Адмін-панель")
-            markup.add(employer_btn, worker_btn, admin_btn)
-        else:
-            markup.add(employer_btn, worker_btn)
-        
-        self.bot.send_animation(
+        animation = self.media.get('welcome', assets.WELCOME_ANIMATION)
+        future = self.api.send_animation(
             message.chat.id,
-            "https://media.giphy.com/media/L1R1tvI9svkIWwpVYr/giphy.gif",
+            animation,
             caption="🌟 Вітаємо у Job Search Bot! 🌟\n\n"
             "Оберіть свою роль для продовження:",
-            reply_markup=markup
+            reply_markup=assets.role_keyboard(self.is_admin(message.chat.id))
         )
+        self.media.track('welcome', animation, future)
+
+    def register_router(self):
+        @self.bot.message_handler(func=lambda message: True)
+        def route_message(message):
+            self.router.dispatch(message)
+
+        # Files only matter to the state waiting for one, see AWAITING_IMPORT
+        @self.bot.message_handler(content_types=['document'])
+        def route_document(message):
+            if self.user_states.get(message.chat.id) == "AWAITING_IMPORT":
+                self.router.dispatch(message)
+
+        @self.bot.message_handler(content_types=['location'])
+        def route_location(message):
+            self.router.dispatch_location(message)
+
+        @self.bot.callback_query_handler(func=lambda call: True)
+        def route_callback(call):
+            self.router.dispatch_callback(call)
 
     def register_handlers(self):
-        @self.bot.message_handler(commands=['start'])
+        @self.router.command('start')
         def start_message(message):
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
+            # Not waited for: the reply does not depend on the commit
+            self.db.execute('''
+                INSERT INTO users (user_id, username, first_name, last_name)
                 VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name
             ''', (
                 message.from_user.id,
                 message.from_user.username,
                 message.from_user.first_name,
                 message.from_user.last_name
-            ))
-            self.conn.commit()
+            ), wait=False)
             self.user_states[message.chat.id] = None
             self.show_role_selection(message)
 
-        @self.bot.message_handler(func=lambda message: message.text == "🏠 Головне меню")
+        @self.router.text("🏠 Головне меню", before_state=True)
         def return_to_start(message):
             self.user_states[message.chat.id] = None
             self.show_role_selection(message)
 
     def register_city_handlers(self):
-        @self.bot.message_handler(func=lambda message: message.text in ["👔 Роботодавець", "👷 Шукаю роботу"])
+        @self.router.text("👔 Роботодавець", "👷 Шукаю роботу")
         def choose_role(message):
             self.user_states[message.chat.id] = message.text
             if message.text == "👔 Роботодавець":
@@ -102,9 +178,7 @@ class JobTelegramBot:
             else:
                 self.start_worker_flow(message)
 
-        @self.bot.message_handler(func=lambda message: 
-            message.text in ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро", 
-                           "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"])
+        @self.router.text(*CITIES)
         def handle_city_selection(message):
             state = self.user_states.get(message.chat.id)
             if state == "👔 Роботодавець":
@@ -112,84 +186,93 @@ class JobTelegramBot:
             elif state == "👷 Шукаю роботу":
                 self.show_job_listings(message)
 
+        @self.router.location("👔 Роботодавець")
+        def post_here(message):
+            self.start_job_posting(message, (message.location.latitude, message.location.longitude))
+
+        @self.router.location("👷 Шукаю роботу", "NEARBY_RESULTS")
+        def nearby_jobs(message):
+            self.user_data[message.chat.id] = {
+                'point': (message.location.latitude, message.location.longitude),
+                'cursor': None,
+                'shown': 0
+            }
+            self.show_nearby_jobs(message)
+
     def start_employer_flow(self, message):
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        cities = ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро", 
-                 "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"]
-        
-        for city in cities:
-            markup.add(types.KeyboardButton(city))
-        
-        markup.add(types.KeyboardButton("🔙 Назад"))
-        markup.add(types.KeyboardButton("🏠 Головне меню"))
-        
-        self.bot.send_message(
+        self.api.send_message(
             message.chat.id,
-            "📍 Оберіть місто для публікації вакансії:",
-            reply_markup=markup
+            "📍 Оберіть місто для публікації вакансії або надішліть своє місцезнаходження:",
+            reply_markup=assets.EMPLOYER_CITY_KEYBOARD
         )
 
     def start_worker_flow(self, message):
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        cities = ["🏙️ Київ", "🌇 Львів", "🌅 Одеса", "🌆 Харків", "🌃 Дніпро", 
-                 "🏘️ Хмельницький", "🏰 Полтава", "🌉 Кривий Ріг"]
-        
-        for city in cities:
-            markup.add(types.KeyboardButton(city))
-        
-        markup.add(types.KeyboardButton("🔙 Назад"))
-        markup.add(types.KeyboardButton("🏠 Головне меню"))
-        
-        self.bot.send_message(
+        self.api.send_message(
             message.chat.id, 
-            "🔍 Оберіть місто для пошуку роботи:",
-            reply_markup=markup
+            "🔍 Оберіть місто для пошуку роботи або знайдіть вакансії поруч з вами:",
+            reply_markup=assets.WORKER_CITY_KEYBOARD
         )
 
-    def start_job_posting(self, message):
-        self.user_data[message.chat.id] = {'location': message.text}
-        self.bot.send_message(
+    def start_job_posting(self, message, point=None):
+        # point is the (latitude, longitude) the employer shared; the
+        # vacancy is listed under the nearest city
+        if point is None:
+            self.user_data[message.chat.id] = {'location': message.text}
+            prompt = "📋 Введіть заголовок вакансії:"
+        else:
+            location = geo.nearest_city(*point)
+            self.user_data[message.chat.id] = {'location': location, 'point': point}
+            prompt = f"📍 Вакансію буде показано в місті {location} і в пошуку поруч.\n\n📋 Введіть заголовок вакансії:"
+        self.api.send_message(
             message.chat.id, 
-            "📋 Введіть заголовок вакансії:",
-            reply_markup=self.get_navigation_markup()
+            prompt,
+            reply_markup=assets.NAVIGATION_KEYBOARD
         )
         self.user_states[message.chat.id] = "AWAITING_JOB_TITLE"
 
     def register_additional_handlers(self):
-        @self.bot.message_handler(func=lambda message: message.text == "🔙 Назад")
+        @self.router.text("🔙 Назад", before_state=True)
         def handle_back(message):
             current_state = self.user_states.get(message.chat.id)
             if current_state == "AWAITING_JOB_TITLE":
                 self.start_employer_flow(message)
             elif current_state == "AWAITING_JOB_DESCRIPTION":
-                self.bot.send_message(
+                self.api.send_message(
                     message.chat.id,
                     "📋 Введіть заголовок вакансії:",
-                    reply_markup=self.get_navigation_markup()
+                    reply_markup=assets.NAVIGATION_KEYBOARD
                 )
                 self.user_states[message.chat.id] = "AWAITING_JOB_TITLE"
             elif current_state == "AWAITING_CONTACT":
-                self.bot.send_message(
+                self.api.send_message(
                     message.chat.id,
                     "📝 Введіть повний опис вакансії:",
-                    reply_markup=self.get_navigation_markup()
+                    reply_markup=assets.NAVIGATION_KEYBOARD
                 )
                 self.user_states[message.chat.id] = "AWAITING_JOB_DESCRIPTION"
+            elif current_state in ["AWAITING_SEARCH_QUERY", "SEARCH_RESULTS", "NEARBY_RESULTS"]:
+                self.user_states[message.chat.id] = "👷 Шукаю роботу"
+                self.start_worker_flow(message)
             elif current_state == "ADMIN_PANEL":
                 self.show_role_selection(message)
+            elif current_state in ["AWAITING_IMPORT", "EDITING_JOB"]:
+                self.show_admin_panel(message.chat.id)
+            elif current_state == "AWAITING_EDIT_VALUE":
+                self.api.send_message(
+                    message.chat.id,
+                    "✏️ Оберіть, що хочете змінити:",
+                    reply_markup=assets.EDIT_JOB_KEYBOARD
+                )
+                self.user_states[message.chat.id] = "EDITING_JOB"
             elif current_state in ["👔 Роботодавець", "👷 Шукаю роботу"]:
                 self.show_role_selection(message)
             else:
                 self.show_role_selection(message)
 
-        @self.bot.message_handler(func=lambda message: 
-            self.user_states.get(message.chat.id) == "AWAITING_JOB_TITLE")
+        @self.router.state("AWAITING_JOB_TITLE")
         def get_job_title(message):
-            if message.text in ["🔙 Назад", "🏠 Головне меню"]:
-                return
-            
             self.user_data[message.chat.id]['title'] = message.text
-            self.bot.send_message(
+            self.api.send_message(
                 message.chat.id, 
                 "📝 Введіть повний опис вакансії:\n\n"
                 "• Обов'язки\n"
@@ -197,35 +280,27 @@ class JobTelegramBot:
                 "• Умови роботи\n"
                 "• Зарплата\n"
                 "• Графік роботи", 
-                reply_markup=self.get_navigation_markup()
+                reply_markup=assets.NAVIGATION_KEYBOARD
             )
             self.user_states[message.chat.id] = "AWAITING_JOB_DESCRIPTION"
 
-        @self.bot.message_handler(func=lambda message: 
-            self.user_states.get(message.chat.id) == "AWAITING_JOB_DESCRIPTION")
+        @self.router.state("AWAITING_JOB_DESCRIPTION")
         def get_job_description(message):
-            if message.text in ["🔙 Назад", "🏠 Головне меню"]:
-                return
-            
             self.user_data[message.chat.id]['description'] = message.text
-            self.bot.send_message(
+            self.api.send_message(
                 message.chat.id, 
                 "📱 Введіть ваш Telegram username (наприклад, @username):", 
-                reply_markup=self.get_navigation_markup()
+                reply_markup=assets.NAVIGATION_KEYBOARD
             )
             self.user_states[message.chat.id] = "AWAITING_CONTACT"
 
-        @self.bot.message_handler(func=lambda message: 
-            self.user_states.get(message.chat.id) == "AWAITING_CONTACT")
+        @self.router.state("AWAITING_CONTACT")
         def get_contact(message):
-            if message.text in ["🔙 Назад", "🏠 Головне меню"]:
-                return
-            
             if not message.text.startswith('@'):
-                self.bot.send_message(
+                self.api.send_message(
                     message.chat.id,
                     "❌ Username повинен починатися з '@'. Спробуйте ще раз:",
-                    reply_markup=self.get_navigation_markup()
+                    reply_markup=assets.NAVIGATION_KEYBOARD
                 )
                 return
                 
@@ -234,110 +309,560 @@ class JobTelegramBot:
 
     def save_job_posting(self, message):
         job_data = self.user_data[message.chat.id]
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO jobs 
-            (employer_id, title, description, location, telegram_username) 
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            message.chat.id, 
-            job_data['title'], 
-            job_data['description'], 
-            job_data['location'], 
-            job_data['telegram_username']
-        ))
-        self.conn.commit()
-        
-        self.bot.send_message(
-            message.chat.id, 
-            "✅ Вакансію успішно опубліковано!"
-        )
+        values = dedup.signature(job_data['title'], job_data['description'])
+        point = job_data.get('point')
+
+        def post(conn):
+            # Without a shared location geo_jobs_default_place puts the
+            # vacancy at the city centre
+            place_id = geo.place(conn, *point) if point else None
+            # A near duplicate of one of the employer's own vacancies
+            # replaces its text instead of adding another listing
+            found = dedup.matches(conn, job_data['location'], values)
+            own = [match for match in found if match[2] == message.chat.id]
+            if own:
+                job_id = own[0][1]
+                conn.execute('''
+                    UPDATE jobs SET title = ?, description = ?, telegram_username = ?,
+                        expires_at = datetime('now', ?), place_id = COALESCE(?, place_id)
+                    WHERE id = ?
+                ''', (
+                    job_data['title'],
+                    job_data['description'],
+                    job_data['telegram_username'],
+                    f'+{self.job_ttl_days} days',
+                    place_id,
+                    job_id
+                ))
+                dedup.index(conn, job_id, job_data['location'], values, [])
+                return False
+
+            # The vacancy and its fan-out to subscribers commit together
+            job_id = conn.execute('''
+                INSERT INTO jobs 
+                (employer_id, title, description, location, telegram_username, place_id) 
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                message.chat.id, 
+                job_data['title'], 
+                job_data['description'], 
+                job_data['location'], 
+                job_data['telegram_username'],
+                place_id
+            )).lastrowid
+            fanout.enqueue(conn, job_id, job_data['location'])
+            dedup.index(conn, job_id, job_data['location'], values, found)
+            return True
+
+        posted = self.db.run(post)
+        self.listings.changed()
+        if posted:
+            self.fanout.notify()
+            self.api.send_message(
+                message.chat.id, 
+                "✅ Вакансію успішно опубліковано!"
+            )
+        else:
+            self.api.send_message(
+                message.chat.id,
+                "♻️ У вас вже є схожа вакансія в цьому місті — ми оновили її текст замість нової публікації."
+            )
         
-        self.bot.send_message(
+        self.api.send_message(
             message.chat.id, 
-            "📝 Ваша вакансія активна! Чекаємо на відгуки від кандидатів.", 
-            reply_markup=self.get_navigation_markup()
+            f"📝 Ваша вакансія активна {self.job_ttl_days} днів! Чекаємо на відгуки від кандидатів.\n\n"
+            "Продовжити її можна в розділі «📂 Мої вакансії».", 
+            reply_markup=assets.NAVIGATION_KEYBOARD
         )
         
+        self.user_states[message.chat.id] = None
         self.show_role_selection(message)
 
-    def show_job_listings(self, message):
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM jobs WHERE location = ?', (message.text,))
-        jobs = cursor.fetchall()
-        
+    def show_my_jobs(self, chat_id, message_id=None):
+        jobs = lifecycle.employer_jobs(self.db, chat_id)
         if not jobs:
-            self.bot.send_message(
-                message.chat.id, 
-                "😔 На жаль, в обраному місті зараз немає активних вакансій.", 
-                reply_markup=self.get_navigation_markup()
-            )
+            text = "📭 У вас немає активних вакансій."
+            if message_id is None:
+                self.api.send_message(chat_id, text, reply_markup=assets.NAVIGATION_KEYBOARD)
+            else:
+                self.api.edit_message_text(text, chat_id, message_id)
             return
-        
-        self.user_data[message.chat.id] = {'jobs': jobs, 'current_job_index': 0}
-        self.display_job(message)
 
-    def display_job(self, message):
-        user_data = self.user_data[message.chat.id]
-        jobs = user_data['jobs']
-        current_index = user_data['current_job_index']
-        
-        if current_index >= len(jobs):
-            self.bot.send_message(
-                message.chat.id, 
-                "🔚 Більше вакансій немає.", 
-                reply_markup=self.get_navigation_markup()
+        blocks = []
+        markup = types.InlineKeyboardMarkup()
+        for job_id, title, location, expires_at in jobs:
+            blocks.append(f"🆔 {job_id} | 📍 {location}\n📋 {title}\n⏳ Активна до {expires_at}")
+            markup.add(types.InlineKeyboardButton(f"🔁 Продовжити {job_id}", callback_data=f"renew_job_{job_id}"))
+        text = "📂 Ваші вакансії:\n\n" + "\n\n".join(blocks)
+        if message_id is None:
+            self.api.send_message(chat_id, text, reply_markup=markup)
+        else:
+            self.api.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+
+    def register_employer_handlers(self):
+        @self.router.text("📂 Мої вакансії")
+        def my_jobs(message):
+            self.show_my_jobs(message.chat.id)
+
+        @self.router.callback('renew_job')
+        def renew_job(call):
+            job_id = int(call.data.split('_')[2])
+            expires_at = lifecycle.renew(self.db, job_id, call.message.chat.id, self.job_ttl_days)
+            self.listings.changed()
+            if expires_at is None:
+                self.api.answer_callback_query(call.id, "❌ Вакансію не знайдено або вона вже в архіві.")
+                return
+
+            self.api.answer_callback_query(call.id, f"✅ Вакансію продовжено до {expires_at}")
+            self.show_my_jobs(call.message.chat.id, call.message.message_id)
+
+    def show_job_listings(self, message):
+        total = stats.city_jobs(self.db, message.text)
+
+        if not total:
+            self.api.send_message(
+                message.chat.id,
+                "😔 На жаль, в обраному місті зараз немає активних вакансій.",
+                reply_markup=assets.NAVIGATION_KEYBOARD
             )
             return
-        
-        job = jobs[current_index]
-        telegram_username = job[5]
-        
-        job_message = (
-            f"📋 Вакансія {current_index + 1}/{len(jobs)}:\n\n"
+
+        # Only a keyset cursor is kept per user, rows are fetched on demand
+        self.user_data[message.chat.id] = {
+            'location': message.text,
+            'cursor': None,
+            'position': 0,
+            'total': total
+        }
+        self.display_job(message)
+
+    def render_job(self, job):
+        # The card cached by self.listings: everything but the position,
+        # which differs between viewers
+        return (
             f"🔹 Назва: {job[2]}\n\n"
             f"📝 Опис:\n{job[3]}\n\n"
             f"📍 Місто: {job[4]}\n"
-            f"👤 Контакт: {telegram_username}"
+            f"👤 Контакт: {job[5]}",
+            job[5]
         )
+
+    def display_job(self, message):
+        user_data = self.user_data.get(message.chat.id)
+        found = None
+        if user_data and 'location' in user_data:
+            found = self.listings.next_job(user_data['location'], user_data['cursor'])
+
+        if found is None:
+            self.api.send_message(
+                message.chat.id,
+                "🔚 Більше вакансій немає.",
+                reply_markup=assets.NAVIGATION_KEYBOARD
+            )
+            return
+
+        cursor, (card, telegram_username) = found
+        current_index = user_data['position']
+        # Vacancies posted while browsing can push the position past the first count
+        total = max(user_data['total'], current_index + 1)
+
+        job_message = f"📋 Вакансія {current_index + 1}/{total}:\n\n{card}"
         
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        next_btn = types.KeyboardButton("➡️ Наступна вакансія")
-        contact_btn = types.KeyboardButton("💬 Написати роботодавцю")
-        back_btn = types.KeyboardButton("🔙 Назад")
-        start_btn = types.KeyboardButton("🏠 Головне меню")
-        
-        markup.add(next_btn, contact_btn)
-        markup.add(back_btn, start_btn)
-        
-        self.bot.send_message(
+        self.api.send_message(
             message.chat.id, 
             job_message, 
-            reply_markup=markup
+            reply_markup=assets.JOB_KEYBOARD
         )
         
-        user_data['current_job_index'] += 1
+        user_data['cursor'] = cursor
+        user_data['position'] = current_index + 1
         user_data['current_employer_username'] = telegram_username
 
+    def fetch_jobs_page(self, key=None, direction='page'):
+        if key is None:
+            return self.db.fetchall('''
+                SELECT * FROM jobs ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (ADMIN_PAGE_SIZE,))
+        if direction == 'prev':
+            jobs = self.db.fetchall('''
+                SELECT * FROM jobs WHERE (created_at, id) > (?, ?)
+                ORDER BY created_at, id LIMIT ?
+            ''', (key[0], key[1], ADMIN_PAGE_SIZE))
+            if len(jobs) < ADMIN_PAGE_SIZE:
+                return self.fetch_jobs_page()
+            return jobs[::-1]
+        operator = '<=' if direction == 'page' else '<'
+        return self.db.fetchall(f'''
+            SELECT * FROM jobs WHERE (created_at, id) {operator} (?, ?)
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        ''', (key[0], key[1], ADMIN_PAGE_SIZE))
+
+    def render_jobs_page(self, jobs):
+        blocks = []
+        markup = types.InlineKeyboardMarkup()
+        for job in jobs:
+            description = job[3] if len(job[3]) <= 200 else job[3][:200] + "…"
+            blocks.append(
+                f"🆔 ID: {job[0]} | 📍 {job[4]}\n"
+                f"📋 {job[2]}\n"
+                f"📝 {description}\n"
+                f"👤 {job[5]} | 📅 {job[6]}"
+            )
+            markup.add(
+                types.InlineKeyboardButton(f"🗑️ Видалити {job[0]}", callback_data=f"delete_job_{job[0]}"),
+                types.InlineKeyboardButton(f"✏️ Редагувати {job[0]}", callback_data=f"edit_job_{job[0]}")
+            )
+
+        first, last = jobs[0], jobs[-1]
+        navigation = []
+        if self.db.fetchone('SELECT 1 FROM jobs WHERE (created_at, id) > (?, ?) LIMIT 1', (first[6], first[0])):
+            navigation.append(types.InlineKeyboardButton(
+                "⬅️ Новіші", callback_data=f"jobs_prev_{first[6]}|{first[0]}"
+            ))
+        navigation.append(types.InlineKeyboardButton(
+            "🔄", callback_data=f"jobs_page_{first[6]}|{first[0]}"
+        ))
+        if self.db.fetchone('SELECT 1 FROM jobs WHERE (created_at, id) < (?, ?) LIMIT 1', (last[6], last[0])):
+            navigation.append(types.InlineKeyboardButton(
+                "Старіші ➡️", callback_data=f"jobs_next_{last[6]}|{last[0]}"
+            ))
+        markup.row(*navigation)
+
+        return "📝 Всі вакансії:\n\n" + "\n\n".join(blocks), markup
+
+    def jobs_page_key(self, message):
+        # The 🔄 button of a browser page carries the key of its first row
+        markup = getattr(message, 'reply_markup', None)
+        for row in getattr(markup, 'keyboard', None) or []:
+            for button in row:
+                data = button.callback_data or ''
+                if data.startswith('jobs_page_'):
+                    created_at, job_id = data.rsplit('_', 1)[1].split('|')
+                    return created_at, int(job_id)
+        return None
+
+    def show_jobs_page(self, chat_id, message_id=None, key=None, direction='page'):
+        jobs = self.fetch_jobs_page(key, direction)
+        if not jobs and key is not None:
+            jobs = self.fetch_jobs_page()
+
+        if not jobs:
+            if message_id is None:
+                self.api.send_message(
+                    chat_id,
+                    "📭 Наразі немає активних вакансій.",
+                    reply_markup=assets.NAVIGATION_KEYBOARD
+                )
+            else:
+                self.api.edit_message_text("📭 Наразі немає активних вакансій.", chat_id, message_id)
+            return
+
+        text, markup = self.render_jobs_page(jobs)
+        if message_id is None:
+            self.api.send_message(chat_id, text, reply_markup=markup)
+        else:
+            self.api.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+
+    def show_duplicates(self, chat_id, message_id=None):
+        groups = dedup.clusters(self.db, DUPLICATE_CLUSTERS)
+        if not groups:
+            text = "✅ Схожих вакансій не знайдено."
+            if message_id is None:
+                self.api.send_message(chat_id, text, reply_markup=assets.NAVIGATION_KEYBOARD)
+            else:
+                self.api.edit_message_text(text, chat_id, message_id)
+            return
+
+        blocks = []
+        markup = types.InlineKeyboardMarkup(row_width=2)
+        for cluster_id, members in groups:
+            lines = [f"🧬 Група {cluster_id} ({len(members)}):"]
+            buttons = []
+            for job_id, title, location, employer_id, similarity in members[:DUPLICATE_MEMBERS]:
+                score = "оригінал" if similarity is None else f"схожість {similarity:.0%}"
+                lines.append(f"🆔 {job_id} | 📍 {location} | 👤 {employer_id} | {score}\n📋 {title}")
+                buttons.append(types.InlineKeyboardButton(f"🗑️ Видалити {job_id}", callback_data=f"delete_job_{job_id}"))
+            blocks.append("\n".join(lines))
+            markup.add(*buttons)
+        markup.row(types.InlineKeyboardButton("🔄 Оновити", callback_data="dups_refresh_0"))
+
+        text = "🧬 Схожі вакансії різних роботодавців:\n\n" + "\n\n".join(blocks)
+        if message_id is None:
+            self.api.send_message(chat_id, text, reply_markup=markup)
+        else:
+            self.api.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+
+    def is_duplicates_view(self, message):
+        markup = getattr(message, 'reply_markup', None)
+        for row in getattr(markup, 'keyboard', None) or []:
+            for button in row:
+                if (button.callback_data or '').startswith('dups_refresh_'):
+                    return True
+        return False
+
+    def update_job(self, job_id, field, value):
+        # False when the vacancy is gone
+        job = self.db.fetchone('SELECT title, description, location FROM jobs WHERE id = ?', (job_id,))
+        if job is None:
+            return False
+        signed = dict(zip(('title', 'description', 'location'), job))
+        resign = field in signed
+        signed[field] = value
+        values = dedup.signature(signed['title'], signed['description']) if resign else None
+
+        def edit(conn):
+            if not conn.execute(f'UPDATE jobs SET {field} = ? WHERE id = ?', (value, job_id)).rowcount:
+                return False
+            if resign:
+                dedup.reindex(conn, job_id, signed['location'], values)
+            return True
+
+        updated = self.db.run(edit)
+        self.listings.changed()
+        return updated
+
+    def show_admin_panel(self, chat_id):
+        self.api.send_message(
+            chat_id,
+            "⚙️ Панель адміністратора\n\nОберіть опцію:",
+            reply_markup=assets.ADMIN_KEYBOARD
+        )
+        self.user_states[chat_id] = "ADMIN_PANEL"
+
+    def start_worker(self, name, target, *args):
+        # A thread for one long job; the reader connection it opens is
+        # closed with it
+        def run():
+            try:
+                target(*args)
+            finally:
+                self.db.release_reader()
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+
+    def import_jobs(self, chat_id, document):
+        # Runs on its own thread; the file is parsed as it downloads
+        kind, gzipped = bulk.file_format(document.file_name)
+        try:
+            response = requests.get(self.bot.get_file_url(document.file_id), stream=True, timeout=60)
+            response.raise_for_status()
+            # urllib3 closes the raw stream at its end, before the text
+            # wrapper on top of it has read its last buffer
+            response.raw.auto_close = False
+            with response:
+                imported, rejected, errors = bulk.import_jobs(
+                    self.db, response.raw, kind, gzipped, self.job_ttl_days
+                )
+        except Exception:
+            logger.exception("Import of %s failed", document.file_name)
+            self.api.send_message(chat_id, "❌ Не вдалося імпортувати файл. Перевірте формат і спробуйте ще раз.")
+            return
+        finally:
+            # Chunks written before a failure are in the database too
+            self.listings.changed()
+
+        report = f"✅ Імпортовано вакансій: {imported}\n❌ Відхилено рядків: {rejected}"
+        if errors:
+            report += "\n\n" + "\n".join(f"Рядок {line}: {reason}" for line, reason in errors)
+            if rejected > len(errors):
+                report += "\n…"
+        self.api.send_message(chat_id, report, reply_markup=assets.ADMIN_KEYBOARD)
+
+    def export_jobs(self, chat_id):
+        # Runs on its own thread. The gzipped CSV is written to a temporary
+        # file and sent from it, the table is never held in memory.
+        f = tempfile.NamedTemporaryFile(suffix='.csv.gz', delete=False)
+        try:
+            with gzip.open(f, 'wt', encoding='utf-8', newline='') as out:
+                count = bulk.export_jobs(self.db, out)
+            size = f.tell()
+        except Exception:
+            logger.exception("Export of vacancies failed")
+            f.close()
+            os.remove(f.name)
+            self.api.send_message(chat_id, "❌ Не вдалося експортувати вакансії.")
+            return
+
+        def send_document(chat_id, document, **kwargs):
+            # A call retried after a 429 has to upload from the start again
+            document.seek(0)
+            return self.api.bot.send_document(chat_id, document, **kwargs)
+
+        def cleanup(future):
+            # Only once the last attempt is over
+            f.close()
+            os.remove(f.name)
+
+        if size > EXPORT_MAX_BYTES:
+            cleanup(None)
+            self.api.send_message(
+                chat_id,
+                f"❌ Файл експорту завеликий для Telegram ({size // (1024 * 1024)} МБ). "
+                "Скористайтеся командою на сервері:\n\npython bulk.py export jobs.csv.gz"
+            )
+            return
+        self.outbox.submit(
+            chat_id,
+            send_document,
+            chat_id,
+            f,
+            caption=f"📤 Вакансій у файлі: {count}",
+            visible_file_name=f"jobs-{datetime.now():%Y%m%d}.csv.gz"
+        ).add_done_callback(cleanup)
+
+    def start_search(self, message):
+        self.user_data[message.chat.id] = {'search_location': None}
+        self.api.send_message(
+            message.chat.id,
+            "🔎 Введіть ключові слова (наприклад: водій, бариста).\n\n"
+            "Щоб шукати лише в одному місті, спочатку оберіть його:",
+            reply_markup=assets.SEARCH_CITY_KEYBOARD
+        )
+        self.user_states[message.chat.id] = "AWAITING_SEARCH_QUERY"
+
+    def show_search_results(self, message):
+        search_data = self.user_data[message.chat.id]
+        query = search_data['query']
+        location = search_data.get('search_location')
+        offset = search_data['offset']
+
+        jobs = search.search(self.db, query, location, SEARCH_PAGE_SIZE, offset)
+        if not jobs:
+            text = "😔 За вашим запитом нічого не знайдено." if offset == 0 else "🔚 Більше результатів немає."
+            self.api.send_message(message.chat.id, text, reply_markup=assets.NAVIGATION_KEYBOARD)
+            return
+
+        if offset == 0:
+            search_data['total'] = search.count(self.db, query, location)
+        blocks = []
+        for number, job in enumerate(jobs, offset + 1):
+            description = job[3] if len(job[3]) <= 300 else job[3][:300] + "…"
+            blocks.append(
+                f"{number}. 🔹 {job[2]}\n"
+                f"📍 {job[4]} | 👤 {job[5]}\n"
+                f"{description}"
+            )
+        search_message = (
+            f"🔎 Результати за запитом «{query}» "
+            f"({offset + 1}-{offset + len(jobs)} з {search_data['total']}):\n\n"
+            + "\n\n".join(blocks)
+        )
+
+        if offset + len(jobs) < search_data['total']:
+            markup = assets.SEARCH_MORE_KEYBOARD
+        else:
+            markup = assets.NAVIGATION_KEYBOARD
+
+        self.api.send_message(message.chat.id, search_message, reply_markup=markup)
+        search_data['offset'] = offset + len(jobs)
+        self.user_states[message.chat.id] = "SEARCH_RESULTS"
+
+    def show_nearby_jobs(self, message):
+        nearby_data = self.user_data[message.chat.id]
+        shown = nearby_data['shown']
+        jobs = geo.nearby(self.db, *nearby_data['point'], NEARBY_PAGE_SIZE, nearby_data['cursor'])
+        if not jobs:
+            if shown == 0:
+                text = f"😔 У радіусі {geo.RADIUS_KM} км від вас зараз немає активних вакансій."
+            else:
+                text = "🔚 Більше вакансій поруч немає."
+            self.api.send_message(message.chat.id, text, reply_markup=assets.NAVIGATION_KEYBOARD)
+            return
+
+        blocks = []
+        for number, (km, job) in enumerate(jobs, shown + 1):
+            description = job[3] if len(job[3]) <= 300 else job[3][:300] + "…"
+            blocks.append(
+                f"{number}. 🔹 {job[2]}\n"
+                f"📍 {job[4]}, {km:.1f} км | 👤 {job[5]}\n"
+                f"{description}"
+            )
+        nearby_message = f"📍 Вакансії поруч ({shown + 1}-{shown + len(jobs)}):\n\n" + "\n\n".join(blocks)
+
+        # A full page may have more after it; the next one tells
+        if len(jobs) == NEARBY_PAGE_SIZE:
+            markup = assets.SEARCH_MORE_KEYBOARD
+        else:
+            markup = assets.NAVIGATION_KEYBOARD
+
+        self.api.send_message(message.chat.id, nearby_message, reply_markup=markup)
+        nearby_data['cursor'] = geo.cursor(*jobs[-1])
+        nearby_data['shown'] = shown + len(jobs)
+        self.user_states[message.chat.id] = "NEARBY_RESULTS"
+
+    def register_search_handlers(self):
+        @self.router.text("🔎 Пошук за ключовими словами")
+        def search_jobs(message):
+            self.start_search(message)
+
+        @self.router.state("AWAITING_SEARCH_QUERY", "SEARCH_RESULTS")
+        def get_search_query(message):
+            if message.text in CITIES:
+                self.user_data[message.chat.id] = {'search_location': message.text}
+                self.api.send_message(
+                    message.chat.id,
+                    f"📍 Шукаємо в місті {message.text}. Введіть ключові слова:",
+                    reply_markup=assets.NAVIGATION_KEYBOARD
+                )
+                self.user_states[message.chat.id] = "AWAITING_SEARCH_QUERY"
+                return
+
+            search_data = self.user_data.get(message.chat.id) or {}
+            self.user_data[message.chat.id] = {
+                'query': message.text,
+                'search_location': search_data.get('search_location'),
+                'offset': 0
+            }
+            self.show_search_results(message)
+
+        @self.router.text("➡️ Більше результатів", before_state=True)
+        def more_search_results(message):
+            state = self.user_states.get(message.chat.id)
+            if state == "SEARCH_RESULTS":
+                self.show_search_results(message)
+            elif state == "NEARBY_RESULTS":
+                self.show_nearby_jobs(message)
+
+    def register_subscription_handlers(self):
+        @self.router.text("🔔 Підписки на міста")
+        def show_subscriptions(message):
+            self.api.send_message(
+                message.chat.id,
+                "🔔 Оберіть міста, про нові вакансії в яких ви хочете отримувати сповіщення:",
+                reply_markup=fanout.subscriptions_markup(fanout.subscriptions(self.db, message.chat.id))
+            )
+
+        @self.router.callback('sub_toggle')
+        def toggle_subscription(call):
+            city = CITIES[int(call.data.rsplit('_', 1)[1])]
+            if fanout.toggle(self.db, call.message.chat.id, city):
+                self.api.answer_callback_query(call.id, f"🔔 Ви підписалися на вакансії: {city}")
+            else:
+                self.api.answer_callback_query(call.id, f"🔕 Ви відписалися від вакансій: {city}")
+            self.api.edit_message_reply_markup(
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=fanout.subscriptions_markup(fanout.subscriptions(self.db, call.message.chat.id))
+            )
+
+        @self.router.callback('sub_off')
+        def unsubscribe(call):
+            city = CITIES[int(call.data.rsplit('_', 1)[1])]
+            fanout.unsubscribe(self.db, call.message.chat.id, city)
+            self.api.answer_callback_query(call.id, f"🔕 Ви відписалися від вакансій: {city}")
+
     def register_job_listing_handlers(self):
-        @self.bot.message_handler(func=lambda message: message.text == "➡️ Наступна вакансія")
+        @self.router.text("➡️ Наступна вакансія")
         def next_job(message):
-            if message.text == "🏠 Головне меню":
-                self.show_role_selection(message)
-                return
             self.display_job(message)
 
-        @self.bot.message_handler(func=lambda message: message.text == "💬 Написати роботодавцю")
+        @self.router.text("💬 Написати роботодавцю")
         def contact_employer(message):
-            if message.text == "🏠 Головне меню":
-                self.show_role_selection(message)
-                return
-                
-            if 'current_employer_username' not in self.user_data[message.chat.id]:
-                self.bot.send_message(
+            if 'current_employer_username' not in self.user_data.get(message.chat.id, {}):
+                self.api.send_message(
                     message.chat.id, 
                     "❌ Помилка: Неможливо знайти контакт роботодавця.",
-                    reply_markup=self.get_navigation_markup()
+                    reply_markup=assets.NAVIGATION_KEYBOARD
                 )
                 return
 
@@ -351,59 +876,28 @@ class JobTelegramBot:
             )
             markup.add(contact_button)
             
-            self.bot.send_message(
+            self.api.send_message(
                 message.chat.id,
                 "📱 Натисніть кнопку нижче, щоб написати роботодавцю:",
                 reply_markup=markup
             )
 
     def register_admin_handlers(self):
-        @self.bot.message_handler(func=lambda message: message.text == "⚙️ Адмін-панель")
+        @self.router.text("⚙️ Адмін-панель")
         def admin_panel(message):
             if not self.is_admin(message.chat.id):
                 return
             
-            markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            markup.add(
-                types.KeyboardButton("📊 Статистика"),
-                types.KeyboardButton("📝 Всі вакансії")
-            )
-            markup.add(types.KeyboardButton("🔙 Назад"))
-            
-            self.bot.send_message(
-                message.chat.id,
-                "⚙️ Панель адміністратора\n\nОберіть опцію:",
-                reply_markup=markup
-            )
-            self.user_states[message.chat.id] = "ADMIN_PANEL"
+            self.show_admin_panel(message.chat.id)
 
-        @self.bot.message_handler(func=lambda message: 
-            message.text == "📊 Статистика" and self.is_admin(message.chat.id))
+        @self.router.text("📊 Статистика")
         def show_statistics(message):
-            cursor = self.conn.cursor()
-            
-            # Get total users
-            cursor.execute('SELECT COUNT(*) FROM users')
-            total_users = cursor.fetchone()[0]
-            
-            # Get total jobs
-            cursor.execute('SELECT COUNT(*) FROM jobs')
-            total_jobs = cursor.fetchone()[0]
-            
-            # Get active users in last 24 hours
-            cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE joined_at >= datetime('now', '-1 day')
-            ''')
-            active_users = cursor.fetchone()[0]
-            
-            # Get jobs by city
-            cursor.execute('''
-                SELECT location, COUNT(*) as count 
-                FROM jobs 
-                GROUP BY location
-            ''')
-            jobs_by_city = cursor.fetchall()
+            if not self.is_admin(message.chat.id):
+                return
+
+            # Totals, new users over the last 24 hours and jobs by city
+            # come from the aggregates maintained by triggers
+            total_users, total_jobs, active_users, jobs_by_city = stats.summary(self.db)
             
             stats_message = (
                 "📊 Статистика бота:\n\n"
@@ -416,81 +910,152 @@ class JobTelegramBot:
             for city, count in jobs_by_city:
                 stats_message += f"{city}: {count} вакансій\n"
             
-            markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            markup.add(types.KeyboardButton("🔙 Назад"))
-            markup.add(types.KeyboardButton("🏠 Головне меню"))
-            
-            self.bot.send_message(message.chat.id, stats_message, reply_markup=markup)
+            self.api.send_message(message.chat.id, stats_message, reply_markup=assets.STATISTICS_KEYBOARD)
+
+        @self.router.text("📈 Динаміка за 30 днів")
+        def show_trend(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            trend_message = "📈 Динаміка за 30 днів (👥 нові користувачі / 📝 нові вакансії):\n\n"
+            days = stats.trend(self.db, 30)
+            for day, (signups, postings) in days:
+                trend_message += f"{day}: 👥 {signups} / 📝 {postings}\n"
+            if not days:
+                trend_message += "Поки немає даних."
+
+            self.api.send_message(message.chat.id, trend_message, reply_markup=assets.NAVIGATION_KEYBOARD)
+
+        @self.router.command('rebuild_stats')
+        def rebuild_statistics(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            self.db.run(stats.rebuild)
+            self.api.send_message(message.chat.id, "✅ Статистику перераховано.")
 
-        @self.bot.message_handler(func=lambda message: 
-            message.text == "📝 Всі вакансії" and self.is_admin(message.chat.id))
+        @self.router.text("📝 Всі вакансії")
         def show_all_jobs(message):
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM jobs ORDER BY created_at DESC')
-            jobs = cursor.fetchall()
-            
-            if not jobs:
-                self.bot.send_message(
+            if not self.is_admin(message.chat.id):
+                return
+
+            self.show_jobs_page(message.chat.id)
+
+        @self.router.text("🧬 Дублікати")
+        def show_duplicates(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            self.show_duplicates(message.chat.id)
+
+        @self.router.text("📥 Імпорт вакансій")
+        def start_import(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            self.api.send_message(
+                message.chat.id,
+                "📥 Надішліть файл CSV або JSONL (можна стиснений .gz) з колонками:\n"
+                "title, description, location, telegram_username\n\n"
+                "Необов'язкові: employer_id, created_at, expires_at. "
+                "Місто можна вказати без емодзі, username повинен починатися з '@'.",
+                reply_markup=assets.NAVIGATION_KEYBOARD
+            )
+            self.user_states[message.chat.id] = "AWAITING_IMPORT"
+
+        @self.router.state("AWAITING_IMPORT")
+        def receive_import(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            document = message.document
+            if document is None or bulk.file_format(document.file_name) is None:
+                self.api.send_message(
                     message.chat.id,
-                    "📭 Наразі немає активних вакансій.",
-                    reply_markup=self.get_navigation_markup()
+                    "❌ Потрібен файл .csv або .jsonl (можна .csv.gz, .jsonl.gz). Спробуйте ще раз:",
+                    reply_markup=assets.NAVIGATION_KEYBOARD
                 )
                 return
-            
-            for job in jobs:
-                job_message = (
-                    f"🆔 ID: {job[0]}\n"
-                    f"📍 Місто: {job[4]}\n"
-                    f"📋 Заголовок: {job[2]}\n"
-                    f"📝 Опис: {job[3]}\n"
-                    f"👤 Контакт: {job[5]}\n"
-                    f"📅 Створено: {job[6]}"
-                )
-                
-                markup = types.InlineKeyboardMarkup()
-                delete_btn = types.InlineKeyboardButton(
-                    "🗑️ Видалити",
-                    callback_data=f"delete_job_{job[0]}"
-                )
-                edit_btn = types.InlineKeyboardButton(
-                    "✏️ Редагувати",
-                    callback_data=f"edit_job_{job[0]}"
-                )
-                markup.add(delete_btn, edit_btn)
-                
-                self.bot.send_message(
+            if (document.file_size or 0) > IMPORT_MAX_BYTES:
+                self.api.send_message(
                     message.chat.id,
-                    job_message,
-                    reply_markup=markup
+                    "❌ Telegram дозволяє ботам завантажувати файли до 20 МБ. "
+                    "Стисніть файл у .gz або скористайтеся командою на сервері:\n\n"
+                    "python bulk.py import jobs.csv",
+                    reply_markup=assets.NAVIGATION_KEYBOARD
                 )
+                return
+
+            self.api.send_message(message.chat.id, "⏳ Імпортую вакансії, це може зайняти кілька хвилин…")
+            self.user_states[message.chat.id] = "ADMIN_PANEL"
+            self.start_worker('job-import', self.import_jobs, message.chat.id, document)
+
+        @self.router.text("📤 Експорт вакансій")
+        def export_jobs(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            self.api.send_message(message.chat.id, "⏳ Готую файл з вакансіями…")
+            self.start_worker('job-export', self.export_jobs, message.chat.id)
+
+        @self.router.callback('dups_refresh')
+        def refresh_duplicates(call):
+            if not self.is_admin(call.message.chat.id):
+                return
 
-        @self.bot.callback_query_handler(func=lambda call: 
-            call.data.startswith('delete_job_') and self.is_admin(call.message.chat.id))
+            self.api.answer_callback_query(call.id)
+            self.show_duplicates(call.message.chat.id, call.message.message_id)
+
+        @self.router.callback('jobs_page', 'jobs_next', 'jobs_prev')
+        def navigate_jobs(call):
+            if not self.is_admin(call.message.chat.id):
+                return
+
+            action, key = call.data.rsplit('_', 1)
+            created_at, job_id = key.split('|')
+            self.api.answer_callback_query(call.id)
+            self.show_jobs_page(
+                call.message.chat.id,
+                call.message.message_id,
+                (created_at, int(job_id)),
+                action.split('_')[1]
+            )
+
+        @self.router.callback('delete_job')
         def delete_job(call):
+            if not self.is_admin(call.message.chat.id):
+                return
+
             job_id = call.data.split('_')[2]
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
-            self.conn.commit()
+            self.db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            self.listings.changed()
             
-            self.bot.answer_callback_query(
+            self.api.answer_callback_query(
                 call.id,
                 "✅ Вакансію успішно видалено!"
             )
-            self.bot.delete_message(
-                call.message.chat.id,
-                call.message.message_id
-            )
+            page_key = self.jobs_page_key(call.message)
+            if page_key:
+                # Deleted from the paginated browser: redraw the same page
+                self.show_jobs_page(call.message.chat.id, call.message.message_id, page_key)
+            elif self.is_duplicates_view(call.message):
+                self.show_duplicates(call.message.chat.id, call.message.message_id)
+            else:
+                self.api.delete_message(
+                    call.message.chat.id,
+                    call.message.message_id
+                )
 
-        @self.bot.callback_query_handler(func=lambda call: 
-            call.data.startswith('edit_job_') and self.is_admin(call.message.chat.id))
+        @self.router.callback('edit_job')
         def edit_job(call):
+            if not self.is_admin(call.message.chat.id):
+                return
+
             job_id = call.data.split('_')[2]
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
-            job = cursor.fetchone()
+            job = self.db.fetchone('SELECT * FROM jobs WHERE id = ?', (job_id,))
             
             if not job:
-                self.bot.answer_callback_query(
+                self.api.answer_callback_query(
                     call.id,
                     "❌ Вакансію не знайдено!"
                 )
@@ -501,28 +1066,126 @@ class JobTelegramBot:
                 'current_job': job
             }
             
-            markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            markup.add(
-                types.KeyboardButton("📋 Змінити заголовок"),
-                types.KeyboardButton("📝 Змінити опис")
-            )
-            markup.add(
-                types.KeyboardButton("📍 Змінити місто"),
-                types.KeyboardButton("👤 Змінити контакт")
-            )
-            markup.add(types.KeyboardButton("🔙 Назад"))
-            
-            self.bot.send_message(
+            self.api.send_message(
                 call.message.chat.id,
                 "✏️ Оберіть, що хочете змінити:",
-                reply_markup=markup
+                reply_markup=assets.EDIT_JOB_KEYBOARD
             )
             self.user_states[call.message.chat.id] = "EDITING_JOB"
 
+        @self.router.state("EDITING_JOB")
+        def choose_edit_field(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            if message.text not in EDIT_FIELDS:
+                self.api.send_message(
+                    message.chat.id,
+                    "✏️ Оберіть, що хочете змінити:",
+                    reply_markup=assets.EDIT_JOB_KEYBOARD
+                )
+                return
+
+            field, prompt = EDIT_FIELDS[message.text]
+            self.user_data[message.chat.id]['editing_field'] = field
+            self.api.send_message(
+                message.chat.id,
+                prompt,
+                reply_markup=assets.SEARCH_CITY_KEYBOARD if field == 'location' else assets.NAVIGATION_KEYBOARD
+            )
+            self.user_states[message.chat.id] = "AWAITING_EDIT_VALUE"
+
+        @self.router.state("AWAITING_EDIT_VALUE")
+        def get_edit_value(message):
+            if not self.is_admin(message.chat.id):
+                return
+
+            editing = self.user_data[message.chat.id]
+            field = editing['editing_field']
+            if field == 'location' and message.text not in CITIES:
+                self.api.send_message(
+                    message.chat.id,
+                    "❌ Оберіть місто зі списку:",
+                    reply_markup=assets.SEARCH_CITY_KEYBOARD
+                )
+                return
+            if field == 'telegram_username' and not message.text.startswith('@'):
+                self.api.send_message(
+                    message.chat.id,
+                    "❌ Username повинен починатися з '@'. Спробуйте ще раз:",
+                    reply_markup=assets.NAVIGATION_KEYBOARD
+                )
+                return
+
+            if not self.update_job(int(editing['editing_job_id']), field, message.text):
+                self.api.send_message(message.chat.id, "❌ Вакансію не знайдено!")
+                self.show_admin_panel(message.chat.id)
+                return
+
+            self.api.send_message(
+                message.chat.id,
+                "✅ Вакансію оновлено! Можна змінити ще щось:",
+                reply_markup=assets.EDIT_JOB_KEYBOARD
+            )
+            self.user_states[message.chat.id] = "EDITING_JOB"
+
+    def process_update(self, update):
+        self.bot.process_new_updates([types.Update.de_json(update)])
+
     def run(self):
-        self.bot.polling(none_stop=True)
+        try:
+            self.bot.polling(none_stop=True)
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.indexer.close()
+        self.archiver.close()
+        self.fanout.close()
+        self.sessions.close()
+        self.outbox.close(timeout=10)
+
+    def run_webhook(self, url, port=8443, secret_token=None, workers=8):
+        # Updates are already ordered per chat by the worker pool,
+        # telebot must not hand them to its own thread pool
+        self.bot.threaded = False
+        server = WebhookServer(self.process_update, port=port, secret_token=secret_token, workers=workers)
+        self.bot.remove_webhook()
+        self.bot.set_webhook(url=url, secret_token=secret_token)
+        try:
+            server.serve_forever()
+        finally:
+            server.shutdown()
+            self.shutdown()
 
 # Initialize and run bot
 if __name__ == "__main__":
-    bot = JobTelegramBot('7424832807:AAHmIYekpmlGQkFYc7Hly5KdXhKw_2MFtJU')
-    bot.run()
\ No newline at end of file
+    token = os.environ.get('BOT_TOKEN', '7424832807:AAHmIYekpmlGQkFYc7Hly5KdXhKw_2MFtJU')
+    webhook_url = os.environ.get('WEBHOOK_URL')
+    port = int(os.environ.get('PORT', 8443))
+    secret_token = os.environ.get('WEBHOOK_SECRET')
+    workers = int(os.environ.get('WORKERS', 8))
+    job_ttl_days = int(os.environ.get('JOB_TTL_DAYS', lifecycle.DEFAULT_TTL_DAYS))
+
+    if os.environ.get('CLUSTER_WORKERS'):
+        import functools
+        from cluster import Supervisor, default_bot
+        supervisor = Supervisor(
+            token,
+            workers=int(os.environ['CLUSTER_WORKERS']),
+            factory=functools.partial(default_bot, job_ttl_days=job_ttl_days)
+        )
+        if webhook_url:
+            supervisor.run_webhook(webhook_url, port=port, secret_token=secret_token, threads=workers)
+        else:
+            supervisor.run_polling()
+    else:
+        bot = JobTelegramBot(token, job_ttl_days=job_ttl_days)
+        if os.environ.get('METRICS_PORT'):
+            metrics = Metrics(slow_ms=float(os.environ['SLOW_MS']) if os.environ.get('SLOW_MS') else None)
+            bot.setup_metrics(metrics)
+            MetricsServer(metrics, port=int(os.environ['METRICS_PORT'])).start()
+        if webhook_url:
+            bot.run_webhook(webhook_url, port=port, secret_token=secret_token, workers=workers)
+        else:
+            bot.run()
@@ -0,0 +1,185 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import lifecycle
+from assets import CITIES
+from storage import Storage
+
+# Bulk import and export of vacancies as CSV or JSON lines, optionally
+# gzipped. Both sides work a row at a time: an upload is parsed as it is
+# read and inserted CHUNK_SIZE rows per executemany, every chunk its own
+# write, so the bot's own writes wait for one chunk at most and memory does
+# not grow with the file. Imported vacancies are not sent to subscribers and are
+# signed for duplicate detection by `python dedup.py build`.
+
+COLUMNS = ('id', 'employer_id', 'title', 'description', 'location', 'telegram_username',
+           'created_at', 'expires_at')
+REQUIRED = ('title', 'description', 'location', 'telegram_username')
+CHUNK_SIZE = 500
+MAX_ERRORS = 10
+
+# "Київ" and "київ" are accepted for "🏙️ Київ"
+_CITY_NAMES = {}
+for _city in CITIES:
+    _CITY_NAMES[_city.lower()] = _city
+    _CITY_NAMES[_city.split(' ', 1)[1].lower()] = _city
+
+# The expiry and the place (the city centre) are set here rather than by
+# the jobs_default_expiry and geo_jobs_default_place triggers, which would
+# update every imported row a second time
+INSERT = '''
+    INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at, expires_at,
+                      place_id)
+    VALUES (?1, ?2, ?3, ?4, ?5, COALESCE(?6, CURRENT_TIMESTAMP), COALESCE(?7, datetime(COALESCE(?6, 'now'), ?8)),
+            (SELECT place_id FROM city_places WHERE location = ?4))
+'''
+
+
+def file_format(name):
+    # ('csv' or 'jsonl', gzipped) for a file name, None for anything else
+    name = (name or '').lower()
+    gzipped = name.endswith('.gz')
+    if gzipped:
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv', gzipped
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl', gzipped
+    return None
+
+
+def records(stream, kind, gzipped=False):
+    # (line number, dict or None when the line is not a record) for every
+    # record of a binary stream
+    if gzipped:
+        stream = gzip.GzipFile(fileobj=stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if kind == 'jsonl':
+        for number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield number, record if isinstance(record, dict) else None
+        return
+    # Spreadsheets save CSV with the separator of the locale
+    header = text.readline()
+    delimiter = max(',;\t', key=header.count)
+    reader = csv.DictReader(itertools.chain([header], text), delimiter=delimiter)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _timestamp(value):
+    # The format SQLite's CURRENT_TIMESTAMP writes, in UTC
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def validate(record):
+    # (row for INSERT, None) or (None, reason)
+    if record is None:
+        return None, "не вдалося розібрати рядок"
+    values = {}
+    for name in COLUMNS:
+        value = record.get(name)
+        values[name] = '' if value is None else str(value).strip()
+    missing = [name for name in REQUIRED if not values[name]]
+    if missing:
+        return None, f"порожнє поле {', '.join(missing)}"
+    location = _CITY_NAMES.get(values['location'].lower())
+    if location is None:
+        return None, f"невідоме місто «{values['location']}»"
+    # The same rule as the posting flow
+    if not values['telegram_username'].startswith('@'):
+        return None, "username повинен починатися з '@'"
+    employer_id = values['employer_id']
+    if employer_id and not employer_id.lstrip('-').isdigit():
+        return None, "employer_id повинен бути числом"
+    try:
+        created_at = _timestamp(values['created_at']) if values['created_at'] else None
+        expires_at = _timestamp(values['expires_at']) if values['expires_at'] else None
+    except ValueError:
+        return None, "неправильна дата"
+    return (
+        int(employer_id) if employer_id else None,
+        values['title'],
+        values['description'],
+        location,
+        values['telegram_username'],
+        created_at,
+        expires_at
+    ), None
+
+
+def import_jobs(db, stream, kind, gzipped=False, ttl_days=lifecycle.DEFAULT_TTL_DAYS, chunk_size=CHUNK_SIZE):
+    # Returns (imported, rejected, [(line, reason)] of the first rejected rows)
+    expiry = f'+{ttl_days} days'
+    imported = rejected = 0
+    errors = []
+    chunk = []
+    for number, record in records(stream, kind, gzipped):
+        row, error = validate(record)
+        if error is not None:
+            rejected += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append((number, error))
+            continue
+        chunk.append(row + (expiry,))
+        if len(chunk) >= chunk_size:
+            db.executemany(INSERT, chunk)
+            imported += len(chunk)
+            chunk = []
+    if chunk:
+        db.executemany(INSERT, chunk)
+        imported += len(chunk)
+    return imported, rejected, errors
+
+
+def export_jobs(db, out, kind='csv'):
+    # Writes every vacancy to the text stream out, oldest id first, and
+    # returns how many were written. The file can be imported again.
+    rows = db.iterate(f"SELECT {', '.join(COLUMNS)} FROM jobs ORDER BY id")
+    count = 0
+    if kind == 'jsonl':
+        for row in rows:
+            out.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + '\n')
+            count += 1
+        return count
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    # python bulk.py import|export FILE [job_bot.db]
+    if len(sys.argv) < 3 or sys.argv[1] not in ('import', 'export') or file_format(sys.argv[2]) is None:
+        sys.exit("usage: python bulk.py import|export FILE.csv|FILE.jsonl[.gz] [database]")
+    command, path = sys.argv[1], sys.argv[2]
+    kind, gzipped = file_format(path)
+    storage = Storage(sys.argv[3] if len(sys.argv) > 3 else 'job_bot.db')
+    if command == 'import':
+        with open(path, 'rb') as f:
+            ttl_days = int(os.environ.get('JOB_TTL_DAYS', lifecycle.DEFAULT_TTL_DAYS))
+            imported, rejected, errors = import_jobs(storage, f, kind, gzipped, ttl_days)
+        for line, reason in errors:
+            print(f"line {line}: {reason}")
+        print(f"Imported {imported} vacancies, rejected {rejected}")
+    else:
+        opener = gzip.open if gzipped else open
+        with opener(path, 'wt', encoding='utf-8', newline='') as f:
+            print(f"Exported {export_jobs(storage, f, kind)} vacancies")
+    storage.close()
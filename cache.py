@@ -0,0 +1,233 @@
+import bisect
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from storage import execute_script
+
+# Rendered vacancy cards and city listings kept in memory, so browsing a
+# popular city neither queries nor formats a vacancy another user has
+# already seen. An LRU bounded to max_bytes holds two kinds of entries: the
+# card of a vacancy, as rendered by the bot, and the (created_at, id,
+# expires_at) keys of the first CITY_WINDOW live vacancies of a city in
+# browsing order. Past the window a city is browsed with a query as before.
+#
+# Triggers on jobs log every inserted, updated and deleted vacancy to
+# job_changes, whoever made the change: a handler, the archiver, a bulk
+# import or another worker process. The cache reads the log from where it
+# stopped at most every sync_interval seconds and drops exactly the cards of
+# the changed vacancies and the listings of their cities. The bot calls
+# changed() after its own writes so their effect is visible at once.
+# Expired vacancies are skipped by their expires_at until the archiver
+# removes them.
+
+CACHE_BYTES = 32 * 1024 * 1024
+CITY_WINDOW = 1000
+SYNC_INTERVAL = 1.0
+# The log keeps this many entries; a cache further behind starts over
+CHANGES_KEPT = 10000
+
+SCHEMA = f'''
+    CREATE TABLE IF NOT EXISTS job_changes (
+        seq INTEGER PRIMARY KEY,
+        job_id INTEGER NOT NULL,
+        location TEXT
+    );
+
+    CREATE TRIGGER IF NOT EXISTS job_changes_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO job_changes (job_id, location) VALUES (NEW.id, NEW.location);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS job_changes_update AFTER UPDATE ON jobs BEGIN
+        INSERT INTO job_changes (job_id, location) VALUES (NEW.id, NEW.location);
+        INSERT INTO job_changes (job_id, location)
+            SELECT OLD.id, OLD.location WHERE OLD.location IS NOT NEW.location;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS job_changes_delete AFTER DELETE ON jobs BEGIN
+        INSERT INTO job_changes (job_id, location) VALUES (OLD.id, OLD.location);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS job_changes_trim AFTER INSERT ON job_changes BEGIN
+        DELETE FROM job_changes WHERE seq <= NEW.seq - {CHANGES_KEPT};
+    END;
+'''
+
+# Per entry on top of its strings: the LRU slot, key and tuples
+_ENTRY_BYTES = 200
+_KEY_BYTES = 120
+
+
+def install(conn):
+    execute_script(conn, SCHEMA)
+
+
+def _now():
+    # The format of datetime('now'), which expires_at is compared with
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+
+class ListingCache:
+    # render(job row) returns the card stored for the vacancy, e.g. its text
+    # and contact; next_job() returns ((created_at, id), card) of the vacancy
+    # after the cursor `after` in a city, or None at the end.
+
+    def __init__(self, db, render, max_bytes=CACHE_BYTES, window=CITY_WINDOW, sync_interval=SYNC_INTERVAL):
+        self.db = db
+        self.render = render
+        self.max_bytes = max_bytes
+        self.window = window
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        # ('card', id) or ('city', location) -> (value, size)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        # Bumped by every invalidation; a value read from the database
+        # before a bump may predate the change and is not stored
+        self.generation = 0
+        self.seq = db.fetchone('SELECT COALESCE(MAX(seq), 0) FROM job_changes')[0]
+        self.next_sync = time.monotonic() + sync_interval
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def changed(self):
+        # Makes the next lookup read the change log
+        self.next_sync = 0
+
+    def sync(self):
+        if time.monotonic() < self.next_sync:
+            return
+        with self.sync_lock:
+            if time.monotonic() < self.next_sync:
+                return
+            self.next_sync = time.monotonic() + self.sync_interval
+            rows = self.db.fetchall('''
+                SELECT seq, job_id, location FROM job_changes WHERE seq > ? ORDER BY seq LIMIT ?
+            ''', (self.seq, CHANGES_KEPT))
+            if not rows:
+                return
+            with self.lock:
+                self.generation += 1
+                if rows[0][0] != self.seq + 1:
+                    # Further behind than the log goes
+                    self.invalidations += len(self.entries)
+                    self.entries.clear()
+                    self.bytes = 0
+                else:
+                    for _, job_id, location in rows:
+                        self.invalidations += self._drop(('card', job_id)) + self._drop(('city', location))
+                self.seq = rows[-1][0]
+            if len(rows) == CHANGES_KEPT:
+                # More to read
+                self.next_sync = 0
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[1]
+        return True
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, key, value, size, generation):
+        with self.lock:
+            if generation != self.generation or size > self.max_bytes:
+                return
+            self._drop(key)
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def city(self, location):
+        # (keys, complete): complete when the city has no live vacancy past
+        # the window
+        cached = self._get(('city', location))
+        if cached is not None:
+            return cached
+        generation = self.generation
+        keys = self.db.fetchall('''
+            SELECT created_at, id, expires_at FROM jobs WHERE location = ? AND expires_at > datetime('now')
+            ORDER BY created_at, id LIMIT ?
+        ''', (location, self.window + 1))
+        value = (keys[:self.window], len(keys) <= self.window)
+        size = _ENTRY_BYTES + sum(
+            _KEY_BYTES + sys.getsizeof(created_at) + sys.getsizeof(expires_at)
+            for created_at, _, expires_at in value[0]
+        )
+        self._put(('city', location), value, size, generation)
+        return value
+
+    def card(self, job_id, job=None, generation=None):
+        # job is the row when the caller has read it already, at generation
+        cached = self._get(('card', job_id))
+        if cached is not None:
+            return cached
+        if job is None:
+            generation = self.generation
+            job = self.db.fetchone('SELECT * FROM jobs WHERE id = ?', (job_id,))
+            if job is None:
+                return None
+        card = self.render(job)
+        size = _ENTRY_BYTES + sum(sys.getsizeof(part) for part in card)
+        self._put(('card', job_id), card, size, generation)
+        return card
+
+    def next_job(self, location, after=None):
+        self.sync()
+        keys, complete = self.city(location)
+        index = 0 if after is None else bisect.bisect_left(keys, (after[0], after[1] + 1))
+        now = _now()
+        while index < len(keys):
+            created_at, job_id, expires_at = keys[index]
+            index += 1
+            if expires_at <= now:
+                continue
+            card = self.card(job_id)
+            # None: deleted since, the log has not been read yet
+            if card is not None:
+                return (created_at, job_id), card
+        if complete:
+            return None
+        if keys and (after is None or tuple(after) < keys[-1][:2]):
+            after = keys[-1][:2]
+        generation = self.generation
+        job = self._fetch_after(location, after)
+        if job is None:
+            return None
+        return (job[6], job[0]), self.card(job[0], job, generation)
+
+    def _fetch_after(self, location, after):
+        if after is None:
+            return self.db.fetchone('''
+                SELECT * FROM jobs WHERE location = ? AND expires_at > datetime('now')
+                ORDER BY created_at, id LIMIT 1
+            ''', (location,))
+        return self.db.fetchone('''
+            SELECT * FROM jobs WHERE location = ? AND (created_at, id) > (?, ?)
+                AND expires_at > datetime('now')
+            ORDER BY created_at, id LIMIT 1
+        ''', (location, after[0], after[1]))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,274 @@
+import itertools
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+import telebot
+
+from webhook import ChatOrderedPool, WebhookServer, update_chat_id
+
+logger = logging.getLogger(__name__)
+
+# Supervisor mode: one process receives every update (long polling or
+# webhook) and hands it to a worker process picked by chat id, so each
+# conversation is handled in order by the process holding its session.
+#
+# Chats map to SHARDS virtual shards and shards to worker slots. Workers
+# acknowledge every update they finish; a worker that dies is restarted in
+# its slot and is sent its unacknowledged updates again. A slot that keeps
+# crashing is retired and its shards move to the other workers, which load
+# those sessions from SQLite. All workers share job_bot.db through WAL,
+# each with its own writer thread; busy_timeout serializes their commits.
+#
+# One worker at a time runs maintenance: the archiver, the fan-out engine
+# and the deferred index build. The supervisor tells it so after every
+# spawn of its slot, and hands the role to a live worker when the slot is
+# retired.
+
+SHARDS = 256
+
+# Sent to a worker in place of an update: start the maintenance loops
+MAINTENANCE = 'maintenance'
+
+
+def default_bot(token, index, workers, **options):
+    from bot import JobTelegramBot
+    # Telegram's 30 messages/s per bot are split between the workers; the
+    # supervisor picks the one that runs maintenance
+    return JobTelegramBot(token, send_rate=30 / workers, maintenance=False, **options)
+
+
+def worker_main(factory, token, index, workers, conn, threads):
+    # Ctrl-C reaches the whole process group; the supervisor stops workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    bot = factory(token, index, workers)
+    bot.bot.threaded = False
+    send_lock = threading.Lock()
+    # None tells the supervisor this worker is up
+    conn.send(None)
+
+    def handle(item):
+        seq, update = item
+        try:
+            bot.process_update(update)
+        finally:
+            with send_lock:
+                conn.send(seq)
+
+    pool = ChatOrderedPool(handle, threads)
+    try:
+        while True:
+            item = conn.recv()
+            if item is None:
+                break
+            if item == MAINTENANCE:
+                bot.start_maintenance()
+                continue
+            pool.submit(update_chat_id(item[1]), item)
+    finally:
+        pool.close()
+        bot.shutdown()
+
+
+class _Slot:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        # send_lock orders sends and worker restarts; pending_lock only
+        # guards the dict, so acknowledgements never wait for a send
+        self.send_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.pending = {}  # seq -> update, in the order sent
+        self.restarts = []
+        self.retired = False
+        self.ready = threading.Event()
+
+
+class Supervisor:
+    def __init__(self, token, workers=4, factory=default_bot, threads=8, max_restarts=3, restart_window=60.0):
+        # factory(token, index, workers) builds the bot inside a worker; it
+        # must be picklable (a module-level function or a partial of one)
+        self.token = token
+        self.factory = factory
+        self.threads = threads
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.context = multiprocessing.get_context('spawn')
+        self.slots = [_Slot(n) for n in range(workers)]
+        self.shard_map = [shard % workers for shard in range(SHARDS)]
+        # Slot of the worker that runs maintenance
+        self.maintenance = 0
+        self.map_lock = threading.Lock()
+        self.seq = itertools.count()
+        self.stopping = threading.Event()
+        self.monitor = None
+
+    def start(self, timeout=60):
+        # Returns once every worker has built its bot, or after timeout
+        if self.monitor is not None:
+            return
+        for slot in self.slots:
+            with slot.send_lock:
+                self._spawn(slot)
+        deadline = time.monotonic() + timeout
+        for slot in self.slots:
+            slot.ready.wait(max(0, deadline - time.monotonic()))
+        self.monitor = threading.Thread(target=self._monitor_loop, name='cluster-monitor', daemon=True)
+        self.monitor.start()
+
+    def _spawn(self, slot):
+        # Called with slot.send_lock held
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=worker_main,
+            args=(self.factory, self.token, slot.index, len(self.slots), child_conn, self.threads),
+            name=f'bot-worker-{slot.index}',
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        slot.conn, slot.process = conn, process
+        slot.ready.clear()
+        threading.Thread(target=self._ack_loop, args=(slot, conn), name=f'cluster-acks-{slot.index}',
+                         daemon=True).start()
+        if slot.index == self.maintenance:
+            self._send(slot, MAINTENANCE)
+        # Whatever the previous process had not finished goes first
+        with slot.pending_lock:
+            redeliver = list(slot.pending.items())
+        for item in redeliver:
+            self._send(slot, item)
+
+    def _send(self, slot, item):
+        try:
+            slot.conn.send(item)
+        except OSError:
+            # The worker is gone; the update stays pending for its successor
+            pass
+
+    def _ack_loop(self, slot, conn):
+        while True:
+            try:
+                seq = conn.recv()
+            except (EOFError, OSError):
+                return
+            if seq is None:
+                slot.ready.set()
+                continue
+            with slot.pending_lock:
+                slot.pending.pop(seq, None)
+
+    def submit(self, update):
+        shard = update_chat_id(update) % SHARDS
+        item = (next(self.seq), update)
+        while True:
+            with self.map_lock:
+                slot = self.slots[self.shard_map[shard]]
+            with slot.send_lock:
+                if slot.retired:
+                    # The shard moved while we were waiting, look it up again
+                    continue
+                with slot.pending_lock:
+                    slot.pending[item[0]] = update
+                self._send(slot, item)
+                return
+
+    def _monitor_loop(self):
+        while not self.stopping.wait(0.5):
+            for slot in self.slots:
+                if slot.retired or slot.process.is_alive() or self.stopping.is_set():
+                    continue
+                logger.error("Worker %d exited with code %s", slot.index, slot.process.exitcode)
+                now = time.monotonic()
+                slot.restarts = [t for t in slot.restarts if now - t < self.restart_window]
+                if len(slot.restarts) >= self.max_restarts and self._retire(slot):
+                    continue
+                slot.restarts.append(now)
+                with slot.send_lock:
+                    slot.conn.close()
+                    self._spawn(slot)
+
+    def _retire(self, slot):
+        live = [other.index for other in self.slots if not other.retired and other is not slot]
+        if not live:
+            return False
+        logger.error("Worker %d keeps crashing, moving its shards to workers %s", slot.index, live)
+        with slot.send_lock:
+            slot.retired = True
+            slot.conn.close()
+            with slot.pending_lock:
+                leftovers = list(slot.pending.values())
+                slot.pending.clear()
+            # The map stays locked until the leftovers are handed over, so a
+            # chat's new updates cannot overtake its old ones
+            with self.map_lock:
+                moved = [shard for shard, owner in enumerate(self.shard_map) if owner == slot.index]
+                for n, shard in enumerate(moved):
+                    self.shard_map[shard] = live[n % len(live)]
+                for update in leftovers:
+                    target = self.slots[self.shard_map[update_chat_id(update) % SHARDS]]
+                    item = (next(self.seq), update)
+                    with target.send_lock:
+                        with target.pending_lock:
+                            target.pending[item[0]] = update
+                        self._send(target, item)
+        if self.maintenance == slot.index:
+            successor = self.slots[live[0]]
+            logger.error("Worker %d takes over maintenance from worker %d", successor.index, slot.index)
+            with successor.send_lock:
+                self.maintenance = successor.index
+                self._send(successor, MAINTENANCE)
+        return True
+
+    def shutdown(self, timeout=30):
+        self.stopping.set()
+        if self.monitor is not None:
+            self.monitor.join()
+        for slot in self.slots:
+            if slot.retired or slot.process is None:
+                continue
+            with slot.send_lock:
+                self._send(slot, None)
+        deadline = time.monotonic() + timeout
+        for slot in self.slots:
+            if slot.process is None:
+                continue
+            slot.process.join(max(0, deadline - time.monotonic()))
+            if slot.process.is_alive():
+                slot.process.terminate()
+                slot.process.join()
+
+    def run_polling(self, long_polling_timeout=20):
+        self.start()
+        offset = None
+        try:
+            while True:
+                try:
+                    updates = telebot.apihelper.get_updates(
+                        self.token, offset, 100, long_polling_timeout=long_polling_timeout)
+                except Exception:
+                    logger.exception("getUpdates failed")
+                    time.sleep(1)
+                    continue
+                for update in updates:
+                    self.submit(update)
+                    offset = update['update_id'] + 1
+        finally:
+            self.shutdown()
+
+    def run_webhook(self, url, port=8443, secret_token=None, threads=8):
+        # The webhook pool keeps each chat on one thread, so submit() sees
+        # a chat's updates in order
+        server = WebhookServer(self.submit, port=port, secret_token=secret_token, workers=threads)
+        self.start()
+        api = telebot.TeleBot(self.token, threaded=False)
+        api.remove_webhook()
+        api.set_webhook(url=url, secret_token=secret_token)
+        try:
+            server.serve_forever()
+        finally:
+            server.shutdown()
+            self.shutdown()
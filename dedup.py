@@ -0,0 +1,211 @@
+import functools
+import random
+import re
+import sys
+import zlib
+from array import array
+
+from storage import Storage, execute_script
+
+# Near-duplicate vacancies. Every vacancy gets a MinHash signature of the
+# word pairs of its normalized title and description, headings and filler
+# words left out; the signature is cut
+# into BANDS bands of ROWS values and each band, salted with the city, is a
+# key in job_lsh. Vacancies sharing a key are candidates, and a candidate
+# whose signatures agree in at least SIMILARITY of the positions is a near
+# duplicate. With 8 bands of 4 a pair at Jaccard 0.8 becomes a candidate
+# 98% of the time, at 0.6 67% and at 0.3 6%.
+#
+# job_clusters groups near duplicates from different employers for the
+# admin; a repost by the same employer is merged into the original.
+
+PERMUTATIONS = 32
+BANDS = 8
+ROWS = PERMUTATIONS // BANDS
+SIMILARITY = 0.6
+
+# The headings the posting prompt suggests and other words every vacancy
+# has; left in, they would put most vacancies of a city in the same buckets
+STOPWORDS = frozenset('''
+    обов язки вимоги умови роботи робота зарплата графік від до грн і й та в у на з із за по для не
+'''.split())
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_COEFFICIENTS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(PERMUTATIONS)]
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS job_signatures (
+        job_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS job_lsh (
+        key INTEGER,
+        job_id INTEGER,
+        PRIMARY KEY (key, job_id)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_job_lsh_job ON job_lsh (job_id);
+
+    CREATE TABLE IF NOT EXISTS job_clusters (
+        job_id INTEGER PRIMARY KEY,
+        cluster_id INTEGER NOT NULL,
+        similarity REAL
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_job_clusters_cluster ON job_clusters (cluster_id);
+
+    CREATE TRIGGER IF NOT EXISTS dedup_jobs_delete AFTER DELETE ON jobs BEGIN
+        DELETE FROM job_signatures WHERE job_id = OLD.id;
+        DELETE FROM job_lsh WHERE job_id = OLD.id;
+        DELETE FROM job_clusters WHERE job_id = OLD.id;
+    END;
+
+    -- An edited vacancy drops out of the index until it is signed again
+    CREATE TRIGGER IF NOT EXISTS dedup_jobs_update AFTER UPDATE OF title, description, location ON jobs BEGIN
+        DELETE FROM job_signatures WHERE job_id = OLD.id;
+        DELETE FROM job_lsh WHERE job_id = OLD.id;
+    END;
+'''
+
+
+def install(conn):
+    execute_script(conn, SCHEMA)
+
+
+def shingles(title, description):
+    words = [word for word in re.findall(r'\w+', f'{title} {description}'.lower()) if word not in STOPWORDS]
+    if len(words) < 2:
+        return {zlib.crc32(word.encode()) for word in words}
+    return {zlib.crc32(f'{a} {b}'.encode()) for a, b in zip(words, words[1:])}
+
+
+@functools.lru_cache(maxsize=16384)
+def _permuted(shingle):
+    # The shingle under every permutation. Vacancies share most of their
+    # word pairs, so the cache answers most shingles (about 5 MB when full).
+    return array('Q', [(a * shingle + b) % _PRIME for a, b in _COEFFICIENTS])
+
+
+def signature(title, description):
+    hashes = shingles(title, description) or {0}
+    return array('Q', map(min, zip(*map(_permuted, hashes))))
+
+
+def band_keys(location, values):
+    keys = []
+    for band in range(BANDS):
+        chunk = values[band * ROWS:(band + 1) * ROWS]
+        salt = zlib.crc32(f'{band} {location}'.encode())
+        # Signed 32-bit range, stored as a plain INTEGER
+        keys.append(zlib.crc32(chunk.tobytes(), salt) - (1 << 31))
+    return keys
+
+
+def similarity(first, second):
+    return sum(1 for a, b in zip(first, second) if a == b) / PERMUTATIONS
+
+
+def matches(conn, location, values, exclude=None):
+    # [(similarity, job_id, employer_id)] of the indexed vacancies in the
+    # same city that look like `values`, most similar first
+    keys = band_keys(location, values)
+    rows = conn.execute(f'''
+        SELECT DISTINCT jobs.id, jobs.employer_id, job_signatures.signature
+        FROM job_lsh
+        JOIN job_signatures ON job_signatures.job_id = job_lsh.job_id
+        JOIN jobs ON jobs.id = job_lsh.job_id
+        WHERE job_lsh.key IN ({','.join('?' * len(keys))})
+    ''', keys).fetchall()
+    result = []
+    for job_id, employer_id, blob in rows:
+        if job_id == exclude:
+            continue
+        score = similarity(values, array('Q', blob))
+        if score >= SIMILARITY:
+            result.append((score, job_id, employer_id))
+    result.sort(reverse=True)
+    return result
+
+
+def index(conn, job_id, location, values, found):
+    # Stores the signature of job_id and puts it in the cluster of its best
+    # match from `found` (as returned by matches)
+    conn.execute('INSERT OR REPLACE INTO job_signatures (job_id, signature) VALUES (?, ?)',
+                 (job_id, values.tobytes()))
+    conn.executemany('INSERT OR IGNORE INTO job_lsh (key, job_id) VALUES (?, ?)',
+                     [(key, job_id) for key in band_keys(location, values)])
+    if not found:
+        return
+    score, other, _ = found[0]
+    row = conn.execute('SELECT cluster_id FROM job_clusters WHERE job_id = ?', (other,)).fetchone()
+    cluster_id = other if row is None else row[0]
+    if row is None:
+        conn.execute('INSERT INTO job_clusters (job_id, cluster_id) VALUES (?, ?)', (other, cluster_id))
+    conn.execute('INSERT OR REPLACE INTO job_clusters (job_id, cluster_id, similarity) VALUES (?, ?, ?)',
+                 (job_id, cluster_id, score))
+
+
+def reindex(conn, job_id, location, values):
+    # After an edit of job_id: its cluster is looked up again among the
+    # vacancies of `location`, which may be another city now
+    conn.execute('DELETE FROM job_lsh WHERE job_id = ?', (job_id,))
+    conn.execute('DELETE FROM job_clusters WHERE job_id = ?', (job_id,))
+    index(conn, job_id, location, values, matches(conn, location, values, exclude=job_id))
+
+
+def clusters(db, limit=10):
+    # [(cluster_id, [(job_id, title, location, employer_id, similarity)])],
+    # biggest clusters first
+    heads = db.fetchall('''
+        SELECT cluster_id FROM job_clusters
+        GROUP BY cluster_id HAVING COUNT(*) > 1
+        ORDER BY COUNT(*) DESC, cluster_id DESC LIMIT ?
+    ''', (limit,))
+    result = []
+    for (cluster_id,) in heads:
+        members = db.fetchall('''
+            SELECT jobs.id, jobs.title, jobs.location, jobs.employer_id, job_clusters.similarity
+            FROM job_clusters JOIN jobs ON jobs.id = job_clusters.job_id
+            WHERE job_clusters.cluster_id = ?
+            ORDER BY jobs.id
+        ''', (cluster_id,))
+        result.append((cluster_id, members))
+    return result
+
+
+def build(db, batch_size=1000):
+    # Signs every vacancy that has no signature yet, oldest first, a batch
+    # per write so it can run next to the bot. Returns the number signed.
+    signed = 0
+    after = 0
+    while True:
+        jobs = db.fetchall('''
+            SELECT jobs.id, jobs.location, jobs.title, jobs.description FROM jobs
+            LEFT JOIN job_signatures ON job_signatures.job_id = jobs.id
+            WHERE jobs.id > ? AND job_signatures.job_id IS NULL
+            ORDER BY jobs.id LIMIT ?
+        ''', (after, batch_size))
+        if not jobs:
+            return signed
+        batch = [(job_id, location, signature(title or '', description or ''))
+                 for job_id, location, title, description in jobs]
+
+        def write(conn):
+            for job_id, location, values in batch:
+                index(conn, job_id, location, values, matches(conn, location, values, exclude=job_id))
+
+        db.run(write)
+        signed += len(batch)
+        after = jobs[-1][0]
+
+
+if __name__ == '__main__':
+    # python dedup.py build [job_bot.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        sys.exit("usage: python dedup.py build [database]")
+    storage = Storage(sys.argv[2] if len(sys.argv) > 2 else 'job_bot.db')
+    storage.run(install)
+    print(f"Signed {build(storage)} vacancies")
+    storage.close()
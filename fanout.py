@@ -0,0 +1,200 @@
+import json
+import logging
+import threading
+from concurrent.futures import wait
+
+from telebot import types
+
+from assets import CITIES
+from outbound import BULK
+from storage import execute_script
+
+logger = logging.getLogger(__name__)
+
+# City subscriptions and the fan-out of new vacancies to subscribers.
+# Posting a vacancy adds a fanout_jobs row in the same transaction; the
+# FanoutEngine walks the city's subscribers in chat_id order, a batch at a
+# time, as BULK sends behind the interactive replies, and stores its cursor
+# after every batch. Pending fan-outs take turns, a batch each, so a city
+# with many subscribers does not hold back the others. After a crash only
+# the batch that was in flight can be sent twice.
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        location TEXT,
+        chat_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (location, chat_id)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_subscriptions_chat ON subscriptions (chat_id);
+
+    CREATE TABLE IF NOT EXISTS fanout_jobs (
+        id INTEGER PRIMARY KEY,
+        job_id INTEGER NOT NULL,
+        location TEXT NOT NULL,
+        cursor INTEGER,
+        sent INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+
+def install(conn):
+    execute_script(conn, SCHEMA)
+
+
+def enqueue(conn, job_id, location):
+    # Runs on the writer connection, in the transaction that saves the job
+    conn.execute('INSERT INTO fanout_jobs (job_id, location) VALUES (?, ?)', (job_id, location))
+
+
+def subscriptions(db, chat_id):
+    return {row[0] for row in db.fetchall('SELECT location FROM subscriptions WHERE chat_id = ?', (chat_id,))}
+
+
+def toggle(db, chat_id, location):
+    # True when the chat is now subscribed to location
+    def write(conn):
+        deleted = conn.execute(
+            'DELETE FROM subscriptions WHERE location = ? AND chat_id = ?', (location, chat_id)
+        ).rowcount
+        if not deleted:
+            conn.execute('INSERT INTO subscriptions (location, chat_id) VALUES (?, ?)', (location, chat_id))
+        return not deleted
+
+    return db.run(write)
+
+
+def unsubscribe(db, chat_id, location=None, wait=True):
+    if location is None:
+        return db.execute('DELETE FROM subscriptions WHERE chat_id = ?', (chat_id,), wait=wait)
+    return db.execute('DELETE FROM subscriptions WHERE location = ? AND chat_id = ?', (location, chat_id), wait=wait)
+
+
+def subscriptions_markup(subscribed):
+    markup = types.InlineKeyboardMarkup()
+    for index, city in enumerate(CITIES):
+        mark = "✅" if city in subscribed else "➕"
+        markup.add(types.InlineKeyboardButton(f"{mark} {city}", callback_data=f"sub_toggle_{index}"))
+    return markup
+
+
+def notification(job):
+    text = (
+        f"🔔 Нова вакансія у місті {job[4]}:\n\n"
+        f"🔹 Назва: {job[2]}\n\n"
+        f"📝 Опис:\n{job[3]}\n\n"
+        f"👤 Контакт: {job[5]}"
+    )
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton(
+        "💬 Написати роботодавцю", url=f"https://t.me/{job[5].replace('@', '')}"
+    ))
+    if job[4] in CITIES:
+        markup.add(types.InlineKeyboardButton(
+            f"🔕 Відписатися від {job[4]}", callback_data=f"sub_off_{CITIES.index(job[4])}"
+        ))
+    # Serialized once for every subscriber, like the keyboards in assets.py
+    return text, json.dumps(json.loads(markup.to_json()), ensure_ascii=False, separators=(',', ':'))
+
+
+def blocked(error):
+    # 403: the user blocked the bot or deleted the chat
+    return getattr(error, 'error_code', None) == 403
+
+
+class FanoutEngine:
+    def __init__(self, db, api, batch_size=100, poll_interval=1.0):
+        self.db = db
+        self.api = api
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        # fanout_jobs.id of the batch sent last
+        self.last_task = 0
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='fanout', daemon=True)
+        self.thread.start()
+
+    def notify(self):
+        # A vacancy was posted; other processes are picked up by polling
+        self.wakeup.set()
+
+    def pending(self):
+        return self.db.fetchone('SELECT COUNT(*) FROM fanout_jobs')[0]
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            try:
+                busy = self.run_once()
+            except Exception:
+                logger.exception("Vacancy fan-out failed")
+                busy = False
+            if not busy:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+
+    def subscribers(self, location, after):
+        # Group chats have negative ids, so a fresh fan-out has no lower bound
+        if after is None:
+            return self.db.fetchall('''
+                SELECT chat_id FROM subscriptions WHERE location = ?
+                ORDER BY chat_id LIMIT ?
+            ''', (location, self.batch_size))
+        return self.db.fetchall('''
+            SELECT chat_id FROM subscriptions WHERE location = ? AND chat_id > ?
+            ORDER BY chat_id LIMIT ?
+        ''', (location, after, self.batch_size))
+
+    def run_once(self):
+        # Sends one batch of the fan-out after the one served last, starting
+        # over from the oldest; False when there is none
+        task = self.db.fetchone('''
+            SELECT id, job_id, location, cursor FROM fanout_jobs WHERE id > ? ORDER BY id LIMIT 1
+        ''', (self.last_task,))
+        if task is None:
+            task = self.db.fetchone('SELECT id, job_id, location, cursor FROM fanout_jobs ORDER BY id LIMIT 1')
+        if task is None:
+            return False
+        task_id, job_id, location, cursor = task
+        self.last_task = task_id
+        # Read again for every batch: the vacancy may have been edited,
+        # deleted or archived since it was posted
+        job = self.db.fetchone('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        chat_ids = []
+        if job is not None and job[4] == location:
+            chat_ids = [row[0] for row in self.subscribers(location, cursor)]
+        if not chat_ids:
+            self.db.execute('DELETE FROM fanout_jobs WHERE id = ?', (task_id,))
+            return True
+
+        text, markup = notification(job)
+        # The employer does not need to hear about their own vacancy
+        recipients = [chat_id for chat_id in chat_ids if chat_id != job[1]]
+        futures = [
+            self.api.send_message(chat_id, text, reply_markup=markup, priority=BULK)
+            for chat_id in recipients
+        ]
+        wait(futures)
+        delivered = 0
+        for chat_id, future in zip(recipients, futures):
+            error = future.exception()
+            if error is None:
+                delivered += 1
+            elif blocked(error):
+                unsubscribe(self.db, chat_id, wait=False)
+        self.db.execute('''
+            UPDATE fanout_jobs SET cursor = ?, sent = sent + ? WHERE id = ?
+        ''', (chat_ids[-1], delivered, task_id))
+        return True
+
+    def close(self):
+        # Finishes the batch in flight
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,187 @@
+import math
+
+from assets import CITIES
+from storage import execute_script
+
+# Vacancies near a point. Every vacancy has a place: the location the
+# employer shared, rounded to PLACE_DECIMALS (about 100 m), or else the
+# centre of its city. places_geo is an R*Tree over the places that is
+# searched in rings of doubling radius around the seeker, so a search reads
+# the places of the smallest ring that fills the page rather than every
+# vacancy in radius_km. Results come nearest place first and newest first
+# within a place, from idx_jobs_place; the city centres hold most vacancies
+# and are read a page at a time.
+
+RADIUS_KM = 50
+FIRST_RING_KM = 2
+PLACE_DECIMALS = 3
+EARTH_RADIUS_KM = 6371.0
+
+CITY_COORDINATES = {
+    "🏙️ Київ": (50.4501, 30.5234),
+    "🌇 Львів": (49.8397, 24.0297),
+    "🌅 Одеса": (46.4825, 30.7233),
+    "🌆 Харків": (49.9935, 36.2304),
+    "🌃 Дніпро": (48.4647, 35.0462),
+    "🏘️ Хмельницький": (49.4229, 26.9871),
+    "🏰 Полтава": (49.5883, 34.5514),
+    "🌉 Кривий Ріг": (47.9105, 33.3918),
+}
+assert set(CITY_COORDINATES) == set(CITIES)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS places (
+        id INTEGER PRIMARY KEY,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        jobs INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (latitude, longitude)
+    );
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS places_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+
+    CREATE TABLE IF NOT EXISTS city_places (
+        location TEXT PRIMARY KEY,
+        place_id INTEGER NOT NULL
+    );
+
+    CREATE TRIGGER IF NOT EXISTS places_geo_insert AFTER INSERT ON places BEGIN
+        INSERT INTO places_geo (id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END;
+
+    -- A vacancy posted without a place is at the centre of its city
+    CREATE TRIGGER IF NOT EXISTS geo_jobs_default_place AFTER INSERT ON jobs
+    WHEN NEW.place_id IS NULL AND NEW.location IN (SELECT location FROM city_places) BEGIN
+        UPDATE jobs SET place_id = (SELECT place_id FROM city_places WHERE location = NEW.location)
+        WHERE id = NEW.id;
+    END;
+
+    -- And so is one moved to another city
+    CREATE TRIGGER IF NOT EXISTS geo_jobs_relocate AFTER UPDATE OF location ON jobs
+    WHEN OLD.location IS NOT NEW.location BEGIN
+        UPDATE jobs SET place_id = (SELECT place_id FROM city_places WHERE location = NEW.location)
+        WHERE id = NEW.id;
+    END;
+
+    -- places.jobs lets a search skip the places that have no vacancies left
+    CREATE TRIGGER IF NOT EXISTS geo_jobs_insert AFTER INSERT ON jobs WHEN NEW.place_id IS NOT NULL BEGIN
+        UPDATE places SET jobs = jobs + 1 WHERE id = NEW.place_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS geo_jobs_delete AFTER DELETE ON jobs WHEN OLD.place_id IS NOT NULL BEGIN
+        UPDATE places SET jobs = jobs - 1 WHERE id = OLD.place_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS geo_jobs_move AFTER UPDATE OF place_id ON jobs
+    WHEN OLD.place_id IS NOT NEW.place_id BEGIN
+        UPDATE places SET jobs = jobs - 1 WHERE id = OLD.place_id;
+        UPDATE places SET jobs = jobs + 1 WHERE id = NEW.place_id;
+    END;
+'''
+
+INDEXES = '''
+    CREATE INDEX IF NOT EXISTS idx_jobs_place ON jobs (place_id, created_at, id);
+'''
+
+
+def install(conn, create_indexes=execute_script):
+    # create_indexes as in lifecycle.install
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+    execute_script(conn, SCHEMA)
+    for location, (latitude, longitude) in CITY_COORDINATES.items():
+        conn.execute('INSERT OR IGNORE INTO city_places (location, place_id) VALUES (?, ?)',
+                     (location, place(conn, latitude, longitude)))
+    if 'place_id' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN place_id INTEGER')
+        # Counted by geo_jobs_move
+        conn.execute('''
+            UPDATE jobs SET place_id = (SELECT place_id FROM city_places WHERE city_places.location = jobs.location)
+            WHERE location IN (SELECT location FROM city_places)
+        ''')
+    create_indexes(conn, INDEXES)
+
+
+def place(conn, latitude, longitude):
+    # Id of the place at a point, added when new; in a write
+    latitude, longitude = round(latitude, PLACE_DECIMALS), round(longitude, PLACE_DECIMALS)
+    conn.execute('INSERT OR IGNORE INTO places (latitude, longitude) VALUES (?, ?)', (latitude, longitude))
+    return conn.execute('SELECT id FROM places WHERE latitude = ? AND longitude = ?',
+                        (latitude, longitude)).fetchone()[0]
+
+
+def distance(latitude, longitude, other_latitude, other_longitude):
+    # Great-circle distance in km
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    a = (math.sin((other_phi - phi) / 2) ** 2
+         + math.cos(phi) * math.cos(other_phi) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def nearest_city(latitude, longitude):
+    return min(CITIES, key=lambda city: distance(latitude, longitude, *CITY_COORDINATES[city]))
+
+
+def places_within(db, latitude, longitude, radius_km):
+    # [(distance, place_id)] of the places with vacancies within radius_km,
+    # nearest first
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    lon_delta = math.degrees(radius_km / (EARTH_RADIUS_KM * max(0.01, math.cos(math.radians(latitude)))))
+    rows = db.fetchall('''
+        SELECT places.id, places.latitude, places.longitude FROM places_geo
+        JOIN places ON places.id = places_geo.id
+        WHERE places_geo.max_lat >= ? AND places_geo.min_lat <= ?
+            AND places_geo.max_lon >= ? AND places_geo.min_lon <= ?
+            AND places.jobs > 0
+    ''', (latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta))
+    found = []
+    for place_id, place_latitude, place_longitude in rows:
+        km = distance(latitude, longitude, place_latitude, place_longitude)
+        if km <= radius_km:
+            found.append((km, place_id))
+    found.sort()
+    return found
+
+
+def place_jobs(db, place_id, before=None, limit=5):
+    # Live vacancies of a place, newest first; before is a (created_at, id)
+    # keyset
+    if before is None:
+        return db.fetchall('''
+            SELECT * FROM jobs WHERE place_id = ? AND expires_at > datetime('now')
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        ''', (place_id, limit))
+    return db.fetchall('''
+        SELECT * FROM jobs WHERE place_id = ? AND (created_at, id) < (?, ?)
+            AND expires_at > datetime('now')
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', (place_id, before[0], before[1], limit))
+
+
+def nearby(db, latitude, longitude, limit=5, after=None, radius_km=RADIUS_KM):
+    # [(distance, job row)] of up to `limit` live vacancies within
+    # radius_km. after is the cursor() of the last vacancy shown.
+    results = []
+    # Places at most this far away have been read to the end
+    covered = -1.0
+    ring = FIRST_RING_KM
+    while after is not None and ring < after[0]:
+        ring *= 2
+    while True:
+        outer = min(ring, radius_km)
+        for km, place_id in places_within(db, latitude, longitude, outer):
+            if km <= covered or (after is not None and (km, place_id) < (after[0], after[1])):
+                continue
+            before = after[2:] if after is not None and place_id == after[1] else None
+            results.extend((km, job) for job in place_jobs(db, place_id, before, limit - len(results)))
+            if len(results) >= limit:
+                return results
+        if outer >= radius_km:
+            return results
+        covered = outer
+        ring *= 2
+
+
+def cursor(km, job):
+    # Where nearby() continues after this result
+    return km, job[8], job[6], job[0]
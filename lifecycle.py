@@ -0,0 +1,194 @@
+import logging
+import sqlite3
+import sys
+import threading
+
+from storage import execute_script
+
+logger = logging.getLogger(__name__)
+
+# Vacancies expire ttl_days after they are posted unless the employer renews
+# them. The Archiver moves expired rows from jobs to jobs_archive in small
+# batches, so jobs, its indexes, jobs_fts and the live stats totals only hold
+# live vacancies, and between rounds it returns freed pages to the file
+# system a slice at a time. Every step is a short write of its own, queued
+# with the handlers' writes.
+
+DEFAULT_TTL_DAYS = 30
+
+SCHEMA = f'''
+    CREATE TABLE IF NOT EXISTS jobs_archive (
+        id INTEGER NOT NULL,
+        employer_id INTEGER,
+        title TEXT,
+        description TEXT,
+        location TEXT,
+        telegram_username TEXT,
+        created_at TIMESTAMP,
+        expires_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS settings (
+        name TEXT PRIMARY KEY,
+        value
+    );
+
+    -- Earlier versions wrote ttl_days into the trigger itself
+    DROP TRIGGER IF EXISTS jobs_default_expiry;
+
+    CREATE TRIGGER jobs_default_expiry AFTER INSERT ON jobs WHEN NEW.expires_at IS NULL BEGIN
+        UPDATE jobs SET expires_at = datetime(
+            COALESCE(NEW.created_at, 'now'),
+            COALESCE((SELECT value FROM settings WHERE name = 'job_ttl'), '+{DEFAULT_TTL_DAYS} days')
+        )
+        WHERE id = NEW.id;
+    END;
+'''
+
+INDEXES = '''
+    CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at);
+
+    CREATE INDEX IF NOT EXISTS idx_jobs_employer ON jobs (employer_id, expires_at);
+'''
+
+# Kept in a row so a new ttl_days applies to the next postings without
+# touching the schema
+SET_TTL = '''
+    INSERT INTO settings (name, value) VALUES ('job_ttl', ?)
+    ON CONFLICT (name) DO UPDATE SET value = excluded.value WHERE value IS NOT excluded.value
+'''
+
+# jobs.id is not AUTOINCREMENT and can be reused once the newest rows are
+# archived, so the archive keeps its own rowid instead of a key on id
+
+COLUMNS = 'id, employer_id, title, description, location, telegram_username, created_at, expires_at'
+
+
+def install(conn, ttl_days=DEFAULT_TTL_DAYS, create_indexes=execute_script):
+    # create_indexes(conn, INDEXES) builds the indexes on jobs; migrations
+    # passes one that leaves them for later on a big table
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+    if 'expires_at' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN expires_at TIMESTAMP')
+        conn.execute('UPDATE jobs SET expires_at = datetime(created_at, ?)', (f'+{int(ttl_days)} days',))
+    execute_script(conn, SCHEMA)
+    create_indexes(conn, INDEXES)
+    conn.execute(SET_TTL, (f'+{int(ttl_days)} days',))
+
+
+def configure(db, ttl_days):
+    # Queued without waiting; the handlers' writes come after it
+    return db.execute(SET_TTL, (f'+{int(ttl_days)} days',), wait=False)
+
+
+def renew(db, job_id, employer_id, ttl_days=DEFAULT_TTL_DAYS):
+    # New expiry, or None when the vacancy is gone or belongs to someone else
+    result = db.execute('''
+        UPDATE jobs SET expires_at = datetime('now', ?)
+        WHERE id = ? AND employer_id = ?
+    ''', (f'+{int(ttl_days)} days', job_id, employer_id))
+    if not result.rowcount:
+        return None
+    return db.fetchone('SELECT expires_at FROM jobs WHERE id = ?', (job_id,))[0]
+
+
+def employer_jobs(db, employer_id, limit=20):
+    return db.fetchall('''
+        SELECT id, title, location, expires_at FROM jobs
+        WHERE employer_id = ?
+        ORDER BY expires_at LIMIT ?
+    ''', (employer_id, limit))
+
+
+def archive_expired(conn, limit=500):
+    ids = [row[0] for row in conn.execute('''
+        SELECT id FROM jobs WHERE expires_at <= datetime('now')
+        ORDER BY expires_at LIMIT ?
+    ''', (limit,))]
+    if not ids:
+        return 0
+    placeholders = ','.join('?' * len(ids))
+    conn.execute(f'''
+        INSERT INTO jobs_archive ({COLUMNS})
+        SELECT {COLUMNS} FROM jobs WHERE id IN ({placeholders})
+    ''', ids)
+    # The stats and FTS triggers on jobs take the rows out of the live
+    # aggregates and the search index
+    conn.execute(f'DELETE FROM jobs WHERE id IN ({placeholders})', ids)
+    return len(ids)
+
+
+def compact(conn, pages=256):
+    # One bounded slice: fold small FTS segments together and, on a database
+    # created with auto_vacuum = INCREMENTAL, release up to `pages` free pages.
+    # Returns the number of free pages left.
+    conn.execute("INSERT INTO jobs_fts (jobs_fts, rank) VALUES ('merge', 64)")
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 0
+    # The sqlite3 module steps a PRAGMA only once, which frees one page
+    for _ in range(min(free, pages)):
+        conn.execute('PRAGMA incremental_vacuum(1)')
+    return max(0, free - pages)
+
+
+class Archiver:
+    def __init__(self, db, interval=60.0, batch_size=500, vacuum_pages=256):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='job-archiver', daemon=True)
+        self.thread.start()
+
+    def run_once(self):
+        def archive(conn):
+            return archive_expired(conn, self.batch_size)
+
+        def vacuum(conn):
+            return compact(conn, self.vacuum_pages)
+
+        archived = 0
+        while not self.stopped.is_set():
+            moved = self.db.run(archive)
+            archived += moved
+            if moved < self.batch_size:
+                break
+        while not self.stopped.is_set() and self.db.run(vacuum):
+            pass
+        return archived
+
+    def _loop(self):
+        # The first round runs right away and clears what expired while the
+        # bot was down
+        while True:
+            try:
+                archived = self.run_once()
+                if archived:
+                    logger.info("Archived %d expired vacancies", archived)
+            except Exception:
+                logger.exception("Vacancy archiving failed")
+            if self.stopped.wait(self.interval):
+                return
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+if __name__ == '__main__':
+    # python lifecycle.py compact [job_bot.db]
+    # Switches an existing database to incremental auto-vacuum. Run it with
+    # the bot stopped: VACUUM rewrites the whole file.
+    if len(sys.argv) < 2 or sys.argv[1] != 'compact':
+        sys.exit("usage: python lifecycle.py compact [database]")
+    connection = sqlite3.connect(sys.argv[2] if len(sys.argv) > 2 else 'job_bot.db', isolation_level=None)
+    connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    connection.execute('VACUUM')
+    connection.close()
@@ -0,0 +1,220 @@
+import bisect
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Histograms and counters for the hot paths: router handlers, SQLite
+# statements and Bot API calls. Components call their `observer` only when
+# one is set, so a bot without Metrics pays a single None check per call.
+# Exposed in the Prometheus text format by MetricsServer.
+
+# Upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def statement_name(sql):
+    # A short, stable label for a SQL string: "SELECT jobs", "INSERT users"
+    words = [word for word in re.findall(r'\w+', sql) if word.upper() not in ('IF', 'NOT', 'EXISTS')]
+    if not words:
+        return '?'
+    verb = words[0].upper()
+    if verb == 'UPDATE' and len(words) > 1:
+        return f'UPDATE {words[1]}'
+    upper = [word.upper() for word in words]
+    for keyword in ('FROM', 'INTO', 'TABLE', 'INDEX', 'TRIGGER'):
+        if keyword in upper[:-1]:
+            return f'{verb} {words[upper.index(keyword) + 1]}'
+    return verb
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}  # label values -> [bucket counts..., count, sum]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2) + [0.0]
+            series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            items = sorted((labels, list(series)) for labels, series in self.series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {series[-2]}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Gauge:
+    # Read from a callback at scrape time, nothing on the hot path
+    type = 'gauge'
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}', f'{self.name} {self.read()}']
+
+
+class ReadCounter(Gauge):
+    # A running total the component keeps itself, read at scrape time
+    type = 'counter'
+
+
+class Metrics:
+    def __init__(self, slow_ms=None):
+        # Operations slower than slow_ms are logged as warnings
+        self.slow = None if slow_ms is None else slow_ms / 1000
+        self.statement_names = {}
+        self.handler_seconds = Histogram(
+            'bot_handler_seconds', 'Time spent in update handlers', ('handler',))
+        self.handler_errors = Counter(
+            'bot_handler_errors_total', 'Update handlers that raised', ('handler',))
+        self.query_seconds = Histogram(
+            'bot_db_query_seconds', 'SQLite statement time, fetch included', ('kind', 'statement'))
+        self.query_errors = Counter(
+            'bot_db_query_errors_total', 'SQLite statements that raised', ('kind', 'statement'))
+        self.api_seconds = Histogram(
+            'bot_api_call_seconds', 'Bot API call time', ('method',))
+        self.api_wait_seconds = Histogram(
+            'bot_api_queue_seconds', 'Time Bot API calls waited in the outbound queue', ('method',))
+        self.api_errors = Counter(
+            'bot_api_errors_total', 'Bot API calls that raised', ('method',))
+        self.collectors = [
+            self.handler_seconds, self.handler_errors,
+            self.query_seconds, self.query_errors,
+            self.api_seconds, self.api_wait_seconds, self.api_errors,
+        ]
+
+    def gauge(self, name, help, read):
+        self.collectors.append(Gauge(name, help, read))
+
+    def counter(self, name, help, read):
+        self.collectors.append(ReadCounter(name, help, read))
+
+    def _check_slow(self, kind, name, seconds):
+        if self.slow is not None and seconds >= self.slow:
+            logger.warning("Slow %s %s: %.1f ms", kind, name, seconds * 1000)
+
+    # Observers, set on UpdateRouter, Storage and OutboundScheduler
+
+    def handler(self, name, seconds, error):
+        self.handler_seconds.observe(seconds, name)
+        if error is not None:
+            self.handler_errors.inc(name)
+        self._check_slow('handler', name, seconds)
+
+    def query(self, kind, target, seconds, error):
+        # target is the SQL text, or the function given to Storage.run()
+        if isinstance(target, str):
+            name = self.statement_names.get(target)
+            if name is None:
+                name = self.statement_names[target] = statement_name(target)
+        else:
+            name = getattr(target, '__name__', 'run')
+        self.query_seconds.observe(seconds, kind, name)
+        if error is not None:
+            self.query_errors.inc(kind, name)
+        self._check_slow(f'{kind} query', name, seconds)
+
+    def api_call(self, method, waited, seconds, error):
+        self.api_seconds.observe(seconds, method)
+        self.api_wait_seconds.observe(waited, method)
+        if error is not None:
+            self.api_errors.inc(method)
+        self._check_slow('API call', method, seconds)
+
+    def render(self):
+        lines = []
+        for collector in self.collectors:
+            lines.extend(collector.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    # GET /metrics in the Prometheus text format, meant for localhost
+
+    def __init__(self, metrics, host='127.0.0.1', port=9100):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics', daemon=True)
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self.thread.start()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
@@ -0,0 +1,274 @@
+import logging
+import re
+import sys
+import threading
+import time
+
+import assets
+import cache
+import dedup
+import fanout
+import geo
+import lifecycle
+import search
+import stats
+from storage import Storage, execute_script, statements
+
+logger = logging.getLogger(__name__)
+
+# Versioned schema. PRAGMA user_version holds how many of MIGRATIONS have
+# been applied; when it is LATEST, starting the bot reads that one pragma and
+# runs no DDL. Pending migrations run in order, all in one transaction. A
+# schema change is a new function appended to MIGRATIONS; released ones are
+# never edited. The first migrations only create what is missing, so they
+# also bring up to date a database made before user_version was kept.
+#
+# An index on a table with more than BACKGROUND_ROWS rows is not built
+# inside the migration: it goes to schema_deferred and user_version is
+# stored negated until IndexBuilder has built all of them after the bot
+# started. Indexes only make queries faster, nothing waits for them. Each
+# index is one write, so while it is built the bot's writes queue behind
+# it; reads go on.
+
+BACKGROUND_ROWS = 100000
+
+DEFERRED = '''
+    CREATE TABLE IF NOT EXISTS schema_deferred (
+        name TEXT PRIMARY KEY,
+        sql TEXT NOT NULL
+    )
+'''
+
+_INDEX = re.compile(r'CREATE\s+INDEX\s+IF\s+NOT\s+EXISTS\s+(\w+)\s+ON\s+(\w+)', re.IGNORECASE)
+
+
+def create_indexes(conn, script):
+    # Runs the CREATE INDEX IF NOT EXISTS statements of script, deferring
+    # the ones on big tables
+    for statement in statements(script):
+        name, table = _INDEX.search(statement).groups()
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone():
+            continue
+        rows = conn.execute(f'SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT ?)',
+                            (BACKGROUND_ROWS + 1,)).fetchone()[0]
+        if rows > BACKGROUND_ROWS:
+            conn.execute('INSERT OR REPLACE INTO schema_deferred (name, sql) VALUES (?, ?)', (name, statement))
+        else:
+            conn.execute(statement)
+
+
+def base_tables(conn):
+    execute_script(conn, '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            employer_id INTEGER,
+            title TEXT,
+            description TEXT,
+            location TEXT,
+            telegram_username TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+
+
+def browse_indexes(conn):
+    # Keyset browsing of a city's vacancies and of the admin vacancy browser
+    create_indexes(conn, '''
+        CREATE INDEX IF NOT EXISTS idx_jobs_location_created ON jobs (location, created_at, id);
+
+        CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at, id);
+    ''')
+
+
+def sessions_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            chat_id INTEGER PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+
+def statistics(conn):
+    stats.install(conn)
+
+
+def full_text_search(conn):
+    search.install(conn)
+
+
+def media_cache(conn):
+    assets.install(conn)
+
+
+def expiry(conn):
+    # The ttl itself is set by every start, see lifecycle.configure
+    lifecycle.install(conn, create_indexes=create_indexes)
+
+
+def subscriptions(conn):
+    fanout.install(conn)
+
+
+def duplicates(conn):
+    dedup.install(conn)
+
+
+def listing_changes(conn):
+    cache.install(conn)
+
+
+def geolocation(conn):
+    geo.install(conn, create_indexes=create_indexes)
+
+
+def live_stats_buckets(conn):
+    # Replaced the delete triggers; superseded by posting_history
+    conn.execute('DROP TRIGGER IF EXISTS stats_users_delete')
+    conn.execute('DROP TRIGGER IF EXISTS stats_jobs_delete')
+    stats.install(conn)
+    stats.rebuild(conn)
+
+
+def posting_history(conn):
+    # The delete triggers leave the time buckets alone again, and the
+    # postings that live_stats_buckets took out for archived vacancies are
+    # counted back from jobs_archive
+    conn.execute('DROP TRIGGER IF EXISTS stats_users_delete')
+    conn.execute('DROP TRIGGER IF EXISTS stats_jobs_delete')
+    stats.install(conn)
+    stats.rebuild(conn)
+
+
+def moved_duplicates(conn):
+    # A vacancy moved to another city used to stay in the cluster of its
+    # old one; a member without another member in its city leaves it
+    conn.execute('''
+        DELETE FROM job_clusters WHERE job_id IN (
+            SELECT member.job_id FROM job_clusters AS member
+            JOIN jobs ON jobs.id = member.job_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM job_clusters AS peer
+                JOIN jobs AS other ON other.id = peer.job_id
+                WHERE peer.cluster_id = member.cluster_id AND peer.job_id != member.job_id
+                    AND other.location = jobs.location
+            )
+        )
+    ''')
+
+
+MIGRATIONS = [
+    base_tables,
+    browse_indexes,
+    sessions_table,
+    statistics,
+    full_text_search,
+    media_cache,
+    expiry,
+    subscriptions,
+    duplicates,
+    listing_changes,
+    geolocation,
+    live_stats_buckets,
+    posting_history,
+    moved_duplicates,
+]
+
+LATEST = len(MIGRATIONS)
+
+
+def migrate(db):
+    # Brings the schema up to date. Returns True when indexes were left
+    # for IndexBuilder.
+    version = db.fetchone('PRAGMA user_version')[0]
+    if version == LATEST:
+        return False
+    if version == -LATEST:
+        return True
+    return db.run(_upgrade)
+
+
+def _upgrade(conn):
+    # Read again inside the write transaction: another worker process may
+    # have migrated the database in the meantime
+    version = abs(conn.execute('PRAGMA user_version').fetchone()[0])
+    if version > LATEST:
+        raise RuntimeError(f"Database schema version {version} is newer than this code ({LATEST})")
+    conn.execute(DEFERRED)
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        started = time.perf_counter()
+        migration(conn)
+        logger.info("Migration %d (%s) applied in %.2f s", number, migration.__name__,
+                    time.perf_counter() - started)
+    deferred = conn.execute('SELECT 1 FROM schema_deferred LIMIT 1').fetchone() is not None
+    conn.execute(f'PRAGMA user_version = {-LATEST if deferred else LATEST}')
+    return deferred
+
+
+class IndexBuilder:
+    # Builds the deferred indexes one write at a time, then marks the schema
+    # current. Closing stops it before the next index.
+
+    def __init__(self, db):
+        self.db = db
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='index-builder', daemon=True)
+        self.thread.start()
+
+    def run_once(self):
+        # Builds one deferred index; False when none was left
+        def build(conn):
+            # In the order the migrations declared them
+            row = conn.execute('SELECT name, sql FROM schema_deferred ORDER BY rowid LIMIT 1').fetchone()
+            if row is None:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                conn.execute(f'PRAGMA user_version = {abs(version)}')
+                return None
+            conn.execute(row[1])
+            conn.execute('DELETE FROM schema_deferred WHERE name = ?', (row[0],))
+            return row[0]
+
+        started = time.perf_counter()
+        name = self.db.run(build)
+        if name is None:
+            return False
+        logger.info("Index %s built in %.1f s", name, time.perf_counter() - started)
+        return True
+
+    def _loop(self):
+        try:
+            while not self.stopped.is_set() and self.run_once():
+                pass
+        except Exception:
+            logger.exception("Building deferred indexes failed")
+
+    def close(self):
+        # An index being built is not waited for; it is rolled back with
+        # the process and built again on the next start
+        self.stopped.set()
+
+
+if __name__ == '__main__':
+    # python migrations.py [job_bot.db]
+    logging.basicConfig(level=logging.INFO)
+    storage = Storage(sys.argv[1] if len(sys.argv) > 1 else 'job_bot.db')
+    print(f"Schema version {storage.fetchone('PRAGMA user_version')[0]}, latest {LATEST}")
+    if migrate(storage):
+        builder = IndexBuilder(storage)
+        while builder.run_once():
+            pass
+    print(f"Schema version {storage.fetchone('PRAGMA user_version')[0]}")
+    storage.close()
@@ -0,0 +1,313 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class Job:
+    __slots__ = ('chat_id', 'func', 'args', 'kwargs', 'priority', 'seq', 'future', 'enqueued', 'attempts')
+
+    def __init__(self, chat_id, func, args, kwargs, priority, seq):
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+def retry_after(error):
+    # telebot.apihelper.ApiTelegramException for "429 Too Many Requests"
+    if getattr(error, 'error_code', None) != 429:
+        return None
+    parameters = (getattr(error, 'result_json', None) or {}).get('parameters') or {}
+    return parameters.get('retry_after', 1)
+
+
+class OutboundScheduler:
+    # Queue of outgoing Bot API calls. Calls are sent by a few sender threads
+    # within a global and a per-chat token bucket, interactive replies before
+    # bulk output, one call per chat in flight so each chat keeps its order.
+    # A 429 pauses the chat for retry_after seconds and requeues the call.
+
+    def __init__(self, global_rate=30, global_burst=5, chat_rate=1, chat_burst=3, senders=8,
+                 max_attempts=5, max_buckets=10000):
+        now = time.monotonic()
+        self.global_bucket = TokenBucket(global_rate, global_burst, now)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.buckets = {}
+        self.max_buckets = max_buckets
+        self.swept = now
+        self.paused = {}
+        self.ready = []
+        self.delayed = []
+        self.blocked = {}
+        self.inflight = set()
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.stopping = False
+        # observer(method, queued_seconds, call_seconds, error) after every call
+        self.observer = None
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.latencies = {INTERACTIVE: deque(maxlen=10000), BULK: deque(maxlen=10000)}
+
+        self.senders = [
+            threading.Thread(target=self._send_loop, name=f'outbound-{n}', daemon=True)
+            for n in range(senders)
+        ]
+        for thread in self.senders:
+            thread.start()
+
+    def submit(self, chat_id, func, *args, priority=INTERACTIVE, **kwargs):
+        job = Job(chat_id, func, args, kwargs, priority, next(self.seq))
+        with self.cond:
+            heapq.heappush(self.ready, (priority, job.seq, job))
+            self.cond.notify()
+        return job.future
+
+    def _next_job(self):
+        # Called with self.cond held; returns a job whose tokens are taken
+        while not self.stopping:
+            now = time.monotonic()
+            while self.delayed and self.delayed[0][0] <= now:
+                _, priority, seq, job = heapq.heappop(self.delayed)
+                heapq.heappush(self.ready, (priority, seq, job))
+
+            if not self.ready:
+                self.cond.wait(self.delayed[0][0] - now if self.delayed else None)
+                continue
+
+            priority, seq, job = heapq.heappop(self.ready)
+            chat_id = job.chat_id
+            if chat_id is not None and chat_id in self.inflight:
+                self.blocked.setdefault(chat_id, []).append((priority, seq, job))
+                continue
+
+            bucket = None
+            if chat_id is not None:
+                bucket = self.buckets.get(chat_id)
+                if bucket is None:
+                    bucket = self.buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+                # The pause deadline is used as is so a retried call sorts
+                # before the chat's later calls delayed until the same moment
+                chat_ready = max(now + bucket.delay(now), self.paused.get(chat_id, 0))
+                if chat_ready > now:
+                    heapq.heappush(self.delayed, (chat_ready, priority, seq, job))
+                    continue
+
+            global_wait = self.global_bucket.delay(now)
+            if global_wait > 0:
+                heapq.heappush(self.ready, (priority, seq, job))
+                self.cond.wait(global_wait)
+                continue
+
+            self.global_bucket.take()
+            if bucket is not None:
+                bucket.take()
+                self.inflight.add(chat_id)
+            return job
+        return None
+
+    def _send_loop(self):
+        while True:
+            with self.cond:
+                job = self._next_job()
+            if job is None:
+                return
+            job.attempts += 1
+            started = time.monotonic()
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                self._finish(job, started, None, e)
+            else:
+                self._finish(job, started, result, None)
+
+    def _finish(self, job, started, result, error):
+        if self.observer is not None:
+            self._observe(job, started, error)
+        if error is not None:
+            self._failed(job, error)
+        else:
+            self.latencies[job.priority].append(time.monotonic() - job.enqueued)
+            job.future.set_result(result)
+            with self.cond:
+                self.sent += 1
+        self._release(job.chat_id)
+
+    def _observe(self, job, started, error):
+        # Queue wait is counted from submit, or from the retry for a retried call
+        self.observer(getattr(job.func, '__name__', 'call'), started - job.enqueued,
+                      time.monotonic() - started, error)
+
+    def _failed(self, job, error):
+        delay = retry_after(error)
+        if delay is None or job.attempts >= self.max_attempts:
+            logger.warning("Bot API call %s failed: %s", getattr(job.func, '__name__', job.func), error)
+            with self.cond:
+                self.failed += 1
+            job.future.set_exception(error)
+            return
+        with self.cond:
+            self.retried += 1
+            ready_at = time.monotonic() + delay
+            if job.chat_id is not None:
+                self.paused[job.chat_id] = ready_at
+            heapq.heappush(self.delayed, (ready_at, job.priority, job.seq, job))
+            self.cond.notify()
+
+    def _release(self, chat_id):
+        if chat_id is None:
+            return
+        with self.cond:
+            self.inflight.discard(chat_id)
+            for item in self.blocked.pop(chat_id, ()):
+                heapq.heappush(self.ready, item)
+            now = time.monotonic()
+            if self.paused.get(chat_id, 0) < now:
+                self.paused.pop(chat_id, None)
+            if len(self.buckets) > self.max_buckets and now - self.swept > 1:
+                self._sweep(now)
+            self.cond.notify_all()
+
+    def _sweep(self, now):
+        # A full bucket is the same as a fresh one, idle chats need no state
+        self.swept = now
+        for chat_id, bucket in list(self.buckets.items()):
+            if chat_id not in self.inflight and bucket.delay(now) == 0 and bucket.tokens >= bucket.capacity:
+                del self.buckets[chat_id]
+
+    def depth(self):
+        with self.cond:
+            return (len(self.ready) + len(self.delayed) + len(self.inflight)
+                    + sum(len(jobs) for jobs in self.blocked.values()))
+
+    def stats(self):
+        result = {
+            'queue_depth': self.depth(),
+            'sent': self.sent,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+        for priority, name in ((INTERACTIVE, 'interactive'), (BULK, 'bulk')):
+            latencies = sorted(self.latencies[priority])
+            if latencies:
+                result[f'{name}_latency_p50'] = latencies[len(latencies) // 2]
+                result[f'{name}_latency_p99'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return result
+
+    def close(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.ready or self.delayed or self.inflight or self.blocked:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.cond.wait(remaining if remaining is None else min(remaining, 0.1))
+            self.stopping = True
+            self.cond.notify_all()
+        for thread in self.senders:
+            thread.join()
+
+
+class AsyncOutboundScheduler(OutboundScheduler):
+    # The same queue and limits for coroutine functions (AsyncTeleBot
+    # methods). One thread takes the calls off the queue as the buckets
+    # allow and the event loop runs them, any number in flight at once;
+    # submit() still returns a concurrent.futures.Future.
+
+    def __init__(self, loop, **limits):
+        self.loop = loop
+        # The loop only keeps weak references to its tasks
+        self.tasks = set()
+        super().__init__(senders=1, **limits)
+
+    def _send_loop(self):
+        while True:
+            with self.cond:
+                job = self._next_job()
+            if job is None:
+                return
+            job.attempts += 1
+            self.loop.call_soon_threadsafe(self._start, job)
+
+    def _start(self, job):
+        task = self.loop.create_task(self._call(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _call(self, job):
+        started = time.monotonic()
+        try:
+            result = await job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            self._finish(job, started, None, e)
+        else:
+            self._finish(job, started, result, None)
+
+
+def _chat_call(name):
+    def call(self, chat_id, *args, priority=INTERACTIVE, **kwargs):
+        return self.scheduler.submit(chat_id, getattr(self.bot, name), chat_id, *args,
+                                     priority=priority, **kwargs)
+    call.__name__ = name
+    return call
+
+
+class RateLimitedBot:
+    # Drop-in for the TeleBot send methods used by the handlers; every call
+    # goes through the scheduler and returns a Future.
+
+    def __init__(self, bot, scheduler):
+        self.bot = bot
+        self.scheduler = scheduler
+
+    send_message = _chat_call('send_message')
+    send_animation = _chat_call('send_animation')
+    send_document = _chat_call('send_document')
+    send_location = _chat_call('send_location')
+    delete_message = _chat_call('delete_message')
+    edit_message_reply_markup = _chat_call('edit_message_reply_markup')
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        return self.scheduler.submit(chat_id, self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+
+    def answer_callback_query(self, callback_query_id, *args, **kwargs):
+        # Not a chat message, only the global limit applies
+        return self.scheduler.submit(None, self.bot.answer_callback_query, callback_query_id, *args, **kwargs)
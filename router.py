@@ -0,0 +1,101 @@
+# Dispatch order for messages:
+#   1. /commands
+#   2. navigation buttons registered with before_state=True ("🏠 Головне меню", "🔙 Назад")
+#   3. handler of the chat's current conversation state (AWAITING_JOB_TITLE, ...)
+#   4. any other exact button text
+# Callback queries are looked up by the part of callback_data before the last "_",
+# shared locations by the chat's state.
+#
+# observer, when set, is called as observer(handler_name, seconds, error)
+# after every handler run.
+
+import time
+
+
+class UpdateRouter:
+    def __init__(self, get_state):
+        self.get_state = get_state
+        self.commands = {}
+        self.nav_texts = {}
+        self.states = {}
+        self.texts = {}
+        self.callbacks = {}
+        self.locations = {}
+        self.observer = None
+
+    def command(self, *names):
+        return self._register(self.commands, names)
+
+    def text(self, *texts, before_state=False):
+        return self._register(self.nav_texts if before_state else self.texts, texts)
+
+    def state(self, *states):
+        return self._register(self.states, states)
+
+    def callback(self, *prefixes):
+        return self._register(self.callbacks, prefixes)
+
+    def location(self, *states):
+        return self._register(self.locations, states)
+
+    def _register(self, index, keys):
+        def decorator(handler):
+            for key in keys:
+                if key in index:
+                    raise ValueError(f"Handler for {key!r} is already registered")
+                index[key] = handler
+            return handler
+        return decorator
+
+    def resolve(self, message):
+        text = message.text
+        if text and text[0] == '/':
+            name = text[1:].split(maxsplit=1)[0].split('@', 1)[0] if len(text) > 1 else ''
+            handler = self.commands.get(name)
+            if handler is not None:
+                return handler
+
+        handler = self.nav_texts.get(text)
+        if handler is not None:
+            return handler
+
+        state = self.get_state(message.chat.id)
+        if state is not None:
+            handler = self.states.get(state)
+            if handler is not None:
+                return handler
+
+        return self.texts.get(text)
+
+    def dispatch(self, message):
+        handler = self.resolve(message)
+        if handler is None:
+            return False
+        self._run(handler, message)
+        return True
+
+    def dispatch_callback(self, call):
+        handler = self.callbacks.get(call.data.rsplit('_', 1)[0])
+        if handler is None:
+            return False
+        self._run(handler, call)
+        return True
+
+    def dispatch_location(self, message):
+        handler = self.locations.get(self.get_state(message.chat.id))
+        if handler is None:
+            return False
+        self._run(handler, message)
+        return True
+
+    def _run(self, handler, update):
+        if self.observer is None:
+            handler(update)
+            return
+        started = time.perf_counter()
+        try:
+            handler(update)
+        except Exception as e:
+            self.observer(handler.__name__, time.perf_counter() - started, e)
+            raise
+        self.observer(handler.__name__, time.perf_counter() - started, None)
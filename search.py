@@ -0,0 +1,92 @@
+import re
+
+from storage import execute_script
+
+# Full-text index over jobs.title and jobs.description. jobs_fts is an
+# external-content FTS5 table, the triggers keep it in step with jobs.
+
+SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+        title,
+        description,
+        content = 'jobs',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO jobs_fts (rowid, title, description)
+        VALUES (NEW.id, NEW.title, NEW.description);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN
+        INSERT INTO jobs_fts (jobs_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_update AFTER UPDATE OF title, description ON jobs BEGIN
+        INSERT INTO jobs_fts (jobs_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        INSERT INTO jobs_fts (rowid, title, description)
+        VALUES (NEW.id, NEW.title, NEW.description);
+    END;
+'''
+
+# Title matches weigh more than description matches
+RANK = 'bm25(jobs_fts, 10.0, 1.0)'
+
+MAX_TERMS = 8
+
+# Expired vacancies are left out until the archiver removes them. The unary
+# + on jobs.location and jobs.expires_at keeps the planner from driving the
+# query through idx_jobs_location_created or idx_jobs_expires and probing
+# the FTS index row by row: the matches come from jobs_fts, ranked by bm25,
+# and the conditions are checked on their rows.
+
+
+def install(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs_fts'"
+    ).fetchone()
+    execute_script(conn, SCHEMA)
+    if not exists:
+        conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    # Every word becomes a quoted prefix term, so "водій" also finds "водія"
+    # and user input never reaches the FTS5 query syntax
+    terms = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(db, query, location=None, limit=5, offset=0):
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if location is None:
+        return db.fetchall(f'''
+            SELECT jobs.* FROM jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid
+            WHERE jobs_fts MATCH ? AND +jobs.expires_at > datetime('now')
+            ORDER BY {RANK} LIMIT ? OFFSET ?
+        ''', (expression, limit, offset))
+    return db.fetchall(f'''
+        SELECT jobs.* FROM jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid
+        WHERE jobs_fts MATCH ? AND +jobs.location = ? AND +jobs.expires_at > datetime('now')
+        ORDER BY {RANK} LIMIT ? OFFSET ?
+    ''', (expression, location, limit, offset))
+
+
+def count(db, query, location=None):
+    expression = match_expression(query)
+    if not expression:
+        return 0
+    if location is None:
+        return db.fetchone('''
+            SELECT COUNT(*) FROM jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid
+            WHERE jobs_fts MATCH ? AND +jobs.expires_at > datetime('now')
+        ''', (expression,))[0]
+    return db.fetchone('''
+        SELECT COUNT(*) FROM jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid
+        WHERE jobs_fts MATCH ? AND +jobs.location = ? AND +jobs.expires_at > datetime('now')
+    ''', (expression, location))[0]
@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    __slots__ = ('state', 'data')
+
+    def __init__(self, state=None, data=None):
+        self.state = state
+        self.data = data
+
+
+class SQLiteSessionBackend:
+    def __init__(self, db):
+        self.db = db
+
+    def load(self, chat_id):
+        row = self.db.fetchone('SELECT state, data FROM sessions WHERE chat_id = ?', (chat_id,))
+        if row is None:
+            return None
+        return Session(row[0], json.loads(row[1]) if row[1] else None)
+
+    def save(self, sessions):
+        upserts = []
+        deletes = []
+        for chat_id, (state, data) in sessions.items():
+            if state is None and data is None:
+                deletes.append((chat_id,))
+            else:
+                upserts.append((chat_id, state, data))
+
+        def write(conn):
+            if upserts:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO sessions (chat_id, state, data, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ''', upserts)
+            if deletes:
+                conn.executemany('DELETE FROM sessions WHERE chat_id = ?', deletes)
+
+        self.db.run(write)
+
+
+class SessionStore:
+    # Conversation state per chat, one slotted Session record each, in two
+    # generations of plain dicts: recent holds the chats used since the last
+    # rotation, idle the others. Every ttl seconds the idle generation is
+    # evicted and recent becomes idle, so a session is evicted after ttl to
+    # 2 * ttl without use. Beyond max_sessions the idle session used longest
+    # ago goes first, then the recent one that came into recent first.
+    # Changes are written behind to the backend every flush_interval seconds.
+
+    def __init__(self, backend=None, max_sessions=50000, ttl=3600, flush_interval=1.0):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.recent = {}
+        self.idle = {}
+        # Chat ids in the order they came into recent; a chat that has left
+        # its generation since is skipped
+        self.recent_order = deque()
+        self.idle_order = deque()
+        self.rotated = time.monotonic()
+        self.dirty = set()
+        # Evicted changes not written yet, and those being written
+        self.pending = {}
+        self.flushing = {}
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.states = StateView(self)
+        self.data = DataView(self)
+        self.stopped = threading.Event()
+        self.flusher = None
+        if backend is not None and flush_interval:
+            self.flusher = threading.Thread(target=self._flush_loop, name='session-flusher', daemon=True)
+            self.flusher.start()
+
+    def get(self, chat_id, dirty=False):
+        with self.lock:
+            session = self.recent.get(chat_id)
+            if session is None:
+                session = self.idle.pop(chat_id, None)
+                if session is None:
+                    session = self._load(chat_id)
+                    if len(self.recent) + len(self.idle) >= self.max_sessions:
+                        self._evict_oldest()
+                self.recent[chat_id] = session
+                self.recent_order.append(chat_id)
+            if dirty:
+                self.dirty.add(chat_id)
+            return session
+
+    def _load(self, chat_id):
+        for changes in (self.pending, self.flushing):
+            if chat_id in changes:
+                state, data = changes[chat_id]
+                return Session(state, data)
+        if self.backend is not None:
+            session = self.backend.load(chat_id)
+            if session is not None:
+                return session
+        return Session()
+
+    def _evict(self, item):
+        chat_id, session = item
+        if chat_id in self.dirty:
+            self.dirty.discard(chat_id)
+            self.pending[chat_id] = (session.state, session.data)
+
+    def _evict_oldest(self):
+        if self.idle:
+            generation, order = self.idle, self.idle_order
+        else:
+            generation, order = self.recent, self.recent_order
+        while True:
+            chat_id = order.popleft()
+            session = generation.pop(chat_id, None)
+            if session is not None:
+                self._evict((chat_id, session))
+                return
+
+    def _rotate(self):
+        self.idle, self.idle_order = self.recent, self.recent_order
+        self.recent, self.recent_order = {}, deque()
+        self.rotated = time.monotonic()
+
+    def evict_idle(self):
+        with self.lock:
+            if time.monotonic() - self.rotated < self.ttl:
+                return 0
+            evicted = len(self.idle)
+            for item in self.idle.items():
+                self._evict(item)
+            self._rotate()
+        return evicted
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                changes = self.pending
+                self.pending = {}
+                for chat_id in self.dirty:
+                    session = self.recent.get(chat_id)
+                    if session is None:
+                        session = self.idle[chat_id]
+                    changes[chat_id] = (session.state, session.data)
+                self.dirty.clear()
+                if self.backend is None:
+                    return len(changes)
+                # Evicted sessions are loaded from here until saved
+                self.flushing = changes
+                # Serialized under the lock: handlers mutate data dicts in place
+                serialized = {
+                    chat_id: (state, json.dumps(data, ensure_ascii=False) if data else None)
+                    for chat_id, (state, data) in changes.items()
+                }
+            try:
+                if serialized:
+                    self.backend.save(serialized)
+            except Exception:
+                # Written with the next flush, unless changed again since
+                with self.lock:
+                    for chat_id, change in changes.items():
+                        self.pending.setdefault(chat_id, change)
+                    self.flushing = {}
+                raise
+            with self.lock:
+                self.flushing = {}
+            return len(changes)
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.evict_idle()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Saving sessions failed")
+
+    def close(self):
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.flush()
+
+    def __len__(self):
+        return len(self.recent) + len(self.idle)
+
+
+class StateView:
+    # dict-like access to Session.state, used as bot.user_states
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, chat_id, default=None):
+        state = self.store.get(chat_id).state
+        return default if state is None else state
+
+    def __getitem__(self, chat_id):
+        return self.store.get(chat_id).state
+
+    def __setitem__(self, chat_id, state):
+        self.store.get(chat_id, dirty=True).state = state
+
+
+class DataView:
+    # dict-like access to Session.data, used as bot.user_data. Handlers
+    # mutate the returned dict in place, so every read marks it dirty.
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, chat_id, default=None):
+        data = self.store.get(chat_id, dirty=True).data
+        return default if data is None else data
+
+    def __getitem__(self, chat_id):
+        data = self.store.get(chat_id, dirty=True).data
+        if data is None:
+            raise KeyError(chat_id)
+        return data
+
+    def __setitem__(self, chat_id, data):
+        self.store.get(chat_id, dirty=True).data = data
+
+    def __contains__(self, chat_id):
+        return self.store.get(chat_id).data is not None
@@ -0,0 +1,153 @@
+import sqlite3
+import sys
+
+from storage import execute_script
+
+# Aggregates kept up to date by triggers on users and jobs, so the admin
+# statistics never scan the raw tables. The totals and the per-city counts
+# are of the live rows; the time buckets count signups and postings as
+# events, so a vacancy deleted or archived later stays in them. rebuild()
+# counts postings from jobs and jobs_archive.
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS stats_city (
+        location TEXT PRIMARY KEY,
+        jobs INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS stats_buckets (
+        series TEXT,
+        bucket TEXT,
+        value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (series, bucket)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users BEGIN
+        INSERT INTO stats_totals (name, value) VALUES ('users', 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        INSERT INTO stats_buckets (series, bucket, value)
+            VALUES ('signups_hour', strftime('%Y-%m-%d %H:00', NEW.joined_at), 1)
+            ON CONFLICT (series, bucket) DO UPDATE SET value = value + 1;
+        INSERT INTO stats_buckets (series, bucket, value)
+            VALUES ('signups_day', date(NEW.joined_at), 1)
+            ON CONFLICT (series, bucket) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users BEGIN
+        UPDATE stats_totals SET value = value - 1 WHERE name = 'users';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_jobs_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO stats_totals (name, value) VALUES ('jobs', 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        INSERT INTO stats_city (location, jobs) VALUES (NEW.location, 1)
+            ON CONFLICT (location) DO UPDATE SET jobs = jobs + 1;
+        INSERT INTO stats_buckets (series, bucket, value)
+            VALUES ('postings_hour', strftime('%Y-%m-%d %H:00', NEW.created_at), 1)
+            ON CONFLICT (series, bucket) DO UPDATE SET value = value + 1;
+        INSERT INTO stats_buckets (series, bucket, value)
+            VALUES ('postings_day', date(NEW.created_at), 1)
+            ON CONFLICT (series, bucket) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_jobs_delete AFTER DELETE ON jobs BEGIN
+        UPDATE stats_totals SET value = value - 1 WHERE name = 'jobs';
+        UPDATE stats_city SET jobs = jobs - 1 WHERE location = OLD.location;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_jobs_move AFTER UPDATE OF location ON jobs
+    WHEN OLD.location IS NOT NEW.location BEGIN
+        UPDATE stats_city SET jobs = jobs - 1 WHERE location = OLD.location;
+        INSERT INTO stats_city (location, jobs) VALUES (NEW.location, 1)
+            ON CONFLICT (location) DO UPDATE SET jobs = jobs + 1;
+    END;
+'''
+
+
+def install(conn):
+    execute_script(conn, SCHEMA)
+    if conn.execute('SELECT 1 FROM stats_totals LIMIT 1').fetchone() is None:
+        # First start with aggregates: count what is already there
+        rebuild(conn)
+
+
+def rebuild(conn):
+    conn.execute('DELETE FROM stats_totals')
+    conn.execute('DELETE FROM stats_city')
+    conn.execute('DELETE FROM stats_buckets')
+    conn.execute('''
+        INSERT INTO stats_totals (name, value)
+        SELECT 'users', COUNT(*) FROM users
+        UNION ALL
+        SELECT 'jobs', COUNT(*) FROM jobs
+    ''')
+    conn.execute('''
+        INSERT INTO stats_city (location, jobs)
+        SELECT location, COUNT(*) FROM jobs GROUP BY location
+    ''')
+    postings = 'jobs'
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs_archive'").fetchone():
+        # Archived vacancies were posted too
+        postings = '(SELECT created_at FROM jobs UNION ALL SELECT created_at FROM jobs_archive)'
+    for series, table, column, bucket in (
+        ('signups_hour', 'users', 'joined_at', "strftime('%Y-%m-%d %H:00', {})"),
+        ('signups_day', 'users', 'joined_at', 'date({})'),
+        ('postings_hour', postings, 'created_at', "strftime('%Y-%m-%d %H:00', {})"),
+        ('postings_day', postings, 'created_at', 'date({})'),
+    ):
+        expression = bucket.format(column)
+        conn.execute(f'''
+            INSERT INTO stats_buckets (series, bucket, value)
+            SELECT '{series}', {expression}, COUNT(*) FROM {table}
+            WHERE {column} IS NOT NULL
+            GROUP BY {expression}
+        ''')
+
+
+def summary(db):
+    totals = dict(db.fetchall('SELECT name, value FROM stats_totals'))
+    new_users = db.fetchone('''
+        SELECT COALESCE(SUM(value), 0) FROM stats_buckets
+        WHERE series = 'signups_hour' AND bucket > strftime('%Y-%m-%d %H:00', 'now', '-1 day')
+    ''')[0]
+    jobs_by_city = db.fetchall('SELECT location, jobs FROM stats_city WHERE jobs > 0 ORDER BY location')
+    return totals.get('users', 0), totals.get('jobs', 0), new_users, jobs_by_city
+
+
+def city_jobs(db, location):
+    row = db.fetchone('SELECT jobs FROM stats_city WHERE location = ?', (location,))
+    return row[0] if row else 0
+
+
+def trend(db, days=30):
+    rows = db.fetchall('''
+        SELECT bucket, series, value FROM stats_buckets
+        WHERE series IN ('signups_day', 'postings_day') AND bucket >= date('now', ?)
+        ORDER BY bucket
+    ''', (f'-{days - 1} days',))
+    result = {}
+    for bucket, series, value in rows:
+        signups, postings = result.get(bucket, (0, 0))
+        if series == 'signups_day':
+            signups = value
+        else:
+            postings = value
+        result[bucket] = (signups, postings)
+    return sorted(result.items())
+
+
+if __name__ == '__main__':
+    # python stats.py rebuild [job_bot.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        sys.exit("usage: python stats.py rebuild [database]")
+    connection = sqlite3.connect(sys.argv[2] if len(sys.argv) > 2 else 'job_bot.db', isolation_level=None)
+    connection.execute('BEGIN IMMEDIATE')
+    install(connection)
+    rebuild(connection)
+    connection.execute('COMMIT')
+    connection.close()
@@ -0,0 +1,243 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+WriteResult = namedtuple('WriteResult', ['lastrowid', 'rowcount'])
+
+_STOP = object()
+
+# Pause after a group failed as a whole, e.g. on a database another process
+# kept locked past busy_timeout
+RETRY_DELAY = 0.2
+
+
+def statements(script):
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ''
+
+
+def execute_script(conn, script):
+    # executescript() would COMMIT the writer's open transaction
+    for statement in statements(script):
+        conn.execute(statement)
+
+
+class Storage:
+    # WAL database with a read connection per thread and a single writer
+    # thread that commits queued writes in groups.
+    # observer, when set, is called as observer(kind, target, seconds, error)
+    # for every read, write and commit; kind is 'read', 'write' or 'commit'.
+    # A write waits at most write_timeout for the writer to take it up; one
+    # still queued then is withdrawn and TimeoutError raised.
+
+    def __init__(self, path, max_batch=256, commit_delay=0.002, timeout=30.0, write_timeout=60.0):
+        self.path = path
+        self.max_batch = max_batch
+        self.commit_delay = commit_delay
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+        self.writes = queue.Queue()
+        self.observer = None
+
+        self.writer_conn = self._connect()
+        # Only takes effect on a new database, see lifecycle.py compact
+        self.writer_conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.writer_conn.execute('PRAGMA journal_mode = WAL')
+        self.writer_conn.execute('PRAGMA synchronous = NORMAL')
+        self.writer = threading.Thread(target=self._write_loop, name='sqlite-writer', daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        conn.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+        return conn
+
+    def reader(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute('PRAGMA query_only = 1')
+            self.local.conn = conn
+            with self.readers_lock:
+                self.readers.append(conn)
+        return conn
+
+    def release_reader(self):
+        # Closes the calling thread's read connection; for threads that end
+        # before the Storage is closed
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            return
+        self.local.conn = None
+        with self.readers_lock:
+            self.readers.remove(conn)
+        conn.close()
+
+    def fetchone(self, sql, params=()):
+        if self.observer is None:
+            return self.reader().execute(sql, params).fetchone()
+        return self._observed_read('fetchone', sql, params)
+
+    def fetchall(self, sql, params=()):
+        if self.observer is None:
+            return self.reader().execute(sql, params).fetchall()
+        return self._observed_read('fetchall', sql, params)
+
+    def _observed_read(self, fetch, sql, params):
+        started = time.perf_counter()
+        try:
+            result = self.reader().execute(sql, params)
+            if fetch is not None:
+                result = getattr(result, fetch)()
+        except Exception as e:
+            self.observer('read', sql, time.perf_counter() - started, e)
+            raise
+        self.observer('read', sql, time.perf_counter() - started, None)
+        return result
+
+    def iterate(self, sql, params=(), size=1000):
+        # Only the first step of the statement is observed, the rest is
+        # paced by the consumer
+        if self.observer is None:
+            cursor = self.reader().execute(sql, params)
+        else:
+            cursor = self._observed_read(None, sql, params)
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield from rows
+
+    def execute(self, sql, params=(), wait=True):
+        return self._submit(('execute', sql, params), wait)
+
+    def executemany(self, sql, rows, wait=True):
+        return self._submit(('executemany', sql, list(rows)), wait)
+
+    def run(self, func, wait=True):
+        # func(conn) runs on the writer connection, atomically with respect
+        # to the other writes of its group
+        return self._submit(('run', func, None), wait)
+
+    def _submit(self, op, wait):
+        future = Future()
+        self.writes.put((op, future))
+        if not wait:
+            return future
+        try:
+            return future.result(timeout=self.write_timeout)
+        except TimeoutError:
+            # Withdrawn while still queued; once taken up it runs to the end
+            if future.cancel():
+                raise
+        return future.result()
+
+    def _write_loop(self):
+        conn = self.writer_conn
+        while True:
+            item = self.writes.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = self._collect(batch)
+            batch = [(op, future) for op, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                if stop:
+                    return
+                continue
+
+            started = time.perf_counter()
+            commit_error = None
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                results = [self._apply(conn, op) for op, future in batch]
+                started = time.perf_counter()
+                conn.execute('COMMIT')
+            except Exception as e:
+                # The group fails as a whole; the writer carries on with
+                # the next one
+                self._rollback(conn)
+                results = [(None, e)] * len(batch)
+                commit_error = e
+            if self.observer is not None:
+                self.observer('commit', 'COMMIT', time.perf_counter() - started, commit_error)
+
+            for (op, future), (result, error) in zip(batch, results):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            if stop:
+                return
+            if commit_error is not None:
+                time.sleep(RETRY_DELAY)
+
+    def _rollback(self, conn):
+        if conn.in_transaction:
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+
+    def _collect(self, batch):
+        deadline = time.monotonic() + self.commit_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self.writes.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    item = self.writes.get(timeout=remaining)
+                except queue.Empty:
+                    return False
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _apply(self, conn, op):
+        kind, target, params = op
+        started = time.perf_counter()
+        conn.execute('SAVEPOINT write')
+        try:
+            if kind == 'run':
+                result = target(conn)
+            else:
+                cursor = getattr(conn, kind)(target, params)
+                result = WriteResult(cursor.lastrowid, cursor.rowcount)
+        except Exception as e:
+            conn.execute('ROLLBACK TO write')
+            conn.execute('RELEASE write')
+            if self.observer is not None:
+                self.observer('write', target, time.perf_counter() - started, e)
+            return None, e
+        conn.execute('RELEASE write')
+        if self.observer is not None:
+            self.observer('write', target, time.perf_counter() - started, None)
+        return result, None
+
+    def close(self):
+        self.writes.put(_STOP)
+        self.writer.join()
+        self.writer_conn.close()
+        with self.readers_lock:
+            for conn in self.readers:
+                conn.close()
+            self.readers.clear()
@@ -0,0 +1,156 @@
+import time
+
+import pytest
+
+import cache
+import lifecycle
+import migrations
+from storage import Storage
+
+CITY = "🏙️ Київ"
+OTHER_CITY = "🌇 Львів"
+WINDOW = 5
+
+
+def render(job):
+    return f"{job[2]}\n{job[3]}", job[5]
+
+
+def post(db, location=CITY, title='Бариста', age=None):
+    # age: a datetime() modifier, e.g. '-5 minutes'
+    return db.execute('''
+        INSERT INTO jobs (employer_id, title, description, location, telegram_username, created_at)
+        VALUES (1, ?, 'Опис', ?, '@employer', COALESCE(datetime('now', ?), CURRENT_TIMESTAMP))
+    ''', (title, location, age)).lastrowid
+
+
+def expected(db, location):
+    # The listing with plain queries, as display_job read it before the cache
+    return [
+        ((job[6], job[0]), render(job))
+        for job in db.fetchall('''
+            SELECT * FROM jobs WHERE location = ? AND expires_at > datetime('now')
+            ORDER BY created_at, id
+        ''', (location,))
+    ]
+
+
+def listing(listings, location):
+    found = []
+    after = None
+    while True:
+        job = listings.next_job(location, after)
+        if job is None:
+            return found
+        found.append(job)
+        after = job[0]
+
+
+def edit(db, job_id):
+    db.execute("UPDATE jobs SET title = title || ' (змінено)' WHERE id = ?", (job_id,))
+
+
+def move(db, job_id):
+    db.execute('UPDATE jobs SET location = ? WHERE id = ?', (OTHER_CITY, job_id))
+
+
+def delete(db, job_id):
+    db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+
+def archive(db, job_id):
+    db.execute("UPDATE jobs SET expires_at = datetime('now', '-1 minute') WHERE id = ?", (job_id,))
+    db.run(lifecycle.archive_expired)
+
+
+def insert(db, job_id):
+    post(db, title='Нова вакансія')
+
+
+WRITES = [insert, edit, move, delete, archive]
+
+
+@pytest.fixture
+def db(tmp_path):
+    storage = Storage(str(tmp_path / 'job_bot.db'))
+    migrations.migrate(storage)
+    # Twice the window: the first jobs come from the cached listing, the
+    # others from queries past it
+    for index in range(WINDOW * 2):
+        post(storage, age=f'-{WINDOW * 2 - index} minutes')
+    post(storage, OTHER_CITY, age='-1 hour')
+    yield storage
+    storage.close()
+
+
+def job_ids(db):
+    return [row[0] for row in db.fetchall('SELECT id FROM jobs WHERE location = ? ORDER BY created_at, id', (CITY,))]
+
+
+def assert_fresh(db, listings):
+    for location in (CITY, OTHER_CITY):
+        assert listing(listings, location) == expected(db, location)
+    assert len(expected(db, CITY)) >= WINDOW * 2 - 1
+
+
+@pytest.mark.parametrize('write', WRITES)
+@pytest.mark.parametrize('position', [0, WINDOW - 1, WINDOW + 1])
+def test_own_write_is_seen_at_once(db, write, position):
+    listings = cache.ListingCache(db, render, window=WINDOW, sync_interval=3600)
+    assert_fresh(db, listings)
+    write(db, job_ids(db)[position])
+    listings.changed()
+    assert_fresh(db, listings)
+
+
+@pytest.mark.parametrize('write', WRITES)
+def test_card_read_back_after_own_write(db, write):
+    # The handler's path: the edited card is read again right away
+    listings = cache.ListingCache(db, render, window=WINDOW, sync_interval=3600)
+    assert_fresh(db, listings)
+    previous, job_id = job_ids(db)[1:3]
+    write(db, job_id)
+    listings.changed()
+    after = db.fetchone('SELECT created_at, id FROM jobs WHERE id = ?', (previous,))
+    following = expected(db, CITY)
+    index = [key for key, _ in following].index(tuple(after))
+    assert listings.next_job(CITY, tuple(after)) == following[index + 1]
+
+
+@pytest.mark.parametrize('write', WRITES)
+def test_write_from_another_storage_is_seen_after_sync(db, write):
+    # Another worker process or a CLI: the cache only learns of it from
+    # the job_changes log
+    listings = cache.ListingCache(db, render, window=WINDOW, sync_interval=0.05)
+    assert_fresh(db, listings)
+    other = Storage(db.path)
+    try:
+        write(other, job_ids(db)[WINDOW - 1])
+    finally:
+        other.close()
+    time.sleep(0.1)
+    assert_fresh(db, listings)
+
+
+def test_card_read_before_an_invalidation_is_not_stored(db):
+    listings = cache.ListingCache(db, render, window=WINDOW, sync_interval=3600)
+    job_id = job_ids(db)[0]
+    generation = listings.generation
+    stale = db.fetchone('SELECT * FROM jobs WHERE id = ?', (job_id,))
+    edit(db, job_id)
+    listings.changed()
+    listings.sync()
+    listings.card(job_id, stale, generation)
+    assert listings.card(job_id) == render(db.fetchone('SELECT * FROM jobs WHERE id = ?', (job_id,)))
+
+
+def test_cache_behind_the_log_starts_over(db):
+    listings = cache.ListingCache(db, render, window=WINDOW, sync_interval=3600)
+    assert_fresh(db, listings)
+    other_job = db.fetchone('SELECT id FROM jobs WHERE location = ?', (OTHER_CITY,))[0]
+    for job_id in [other_job] + job_ids(db)[:3]:
+        edit(db, job_id)
+    # The log trimmed past where the cache stopped reading
+    db.execute('DELETE FROM job_changes WHERE seq = ?', (listings.seq + 1,))
+    listings.changed()
+    assert_fresh(db, listings)
@@ -0,0 +1,74 @@
+import pytest
+
+import dedup
+import migrations
+from storage import Storage
+
+KYIV = "🏙️ Київ"
+LVIV = "🌇 Львів"
+TITLE = 'Бариста'
+DESCRIPTION = 'Готувати каву та десерти, обслуговувати гостей у кав\'ярні біля метро, змінний графік'
+
+
+@pytest.fixture
+def db(tmp_path):
+    storage = Storage(str(tmp_path / 'job_bot.db'))
+    migrations.migrate(storage)
+    yield storage
+    storage.close()
+
+
+def post(db, employer_id, location):
+    values = dedup.signature(TITLE, DESCRIPTION)
+
+    def write(conn):
+        job_id = conn.execute('''
+            INSERT INTO jobs (employer_id, title, description, location) VALUES (?, ?, ?, ?)
+        ''', (employer_id, TITLE, DESCRIPTION, location)).lastrowid
+        dedup.index(conn, job_id, location, values, dedup.matches(conn, location, values, exclude=job_id))
+        return job_id
+
+    return db.run(write)
+
+
+def move(db, job_id, location):
+    # What update_job does for a new city
+    values = dedup.signature(TITLE, DESCRIPTION)
+
+    def write(conn):
+        conn.execute('UPDATE jobs SET location = ? WHERE id = ?', (location, job_id))
+        dedup.reindex(conn, job_id, location, values)
+
+    db.run(write)
+
+
+def members(db):
+    return [[job[0] for job in group] for _, group in dedup.clusters(db)]
+
+
+def test_moved_vacancy_leaves_its_cluster(db):
+    first, second = post(db, 1, KYIV), post(db, 2, KYIV)
+    assert members(db) == [[first, second]]
+
+    move(db, second, LVIV)
+    assert members(db) == []
+    assert dedup.matches(db.reader(), KYIV, dedup.signature(TITLE, DESCRIPTION)) == [(1.0, first, 1)]
+
+    third = post(db, 3, LVIV)
+    assert members(db) == [[second, third]]
+
+
+def test_moved_vacancy_joins_the_cluster_of_its_new_city(db):
+    post(db, 1, KYIV)
+    second = post(db, 2, KYIV)
+    third = post(db, 3, LVIV)
+    move(db, second, LVIV)
+    assert members(db) == [[second, third]]
+
+
+def test_migration_drops_memberships_left_in_another_city(db):
+    first, second = post(db, 1, KYIV), post(db, 2, KYIV)
+    # As the old update_job left it: the new city's keys, the old cluster
+    db.run(lambda conn: conn.execute('UPDATE jobs SET location = ? WHERE id = ?', (LVIV, second)))
+    db.run(migrations.moved_duplicates)
+    assert members(db) == []
@@ -0,0 +1,69 @@
+import threading
+
+from sessions import Session, SessionStore
+
+
+class SlowBackend:
+    # Holds every save until release is set
+    def __init__(self):
+        self.rows = {}
+        self.saving = threading.Event()
+        self.release = threading.Event()
+
+    def load(self, chat_id):
+        if chat_id not in self.rows:
+            return None
+        return Session(self.rows[chat_id][0])
+
+    def save(self, sessions):
+        self.saving.set()
+        self.release.wait()
+        self.rows.update(sessions)
+
+
+def cached(store):
+    return set(store.recent) | set(store.idle)
+
+
+def test_capacity_evicts_the_session_used_longest_ago():
+    store = SessionStore(max_sessions=3, flush_interval=0)
+    for chat_id in (1, 2, 3):
+        store.states[chat_id] = "👷 Шукаю роботу"
+    store.states[4] = "👷 Шукаю роботу"
+    assert cached(store) == {2, 3, 4}
+    store.states[5] = "👷 Шукаю роботу"
+    assert cached(store) == {3, 4, 5}
+
+
+def test_capacity_evicts_idle_sessions_first_and_keeps_the_generation():
+    store = SessionStore(max_sessions=4, ttl=0, flush_interval=0)
+    for chat_id in (1, 2, 3):
+        store.states[chat_id] = "👷 Шукаю роботу"
+    store.evict_idle()
+    rotated = store.rotated
+    # 2 is used again, 1 and 3 stay idle
+    store.states.get(2)
+    store.states[4] = "👷 Шукаю роботу"
+    store.states[5] = "👷 Шукаю роботу"
+    assert cached(store) == {2, 3, 4, 5}
+    store.states[6] = "👷 Шукаю роботу"
+    store.states[7] = "👷 Шукаю роботу"
+    assert cached(store) == {4, 5, 6, 7}
+    assert store.rotated == rotated
+
+
+def test_evicted_session_is_read_back_while_it_is_saved():
+    backend = SlowBackend()
+    backend.rows[1] = ('old', None)
+    store = SessionStore(backend, max_sessions=2, flush_interval=0)
+    store.states[1] = 'new'
+    store.states[2] = 'other'
+    store.states[3] = 'other'
+    assert 1 not in cached(store)
+    flush = threading.Thread(target=store.flush)
+    flush.start()
+    backend.saving.wait()
+    assert store.states[1] == 'new'
+    backend.release.set()
+    flush.join()
+    assert backend.rows[1][0] == 'new'
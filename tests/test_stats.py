@@ -0,0 +1,41 @@
+import pytest
+
+import lifecycle
+import migrations
+import stats
+from storage import Storage
+
+
+@pytest.fixture
+def db(tmp_path):
+    storage = Storage(str(tmp_path / 'job_bot.db'))
+    migrations.migrate(storage)
+    yield storage
+    storage.close()
+
+
+def test_archiving_keeps_posting_history(db):
+    lifecycle.configure(db, 7).result()
+    for day in range(20):
+        db.execute('''
+            INSERT INTO jobs (employer_id, title, location, created_at) VALUES (1, 'Бариста', ?, datetime('now', ?))
+        ''', ("🏙️ Київ", f'-{day} days'))
+    trend = stats.trend(db, 30)
+    assert sum(postings for _, (_, postings) in trend) == 20
+
+    assert db.run(lifecycle.archive_expired) == 13
+    assert stats.trend(db, 30) == trend
+    assert stats.summary(db)[1] == 7
+    assert stats.city_jobs(db, "🏙️ Київ") == 7
+
+    # The incremental aggregates and a rebuild agree
+    totals = stats.summary(db)
+    db.run(stats.rebuild)
+    assert stats.trend(db, 30) == trend
+    assert stats.summary(db) == totals
+
+
+def test_new_users_of_the_last_24_hours(db):
+    for user_id, hours in enumerate((0, 1, 23, 24, 25)):
+        db.execute("INSERT INTO users (user_id, joined_at) VALUES (?, datetime('now', ?))", (user_id, f'-{hours} hours'))
+    assert stats.summary(db)[2] == 3
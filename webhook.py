@@ -0,0 +1,128 @@
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def update_chat_id(update):
+    for key in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        if key in update:
+            return update[key]['chat']['id']
+    if 'callback_query' in update:
+        query = update['callback_query']
+        if 'message' in query:
+            return query['message']['chat']['id']
+        return query['from']['id']
+    for value in update.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return update.get('update_id', 0)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Telegram keeps up to max_connections (40 by default) open at once
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class ChatOrderedPool:
+    # Worker threads with one bounded queue each. A chat always lands on the
+    # same worker, so its updates are handled in order while different
+    # chats run in parallel.
+
+    def __init__(self, handle, workers=8, queue_size=1000):
+        self.handle = handle
+        self.queues = [queue.Queue(queue_size) for _ in range(workers)]
+        self.threads = [
+            threading.Thread(target=self._work, args=(q,), name=f'update-worker-{n}', daemon=True)
+            for n, q in enumerate(self.queues)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, chat_id, item, timeout=None):
+        # Raises queue.Full when the chat's worker is backed up
+        self.queues[hash(chat_id) % len(self.queues)].put(item, timeout=timeout)
+
+    def _work(self, q):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            try:
+                self.handle(item)
+            except Exception:
+                logger.exception("Update handler failed")
+
+    def depth(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def close(self):
+        for q in self.queues:
+            q.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+
+class WebhookServer:
+    def __init__(self, handle, host='0.0.0.0', port=8443, path='/webhook', secret_token=None,
+                 workers=8, queue_size=1000, enqueue_timeout=1.0):
+        self.pool = ChatOrderedPool(handle, workers, queue_size)
+        self.path = path
+        self.secret_token = secret_token
+        self.enqueue_timeout = enqueue_timeout
+        self.httpd = _HTTPServer((host, port), self._request_handler())
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def _request_handler(self):
+        server = self
+
+        class UpdateRequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    return self._reply(404)
+                token = self.headers.get('X-Telegram-Bot-Api-Secret-Token')
+                if server.secret_token and token != server.secret_token:
+                    return self._reply(403)
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    update = json.loads(self.rfile.read(length))
+                except ValueError:
+                    return self._reply(400)
+                try:
+                    server.pool.submit(update_chat_id(update), update, server.enqueue_timeout)
+                except queue.Full:
+                    # Telegram redelivers updates that were not acknowledged
+                    return self._reply(503)
+                self._reply(200)
+
+            def _reply(self, status):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return UpdateRequestHandler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='webhook-server', daemon=True)
+        self.thread.start()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.pool.close()